@@ -57,6 +57,18 @@ pip install --upgrade pip
 pip install -r "$INSTALL_DIR/src/requirements.txt"
 pip install gunicorn
 
+# Build fingerprinted, precompressed static assets for nginx
+echo "Building static assets..."
+(cd "$INSTALL_DIR/src" && python assets.py)
+
+# Index existing conversations so the first admin search does not have to
+echo "Updating conversation search index..."
+(cd "$INSTALL_DIR/src" && python conversation_search.py)
+
+# Record the server's import-time breakdown (served at /admin/api/startup)
+echo "Measuring import time..."
+(cd "$INSTALL_DIR/src" && python startup.py -o data/import_times.json)
+
 # Create systemd service file
 echo "Creating systemd service..."
 SERVICE_FILE="/etc/systemd/system/$APP_NAME.service"
@@ -75,7 +87,11 @@ Environment="SECRET_KEY=$(openssl rand -hex 32)"
 Environment="PORT=5000"
 Environment="FLASK_HOST=127.0.0.1"
 Environment="FLASK_DEBUG=false"
-ExecStart=$VENV_DIR/bin/gunicorn --workers 3 --bind 127.0.0.1:5000 --timeout 120 server:app
+Environment="GUNICORN_WORKERS=3"
+Environment="ANSWER_CACHE_BYTES=33554432"
+Environment="ARCHIVE_INTERVAL=3600"
+Environment="RETENTION_LOGS_MONTHS=12"
+ExecStart=$VENV_DIR/bin/gunicorn -c gunicorn.conf.py server:app
 Restart=always
 RestartSec=10
 StandardOutput=journal
@@ -93,4 +109,5 @@ sudo systemctl enable "$APP_NAME.service"
 echo "=== Application setup complete ==="
 echo "To start the service: sudo systemctl start $APP_NAME"
 echo "To check status: sudo systemctl status $APP_NAME"
+echo "To check readiness: curl -s http://127.0.0.1:5000/ready"
 echo "To view logs: sudo journalctl -u $APP_NAME -f"
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""Adaptive admission control with per-user fair queuing for upstream calls."""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import metrics
+from logger import get_logger
+
+logger = get_logger("admission")
+
+
+class AdmissionRejected(Exception):
+    """The request was shed because the queue wait would exceed the deadline."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('user', 'event', 'granted', 'epoch')
+
+    def __init__(self, user):
+        self.user = user
+        self.event = threading.Event()
+        self.granted = False
+        self.epoch = None
+
+
+class _Slot:
+    __slots__ = ('throttled', 'epoch')
+
+    def __init__(self, epoch):
+        self.throttled = False
+        self.epoch = epoch
+
+
+class AdmissionController:
+    """Bound in-flight upstream calls with an AIMD-adapted limit.
+
+    The limit grows by roughly one slot per limit's worth of completions
+    that finish under `target_latency`, and is multiplied by
+    `decrease_factor` on a congestion signal (a throttled call, or one
+    slower than the target). The limit is cut at most once per congestion
+    epoch: calls admitted before the last decrease were sent into the old,
+    larger window, so their congestion signals do not cut it again. Waiting requests are kept in one FIFO per
+    user and served round-robin across users, so a user with many queued
+    requests only gets their turn like everyone else. A request is shed
+    up front when its estimated wait exceeds `queue_deadline`, and again
+    if it is still waiting when the deadline passes.
+    """
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=32, target_latency=10.0,
+                 decrease_factor=0.5, queue_deadline=15.0, max_queued_per_user=4,
+                 congestion_errors=(), clock=time.monotonic):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.queue_deadline = queue_deadline
+        self.max_queued_per_user = max_queued_per_user
+        self.congestion_errors = tuple(congestion_errors)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._limit = float(initial_limit)
+        self._inflight = 0
+        self._queues = OrderedDict()  # user -> deque of waiters, in round-robin order
+        self._queued = 0
+        self._avg_latency = None
+        self._epoch = 0  # bumped on every decrease
+        self._publish()
+
+    @property
+    def limit(self):
+        with self._lock:
+            return int(self._limit)
+
+    def _publish(self):
+        metrics.set_gauge('admission.limit', int(self._limit))
+        metrics.set_gauge('admission.inflight', self._inflight)
+        metrics.set_gauge('admission.queued', self._queued)
+
+    def _estimated_wait(self):
+        """Seconds until a newly queued request would get a slot."""
+        service_time = self._avg_latency if self._avg_latency is not None else self.target_latency / 2
+        return (self._queued + 1) * service_time / max(1, int(self._limit))
+
+    def acquire(self, user):
+        """Take an in-flight slot for user, queuing fairly; raises AdmissionRejected.
+
+        Returns the congestion epoch the call was admitted in, to pass back to release().
+        """
+        with self._lock:
+            if self._inflight < int(self._limit) and not self._queued:
+                self._inflight += 1
+                metrics.increment('admission.admitted')
+                self._publish()
+                return self._epoch
+
+            user_queue = self._queues.get(user)
+            if user_queue is not None and len(user_queue) >= self.max_queued_per_user:
+                metrics.increment('admission.shed')
+                raise AdmissionRejected(f"Too many queued requests for {user}", retry_after=self._retry_after())
+            estimate = self._estimated_wait()
+            if estimate > self.queue_deadline:
+                metrics.increment('admission.shed')
+                raise AdmissionRejected(f"Estimated queue wait {estimate:.1f}s exceeds deadline",
+                                        retry_after=self._retry_after())
+
+            waiter = _Waiter(user)
+            self._queues.setdefault(user, deque()).append(waiter)
+            self._queued += 1
+            self._publish()
+
+        waiter.event.wait(self.queue_deadline)
+
+        with self._lock:
+            if waiter.granted:
+                metrics.increment('admission.admitted')
+                metrics.increment('admission.queued_admitted')
+                return waiter.epoch
+            self._remove_waiter(waiter)
+            self._publish()
+            metrics.increment('admission.timeout')
+        raise AdmissionRejected("Queue wait exceeded deadline", retry_after=self._retry_after())
+
+    def _retry_after(self):
+        return max(1, int(round(self._estimated_wait())))
+
+    def _remove_waiter(self, waiter):
+        user_queue = self._queues.get(waiter.user)
+        if user_queue and waiter in user_queue:
+            user_queue.remove(waiter)
+            self._queued -= 1
+            if not user_queue:
+                del self._queues[waiter.user]
+
+    def _grant_waiting(self):
+        """Hand free slots to queued requests, one user at a time (round-robin)."""
+        while self._queued and self._inflight < int(self._limit):
+            user, user_queue = next(iter(self._queues.items()))
+            waiter = user_queue.popleft()
+            self._queued -= 1
+            if user_queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            waiter.granted = True
+            waiter.epoch = self._epoch
+            self._inflight += 1
+            waiter.event.set()
+
+    def release(self, latency, congested=False, epoch=None):
+        """Return a slot and adapt the limit from the call's outcome.
+
+        epoch is the value acquire() returned; without it the call counts as
+        admitted in the current epoch.
+        """
+        with self._lock:
+            self._inflight = max(0, self._inflight - 1)
+            if self._avg_latency is None:
+                self._avg_latency = latency
+            else:
+                self._avg_latency = 0.8 * self._avg_latency + 0.2 * latency
+
+            if not (congested or latency > self.target_latency):
+                self._limit = min(self.max_limit, self._limit + 1.0 / max(1.0, self._limit))
+            elif epoch is not None and epoch < self._epoch:
+                metrics.increment('admission.decrease_skipped')
+            else:
+                old = int(self._limit)
+                self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+                self._epoch += 1
+                metrics.increment('admission.decrease')
+                if int(self._limit) != old:
+                    logger.warning(f"Admission limit decreased {old} -> {int(self._limit)} "
+                                   f"({'throttled' if congested else f'latency {latency:.1f}s'})")
+
+            self._grant_waiting()
+            self._publish()
+
+    @contextmanager
+    def admit(self, user):
+        """Hold a slot for the duration of the block.
+
+        Exceptions listed in congestion_errors count as a congestion signal.
+        """
+        slot = _Slot(self.acquire(user))
+        started = self._clock()
+        try:
+            yield slot
+        except self.congestion_errors:
+            slot.throttled = True
+            raise
+        finally:
+            self.release(self._clock() - started, congested=slot.throttled, epoch=slot.epoch)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'limit': int(self._limit),
+                'inflight': self._inflight,
+                'queued': self._queued,
+                'queued_users': len(self._queues),
+                'avg_latency': round(self._avg_latency, 3) if self._avg_latency is not None else None,
+            }
@@ -0,0 +1,381 @@
+"""Monthly compressed archives for conversations and log files, with retention.
+
+Closed months are moved out of the hot directories (data/conversations,
+logs/) into one archive per store and month under data/archive:
+
+    data/archive/conversations/2026-01.gz          gzip members ("blocks")
+    data/archive/conversations/2026-01.index.json  entry -> block, offset, metadata
+
+Each block is an independent gzip member of up to BLOCK_BYTES of records,
+so the data file is still a plain gzip stream (`zcat 2026-01.gz`), and one
+record can be read by decompressing only its block. The index also holds
+the listing fields (session, user, timestamp, message count), so the admin
+APIs list archived conversations without decompressing anything.
+
+Usage:
+    python archive.py                    # archive closed months, apply retention
+    python archive.py --dry-run
+    python archive.py --keep-logs 6 --keep-conversations 24
+"""
+
+import argparse
+import fcntl
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+
+from logger import get_logger
+
+logger = get_logger("archive")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(BASE_DIR, 'data', 'archive'))
+CONVERSATIONS_DIR = os.environ.get('CONVERSATIONS_DIR', os.path.join(BASE_DIR, 'data', 'conversations'))
+LOG_DIR = os.path.join(BASE_DIR, 'logs')
+BLOCK_BYTES = 256 * 1024
+MIN_AGE_SECONDS = 24 * 3600  # files written more recently than this stay hot
+STORES = ('conversations', 'logs')
+
+# Months of archives to keep per store; 0 keeps them forever.
+RETENTION = {
+    'conversations': int(os.environ.get('RETENTION_CONVERSATIONS_MONTHS', 0)),
+    'logs': int(os.environ.get('RETENTION_LOGS_MONTHS', 12)),
+}
+
+
+def file_day(name):
+    """Date in a store filename: conversation_<id>_YYYY-MM-DD.json or feedback_YYYYMMDD_HHMMSS_<hash>.json."""
+    stem = name[:-len('.json')]
+    try:
+        if name.startswith('conversation_'):
+            return date.fromisoformat(stem.rsplit('_', 1)[1])
+        if name.startswith('feedback_'):
+            day = stem.split('_')[1]
+            return date(int(day[:4]), int(day[4:6]), int(day[6:8]))
+    except (IndexError, ValueError):
+        pass
+    return None
+
+
+def month_of(day):
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def months_before(month, count):
+    """The month `count` months before 'YYYY-MM'."""
+    year, mon = map(int, month.split('-'))
+    index = year * 12 + mon - 1 - count
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+class MonthArchive:
+    """One store's archive for one month: a file of gzip blocks plus a JSON index."""
+
+    def __init__(self, directory, month):
+        self.directory = directory
+        self.month = month
+        self.data_path = os.path.join(directory, f"{month}.gz")
+        self.index_path = os.path.join(directory, f"{month}.index.json")
+
+    def load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'month': self.month, 'blocks': [], 'entries': {}}
+
+    def append(self, records):
+        """Add (key, metadata, bytes) records; a key already archived is replaced.
+
+        The data is written and synced before the index that points at it, so
+        a crash leaves at worst unreferenced bytes, never a dangling entry.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        index = self.load_index()
+        groups, current, size = [], [], 0
+        for record in records:
+            current.append(record)
+            size += len(record[2])
+            if size >= BLOCK_BYTES:
+                groups.append(current)
+                current, size = [], 0
+        if current:
+            groups.append(current)
+
+        with open(self.data_path, 'ab') as f:
+            for group in groups:
+                offset = f.tell()
+                block, entries, start = [], [], 0
+                for key, meta, data in group:
+                    entries.append((key, dict(meta, start=start, length=len(data))))
+                    block.append(data)
+                    start += len(data)
+                member = gzip.compress(b''.join(block), mtime=0)
+                f.write(member)
+                number = len(index['blocks'])
+                index['blocks'].append([offset, len(member)])
+                for key, entry in entries:
+                    entry['block'] = number
+                    index['entries'][key] = entry
+            f.flush()
+            os.fsync(f.fileno())
+
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.index_path)
+        return index
+
+    def read_block(self, number, index):
+        offset, length = index['blocks'][number]
+        with open(self.data_path, 'rb') as f:
+            f.seek(offset)
+            return gzip.decompress(f.read(length))
+
+    def read(self, entry, index, block=None):
+        data = block if block is not None else self.read_block(entry['block'], index)
+        return data[entry['start']:entry['start'] + entry['length']]
+
+    def remove(self):
+        for path in (self.index_path, self.data_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ArchiveReader:
+    """Read access to one store's archives, caching each index until its file changes."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def months(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len('.index.json')] for name in names if name.endswith('.index.json'))
+
+    def index(self, month):
+        archive = MonthArchive(self.directory, month)
+        try:
+            mtime = os.stat(archive.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return archive, None
+        with self._lock:
+            cached = self._indexes.get(month)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, archive.load_index())
+                self._indexes[month] = cached
+        return archive, cached[1]
+
+    def entries(self, months=None):
+        """(month, key, entry) for every archived record, oldest month first."""
+        for month in months or self.months():
+            _, index = self.index(month)
+            if index:
+                for key, entry in index['entries'].items():
+                    yield month, key, entry
+
+    def records(self, months=None):
+        """(month, key, entry, bytes) for every record, decompressing each block once."""
+        for month in months or self.months():
+            archive, index = self.index(month)
+            if not index:
+                continue
+            by_block = defaultdict(list)
+            for key, entry in index['entries'].items():
+                by_block[entry['block']].append((key, entry))
+            for number in sorted(by_block):
+                block = archive.read_block(number, index)
+                for key, entry in sorted(by_block[number], key=lambda item: item[1]['start']):
+                    yield month, key, entry, archive.read(entry, index, block)
+
+    def find(self, predicate):
+        """First archived record whose index entry satisfies predicate, as bytes."""
+        for month in reversed(self.months()):
+            archive, index = self.index(month)
+            for key, entry in (index or {}).get('entries', {}).items():
+                if predicate(entry):
+                    return archive.read(entry, index)
+        return None
+
+    def summary(self):
+        months = []
+        for month in self.months():
+            archive, index = self.index(month)
+            try:
+                size = os.path.getsize(archive.data_path)
+            except FileNotFoundError:
+                size = 0
+            months.append({'month': month, 'entries': len(index['entries']) if index else 0, 'bytes': size})
+        return months
+
+
+def _closed(path, now, current_month, day=None):
+    """Month of a hot file if it belongs to a closed month and is no longer written, else None."""
+    mtime = os.path.getmtime(path)
+    if now - mtime < MIN_AGE_SECONDS:
+        return None
+    month = month_of(day or datetime.fromtimestamp(mtime).date())
+    return month if month < current_month else None
+
+
+def archive_conversations(conversations_dir, archive_dir, now, dry_run=False):
+    current = month_of(datetime.fromtimestamp(now).date())
+    by_month = defaultdict(list)
+    for entry in os.scandir(conversations_dir) if os.path.isdir(conversations_dir) else []:
+        day = file_day(entry.name) if entry.name.endswith('.json') else None
+        month = day and _closed(entry.path, now, current, day)
+        if month:
+            by_month[month].append(entry)
+    moved = 0
+    for month, entries in sorted(by_month.items()):
+        records = []
+        for entry in sorted(entries, key=lambda e: e.name):
+            try:
+                with open(entry.path, 'rb') as f:
+                    data = json.loads(f.read())
+            except (OSError, ValueError) as e:
+                logger.warning(f"Not archiving unreadable {entry.name}: {e}")
+                continue
+            meta = {
+                'session_id': data.get('session_id'),
+                'user_email': data.get('user_email'),
+                'timestamp': data.get('timestamp'),
+                'message_count': len(data.get('messages', [])),
+            }
+            line = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+            records.append((entry.name, meta, line))
+        if dry_run or not records:
+            moved += len(records)
+            continue
+        MonthArchive(os.path.join(archive_dir, 'conversations'), month).append(records)
+        for name, _, _ in records:
+            os.remove(os.path.join(conversations_dir, name))
+        moved += len(records)
+        logger.info(f"Archived {len(records)} conversations for {month}")
+    return moved
+
+
+def archive_logs(log_dir, archive_dir, now, dry_run=False):
+    """Archive log files last written in a closed month; the newest file is never touched."""
+    current = month_of(datetime.fromtimestamp(now).date())
+    names = sorted(name for name in os.listdir(log_dir) if '.log' in name) if os.path.isdir(log_dir) else []
+    newest = max(names, key=lambda n: os.path.getmtime(os.path.join(log_dir, n)), default=None)
+    by_month = defaultdict(list)
+    for name in names:
+        path = os.path.join(log_dir, name)
+        month = name != newest and _closed(path, now, current)
+        if month:
+            by_month[month].append(name)
+    moved = 0
+    for month, month_names in sorted(by_month.items()):
+        records = []
+        for name in month_names:
+            path = os.path.join(log_dir, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            mtime = os.path.getmtime(path)
+            # Rotated names (.log.1) are reused, so the key includes the mtime.
+            records.append((f"{name}@{int(mtime)}", {'file': name, 'bytes': len(data), 'mtime': mtime}, data))
+        records.sort(key=lambda record: record[1]['mtime'])
+        if not dry_run:
+            MonthArchive(os.path.join(archive_dir, 'logs'), month).append(records)
+            for name in month_names:
+                os.remove(os.path.join(log_dir, name))
+            logger.info(f"Archived {len(records)} log files for {month}")
+        moved += len(records)
+    return moved
+
+
+def apply_retention(archive_dir, now, retention=None, dry_run=False):
+    """Delete month archives older than each store's retention; returns the months removed."""
+    current = month_of(datetime.fromtimestamp(now).date())
+    removed = []
+    for store, keep in (retention or RETENTION).items():
+        if not keep:
+            continue
+        cutoff = months_before(current, keep)
+        reader = ArchiveReader(os.path.join(archive_dir, store))
+        for month in reader.months():
+            if month < cutoff:
+                if not dry_run:
+                    MonthArchive(reader.directory, month).remove()
+                    logger.info(f"Retention: removed {store} archive {month}")
+                removed.append(f"{store}/{month}")
+    return removed
+
+
+def run_once(conversations_dir=CONVERSATIONS_DIR, log_dir=LOG_DIR, archive_dir=ARCHIVE_DIR,
+             retention=None, now=None, dry_run=False):
+    """One archiver pass; returns None when another process is already running one."""
+    now = time.time() if now is None else now
+    os.makedirs(archive_dir, exist_ok=True)
+    with open(os.path.join(archive_dir, '.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        return {
+            'conversations': archive_conversations(conversations_dir, archive_dir, now, dry_run),
+            'logs': archive_logs(log_dir, archive_dir, now, dry_run),
+            'expired': apply_retention(archive_dir, now, retention, dry_run),
+        }
+
+
+_background = None
+
+
+def start_background(interval=None):
+    """Run the archiver every ARCHIVE_INTERVAL seconds in a daemon thread (0 disables)."""
+    global _background
+    interval = float(os.environ.get('ARCHIVE_INTERVAL', 3600)) if interval is None else interval
+    if interval <= 0 or (_background and _background.is_alive()):
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                result = run_once()
+                if result and (result['conversations'] or result['logs'] or result['expired']):
+                    logger.info(f"Archiver pass: {result}")
+            except Exception as e:
+                logger.error(f"Archiver pass failed: {e}")
+
+    _background = threading.Thread(target=loop, name='archiver', daemon=True)
+    _background.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive closed months of conversations and logs")
+    parser.add_argument('--dry-run', action='store_true', help="report what would be archived or removed")
+    parser.add_argument('--keep-conversations', type=int, default=RETENTION['conversations'],
+                        help="months of conversation archives to keep (0 = forever)")
+    parser.add_argument('--keep-logs', type=int, default=RETENTION['logs'],
+                        help="months of log archives to keep (0 = forever)")
+    args = parser.parse_args()
+
+    result = run_once(retention={'conversations': args.keep_conversations, 'logs': args.keep_logs},
+                      dry_run=args.dry_run)
+    if result is None:
+        print("Another archiver pass is running")
+        return
+    verb = "Would archive" if args.dry_run else "Archived"
+    print(f"{verb} {result['conversations']} conversations and {result['logs']} log files")
+    for name in result['expired']:
+        print(f"{'Would remove' if args.dry_run else 'Removed'} {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""Build fingerprinted, minified, precompressed static assets.
+
+Sources live in static/css and static/js. The build writes
+static/dist/<dir>/<name>.<hash>.<ext> plus .gz (and .br when the brotli
+module is installed) siblings, and static/dist/manifest.json mapping each
+source path to its built file. Templates call asset_url('css/chat.css'),
+which resolves through the manifest and falls back to the unbuilt source
+when there is no build (development, tests).
+
+nginx serves static/dist/ straight from disk with gzip_static and
+immutable cache headers, so pages load their assets without touching Flask.
+
+Usage:
+    python assets.py            # build
+    python assets.py --clean    # remove static/dist
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+from logger import get_logger
+
+try:
+    import brotli
+except ImportError:  # optional: .br files are skipped without it
+    brotli = None
+
+logger = get_logger("assets")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+SOURCE_DIRS = ('css', 'js')
+HASH_LENGTH = 10
+
+
+def _segments(source, js=False):
+    """Split source into ('code' | 'string' | 'comment', text) segments.
+
+    Handles quotes, comments and, for JS, template literals (with nested
+    ${...} expressions) and regex literals, so minification never touches
+    the inside of a string.
+    """
+    segments = []
+    code = []
+    stack = []  # brace depths of open ${ expressions inside template literals
+    i, n = 0, len(source)
+
+    def flush():
+        if code:
+            segments.append(('code', ''.join(code)))
+            code.clear()
+
+    def previous_significant():
+        text = ''.join(code).rstrip()
+        if text:
+            return text[-1]
+        for kind, value in reversed(segments):
+            if kind != 'comment' and value.strip():
+                return value.rstrip()[-1]
+        return ''
+
+    while i < n:
+        ch = source[i]
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+            flush()
+            segments.append(('comment', source[i:end]))
+            i = end
+        elif js and source.startswith('//', i):
+            end = source.find('\n', i)
+            end = n if end < 0 else end
+            flush()
+            segments.append(('comment', source[i:end]))
+            i = end
+        elif ch in '"\'' or (js and ch == '`'):
+            j = i + 1
+            while j < n and source[j] != ch:
+                if source[j] == '\\':
+                    j += 1
+                elif ch == '`' and source.startswith('${', j):
+                    break
+                j += 1
+            if ch == '`' and j < n and source[j] != '`':
+                flush()
+                segments.append(('string', source[i:j + 2]))
+                stack.append(0)
+                i = j + 2
+                continue
+            flush()
+            segments.append(('string', source[i:j + 1]))
+            i = j + 1
+        elif js and stack and ch == '{':
+            stack[-1] += 1
+            code.append(ch)
+            i += 1
+        elif js and stack and ch == '}' and stack[-1] == 0:
+            # end of a ${...} expression: the template literal continues
+            stack.pop()
+            j = i + 1
+            while j < n and source[j] != '`':
+                if source[j] == '\\':
+                    j += 1
+                elif source.startswith('${', j):
+                    break
+                j += 1
+            flush()
+            if j < n and source[j] != '`':
+                segments.append(('string', source[i:j + 2]))
+                stack.append(0)
+                i = j + 2
+            else:
+                segments.append(('string', source[i:j + 1]))
+                i = j + 1
+        elif js and stack and ch == '}':
+            stack[-1] -= 1
+            code.append(ch)
+            i += 1
+        elif js and ch == '/' and (previous_significant() in '(,=:[!&|?{};+-*%<>~^'
+                                   or re.search(r'\b(?:return|typeof)\s*$', ''.join(code))):
+            j = i + 1
+            in_class = False
+            while j < n and (source[j] != '/' or in_class):
+                if source[j] == '\\':
+                    j += 1
+                elif source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                j += 1
+            j += 1
+            while j < n and source[j].isalpha():
+                j += 1
+            flush()
+            segments.append(('string', source[i:j]))
+            i = j
+        else:
+            code.append(ch)
+            i += 1
+    flush()
+    return segments
+
+
+def minify_css(source):
+    out = []
+    for kind, text in _segments(source):
+        if kind == 'comment':
+            continue
+        if kind == 'code':
+            text = re.sub(r'\s+', ' ', text)
+            text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+            text = re.sub(r':\s+', ':', text)  # not before ':', which would join a descendant pseudo-class
+            text = text.replace(';}', '}')
+        out.append(text)
+    return ''.join(out).strip() + '\n'
+
+
+def minify_js(source):
+    """Drop comments, indentation and blank lines; newlines are kept for ASI."""
+    out = []
+    for kind, text in _segments(source, js=True):
+        if kind == 'comment':
+            if text.startswith('//') or '\n' not in text:
+                continue
+            text = '\n'
+        elif kind == 'code':
+            text = re.sub(r'[ \t]*\n\s*', '\n', text)
+            text = re.sub(r'[ \t]+', ' ', text)
+        out.append(text)
+    return re.sub(r'\n+', '\n', ''.join(out)).strip() + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Build every source asset; returns the manifest dict.
+
+    Earlier builds are left in place so pages rendered before a deploy can
+    still load the assets they reference; --clean removes them.
+    """
+    manifest = {}
+    for directory in SOURCE_DIRS:
+        source_dir = os.path.join(static_dir, directory)
+        if not os.path.isdir(source_dir):
+            continue
+        for filename in sorted(os.listdir(source_dir)):
+            stem, ext = os.path.splitext(filename)
+            if ext not in MINIFIERS:
+                continue
+            with open(os.path.join(source_dir, filename), 'r', encoding='utf-8') as f:
+                source = f.read()
+            data = MINIFIERS[ext](source).encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+            built = f"{directory}/{stem}.{digest}{ext}"
+            target = os.path.join(dist_dir, built)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            with open(f"{target}.gz", 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(f"{target}.br", 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+            manifest[f"{directory}/{filename}"] = f"dist/{built}"
+            logger.info(f"Built {built}: {len(source)} -> {len(data)} bytes")
+    os.makedirs(dist_dir, exist_ok=True)
+    with open(os.path.join(dist_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class AssetManifest:
+    """Resolves source asset paths to built ones, re-reading the manifest when it changes."""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self._mtime = None
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, name):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return name
+        if mtime != self._mtime:
+            with self._lock:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+                self._mtime = mtime
+        return self._entries.get(name, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build fingerprinted static assets")
+    parser.add_argument('--clean', action='store_true', help="remove the build output")
+    args = parser.parse_args()
+    if args.clean:
+        shutil.rmtree(DIST_DIR, ignore_errors=True)
+        print(f"Removed {DIST_DIR}")
+        return
+    manifest = build()
+    print(f"Built {len(manifest)} assets into {DIST_DIR}" + ("" if brotli else " (brotli not installed, no .br files)"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""Answer a file of questions concurrently, streaming results as NDJSON.
+
+Used by POST /admin/api/batch and from the command line. Results are
+appended to a checkpoint file as they complete, so an interrupted batch
+resumes with only the questions that have no result yet.
+
+Usage:
+    # through a running server (admin login), resuming from answers.ndjson
+    python batch_runner.py lesson1.txt --out answers.ndjson --url http://127.0.0.1:5000
+
+    # in-process, without the web server
+    python batch_runner.py lesson1.jsonl --out answers.ndjson --local --concurrency 4
+
+Question files are plain text (one question per line), JSONL with
+{"id", "question"} objects, or a JSON list of strings or such objects.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+
+from logger import get_logger
+
+logger = get_logger("batch")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BATCH_DIR = os.environ.get('BATCH_DIR', os.path.join(BASE_DIR, 'data', 'batches'))
+MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', 8))
+BATCH_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class RetryLater(Exception):
+    """Raised by an answer function for transient failures (busy, throttled)."""
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def normalize_questions(items):
+    """[(id, question)] from strings or {"id", "question"} dicts; ids default to q0001..."""
+    questions = []
+    seen = set()
+    for number, item in enumerate(items, 1):
+        if isinstance(item, dict):
+            question = str(item.get('question', '')).strip()
+            qid = str(item.get('id') or f"q{number:04d}")
+        else:
+            question = str(item).strip()
+            qid = f"q{number:04d}"
+        if not question:
+            continue
+        if qid in seen:
+            raise ValueError(f"Duplicate question id: {qid}")
+        seen.add(qid)
+        questions.append((qid, question))
+    return questions
+
+
+def parse_questions(text):
+    """Parse question file contents (JSON list, JSONL or plain lines)."""
+    stripped = text.strip()
+    if stripped.startswith('['):
+        return normalize_questions(json.loads(stripped))
+    lines = [line for line in stripped.splitlines() if line.strip()]
+    if lines and all(line.lstrip().startswith('{') for line in lines):
+        return normalize_questions(json.loads(line) for line in lines)
+    return normalize_questions(lines)
+
+
+def batch_id_for(questions):
+    """Stable id for a question set, so re-submitting it resumes the same batch."""
+    digest = hashlib.sha256(json.dumps(questions, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return f"batch_{digest[:16]}"
+
+
+def load_checkpoint(path):
+    """Completed results by question id from an NDJSON checkpoint."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interruption
+            if record.get('type') == 'result' and not record.get('error'):
+                done[record['id']] = record
+    return done
+
+
+class Checkpoint:
+    """Append-only NDJSON file of results."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def append(self, record):
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class BatchRunner:
+    """Bounded worker pool with a shared back-off for rate-limited answers.
+
+    answer(question) returns (answer, sources, served_by) or raises
+    RetryLater; every worker then pauses until the retry time, so a
+    throttled upstream sees the whole batch back off, not one worker.
+    """
+
+    def __init__(self, answer, concurrency=4, max_attempts=3, checkpoint=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.answer = answer
+        self.concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+        self.max_attempts = max_attempts
+        self.checkpoint = checkpoint
+        self.clock = clock
+        self.sleep = sleep
+        self.pause_until = 0.0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def _wait_for_pause(self):
+        while not self.stopped.is_set():
+            with self.lock:
+                remaining = self.pause_until - self.clock()
+            if remaining <= 0:
+                return
+            self.sleep(min(remaining, 0.5))
+
+    def _work(self, work, results):
+        while not self.stopped.is_set():
+            try:
+                qid, question, attempt = work.get_nowait()
+            except queue.Empty:
+                return
+            self._wait_for_pause()
+            started = self.clock()
+            record = {'type': 'result', 'id': qid, 'question': question, 'attempts': attempt}
+            try:
+                answer, sources, served_by = self.answer(question)
+                record.update(answer=answer, sources=sources, served_by=served_by)
+            except RetryLater as e:
+                with self.lock:
+                    self.pause_until = max(self.pause_until, self.clock() + e.retry_after)
+                if attempt < self.max_attempts:
+                    logger.info(f"Batch question {qid} deferred {e.retry_after:.1f}s (attempt {attempt})")
+                    work.put((qid, question, attempt + 1))
+                    continue
+                record['error'] = str(e)
+            except Exception as e:
+                logger.error(f"Batch question {qid} failed: {e}")
+                record['error'] = str(e)
+            record['duration_ms'] = round((self.clock() - started) * 1000, 1)
+            if self.checkpoint:
+                # run() waits for one record per question, so a failed write
+                # must still produce one instead of ending this worker.
+                try:
+                    self.checkpoint.append(record)
+                except Exception as e:
+                    logger.error(f"Batch question {qid} could not be checkpointed: {e}")
+                    record['error'] = f"Checkpoint write failed: {e}"
+            results.put(record)
+
+    def run(self, questions, done=()):
+        """Yield result records as they complete, skipping ids in done."""
+        pending = [(qid, question) for qid, question in questions if qid not in done]
+        work = queue.Queue()
+        for qid, question in pending:
+            work.put((qid, question, 1))
+        results = queue.Queue()
+        workers = [
+            threading.Thread(target=self._work, args=(work, results), daemon=True, name=f"batch-{i}")
+            for i in range(min(self.concurrency, len(pending)))
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for _ in range(len(pending)):
+                yield results.get()
+        finally:
+            self.stopped.set()  # client went away or we are done
+
+
+def run_local(questions, out, concurrency):
+    """Answer questions in-process through server.process_query."""
+    import server
+    from admission import AdmissionRejected
+
+    def answer(question):
+        try:
+            return server.process_query(question, [], '', 'batch')
+        except AdmissionRejected as e:
+            raise RetryLater(str(e), e.retry_after)
+
+    runner = BatchRunner(answer, concurrency, checkpoint=Checkpoint(out))
+    return runner.run(questions, load_checkpoint(out))
+
+
+def run_remote(questions, out, concurrency, url, email, password):
+    """Stream answers from POST /admin/api/batch, appending them to out."""
+    import requests
+
+    done = load_checkpoint(out)
+    remaining = [{'id': qid, 'question': q} for qid, q in questions if qid not in done]
+    if not remaining:
+        return
+    http = requests.Session()
+    response = http.post(f"{url.rstrip('/')}/api/login", json={'email': email, 'password': password})
+    response.raise_for_status()
+    response = http.post(f"{url.rstrip('/')}/admin/api/batch",
+                         json={'questions': remaining, 'concurrency': concurrency}, stream=True)
+    response.raise_for_status()
+    checkpoint = Checkpoint(out)
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            continue
+        record = json.loads(line)
+        if record.get('type') == 'result':
+            checkpoint.append(record)
+            yield record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a question set in bulk")
+    parser.add_argument('questions', help="question file (.txt, .jsonl or .json)")
+    parser.add_argument('--out', required=True, help="NDJSON results file, also the resume checkpoint")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--local', action='store_true', help="run in-process instead of via the server")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--email', default='prof@tcm.org')
+    parser.add_argument('--password', default=os.environ.get('BATCH_PASSWORD', 'password123'))
+    args = parser.parse_args()
+
+    with open(args.questions, 'r', encoding='utf-8') as f:
+        questions = parse_questions(f.read())
+    already = len(load_checkpoint(args.out))
+    print(f"{len(questions)} questions, {already} already answered in {args.out}", file=sys.stderr)
+
+    if args.local:
+        records = run_local(questions, args.out, args.concurrency)
+    else:
+        records = run_remote(questions, args.out, args.concurrency, args.url, args.email, args.password)
+    failed = 0
+    for count, record in enumerate(records, already + 1):
+        failed += bool(record.get('error'))
+        status = f"error: {record['error']}" if record.get('error') else record['served_by']
+        print(f"[{count}/{len(questions)}] {record['id']} {status}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
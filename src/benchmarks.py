@@ -0,0 +1,269 @@
+"""Micro-benchmarks for chat_engine and server hot paths.
+
+Fixtures (feedback files, conversation files and a log file) are generated
+once per size in a temporary directory (BENCH_FIXTURE_DIR) and reused.
+Results can be saved as a baseline and later runs fail when a benchmark is
+slower than the baseline by more than the threshold. Timings depend on the
+machine, so data/bench/baseline.json is local and not committed.
+
+Usage:
+    python benchmarks.py                        # small fixtures, print results
+    python benchmarks.py --sizes small,medium --save-baseline
+    python benchmarks.py --check                # exit 1 on regression
+    python benchmarks.py --only build_context,admin_feedback
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(BASE_DIR, 'data', 'bench')
+FIXTURE_DIR = os.environ.get('BENCH_FIXTURE_DIR', os.path.join(tempfile.gettempdir(), 'shanghan-bench'))
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+# files per data directory and lines in the log file
+SIZES = {'small': 1_000, 'medium': 100_000, 'large': 1_000_000}
+DEFAULT_THRESHOLD = 1.5  # fail when slower than 1.5x the baseline
+
+QUERIES = [
+    "What is Gui Zhi Tang?",
+    "Compare Ma Huang Tang and Xiao Qing Long Tang for wheezing",
+    "fever, aversion to cold, no sweating, floating tight pulse",
+    "How is 石膏 used with 知母?",
+    "太阳病的提纲是什么？",
+    "What is the Shang Han Lun?",
+]
+
+
+class StubClient:
+    """Stands in for DeepSeekClient so prompt assembly runs without the network."""
+
+    last_usage = {}
+
+    def chat(self, messages, system_prompt=None):
+        return "Gui Zhi Tang harmonizes ying and wei."
+
+
+def generate_fixtures(size, root=FIXTURE_DIR, seed=1):
+    """Create (or reuse) size feedback files, conversations and log lines."""
+    count = SIZES[size]
+    directory = os.path.join(root, size)
+    marker = os.path.join(directory, '.complete')
+    if os.path.exists(marker):
+        return directory
+
+    rng = random.Random(seed)
+    feedback_dir = os.path.join(directory, 'feedback')
+    conversations_dir = os.path.join(directory, 'conversations')
+    logs_dir = os.path.join(directory, 'logs')
+    for path in (feedback_dir, conversations_dir, logs_dir):
+        os.makedirs(path, exist_ok=True)
+
+    print(f"Generating {size} fixtures ({count:,} of each) in {directory}")
+    start = datetime(2026, 1, 1)
+    users = ['prof@tcm.org', 'regular@tcm.org']
+    for i in range(count):
+        when = start + timedelta(seconds=i * 37)
+        user = users[i % 2]
+        with open(os.path.join(feedback_dir, f"feedback_{when:%Y%m%d_%H%M%S}_{i:08d}.json"), 'w') as f:
+            json.dump({
+                'message_id': f"msg_{rng.randint(2, 20)}",
+                'rating': rng.choice(['up', 'down']),
+                'feedback': rng.choice(['', 'Helpful', 'Missing dosage', 'Wrong pattern']),
+                'timestamp': when.isoformat(),
+                'user_email': user,
+            }, f, indent=2)
+        messages = []
+        for turn in range(rng.randint(1, 4)):
+            query = rng.choice(QUERIES)
+            messages.append({'role': 'user', 'content': query, 'timestamp': when.isoformat()})
+            messages.append({'role': 'assistant', 'content': f"Answer about {query} " * 20,
+                             'sources': ["Shang Han Lun - Gui Zhi Tang"], 'served_by': 'llm',
+                             'timestamp': when.isoformat()})
+        with open(os.path.join(conversations_dir, f"conversation_{i:032x}_{when:%Y-%m-%d}.json"), 'w') as f:
+            json.dump({'session_id': f"{i:032x}", 'user_email': user,
+                       'timestamp': when.isoformat(), 'messages': messages}, f, indent=2, ensure_ascii=False)
+
+    with open(os.path.join(logs_dir, 'shanghan_20260101.log'), 'w', encoding='utf-8') as f:
+        for i in range(count):
+            when = start + timedelta(seconds=i)
+            f.write(f"{when:%Y-%m-%d %H:%M:%S} | INFO     | server.py:412 | log_route | "
+                    f"REQUEST | POST /api/chat | Status: 200 | Duration: {rng.random():.3f}s\n")
+
+    open(marker, 'w').close()
+    return directory
+
+
+def measure(fn, repeat=5, min_time=0.2):
+    """Best-of-repeat seconds per call, timeit-style."""
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    runs = [timer.timeit(number) / number for _ in range(repeat)]
+    return {'best_s': min(runs), 'median_s': sorted(runs)[len(runs) // 2], 'loops': number}
+
+
+def core_benchmarks():
+    """name -> zero-argument callable for the size-independent hot paths."""
+    from chat_engine import ChatEngine, build_context, format_formula_context
+    from knowledge_base import FORMULAS
+    import query_router
+    from symptom_ranker import get_ranker
+    import server
+
+    engine = ChatEngine('bench')
+    engine.client = StubClient()
+    history = []
+    for query in QUERIES:
+        history.append({'role': 'user', 'content': query})
+        history.append({'role': 'assistant', 'content': f"Answer about {query} " * 30})
+    formulas = list(FORMULAS.values())
+    serializer = server.app.session_interface.get_signing_serializer(server.app)
+    sessions = {}
+    for turns in (10, 40):
+        messages = [dict(m, timestamp=datetime(2026, 1, 1).isoformat(), sources=[]) for m in (history * 10)[:turns]]
+        sessions[turns] = {'user': 'prof@tcm.org', 'session_id': '0' * 32, 'messages': messages}
+
+    benches = {
+        'build_context': lambda: [build_context(q) for q in QUERIES],
+        'format_formula_context': lambda: [format_formula_context(f) for f in formulas],
+        'prompt_assembly': lambda: engine.process_query(QUERIES[1], history[-10:], summary="- Q: earlier turn"),
+        'router_classify': lambda: [query_router.classify(q) for q in QUERIES],
+        'symptom_rank': lambda: get_ranker().rank(QUERIES[2]),
+    }
+    for turns, data in sessions.items():
+        cookie = serializer.dumps(data)
+        benches[f'session_dumps_{turns}'] = lambda data=data: serializer.dumps(data)
+        benches[f'session_loads_{turns}'] = lambda cookie=cookie: serializer.loads(cookie)
+    return benches
+
+
+def admin_benchmarks(size):
+    """Benchmarks for the admin readers over one fixture size."""
+    import server
+
+    directory = generate_fixtures(size)
+    server.BASE_DIR = directory
+    server.FEEDBACK_DIR = os.path.join(directory, 'feedback')
+    server.CONVERSATIONS_DIR = os.path.join(directory, 'conversations')
+    client = server.app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = 'prof@tcm.org'
+
+    def get(path):
+        def call():
+            response = client.get(path)
+            assert response.status_code == 200, response.status_code
+        return call
+
+    def revalidate(path):
+        etag = client.get(path).headers['ETag']
+
+        def call():
+            response = client.get(path, headers={'If-None-Match': etag})
+            assert response.status_code == 304, response.status_code
+        return call
+
+    return {
+        f'admin_logs[{size}]': get('/admin/api/logs'),
+        f'admin_conversations[{size}]': get('/admin/api/conversations'),
+        f'admin_feedback[{size}]': get('/admin/api/feedback'),
+        f'admin_feedback_304[{size}]': revalidate('/admin/api/feedback'),
+    }
+
+
+def run(sizes=('small',), only=None, repeat=5, min_time=0.2):
+    results = {}
+    groups = [core_benchmarks] + [lambda size=size: admin_benchmarks(size) for size in sizes]
+    for group in groups:
+        for name, fn in group().items():
+            if only and name.split('[')[0] not in only:
+                continue
+            # admin readers over big fixtures take seconds per call
+            heavy = '[' in name and not name.endswith('[small]')
+            result = measure(fn, repeat=1 if heavy else repeat, min_time=0 if heavy else min_time)
+            results[name] = result
+            print(f"{name:<32}{result['best_s'] * 1e6:>14.1f} µs  (median {result['median_s'] * 1e6:.1f} µs, "
+                  f"{result['loops']} loops)")
+    return results
+
+
+def check(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Names of benchmarks slower than threshold x their baseline."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        limit = baseline.get('thresholds', {}).get(name, threshold)
+        ratio = result['best_s'] / base['best_s'] if base['best_s'] else 1.0
+        if ratio > limit:
+            regressions.append((name, ratio, limit))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for chat and admin hot paths")
+    parser.add_argument('--sizes', default='small', help=f"comma-separated fixture sizes: {', '.join(SIZES)}")
+    parser.add_argument('--only', help="comma-separated benchmark names")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help="fail on regression against the baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--log', action='store_true', help="keep application logging enabled")
+    args = parser.parse_args()
+
+    os.environ.setdefault('RATE_LIMIT_STORE', os.path.join(tempfile.mkdtemp(), 'ratelimit.bin'))
+    if not args.log:
+        logging.disable(logging.CRITICAL)
+
+    sizes = [s for s in args.sizes.split(',') if s]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+    only = set(args.only.split(',')) if args.only else None
+    results = run(sizes, only, args.repeat)
+
+    if args.save_baseline:
+        existing = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+        existing.setdefault('thresholds', {})
+        existing['created'] = datetime.now().isoformat()
+        existing['python'] = sys.version.split()[0]
+        existing.setdefault('results', {}).update(results)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(existing, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first")
+            return 2
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = check(results, baseline, args.threshold)
+        for name, ratio, limit in regressions:
+            print(f"REGRESSION {name}: {ratio:.2f}x baseline (limit {limit:.2f}x)")
+        if regressions:
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Record and replay upstream chat completions.
+
+A cassette is a JSONL file (optionally .gz) with one line per recorded
+completion:
+
+    {"key": "<sha256>", "query": "...", "content": "...", "usage": {...},
+     "latency": 1.234, "recorded": "2026-10-19T10:00:00"}
+
+The key hashes the normalized request (model, sampling settings and the
+messages with whitespace collapsed), so the same prompt maps to the same
+entry across runs. Requests recorded several times are replayed in
+recording order, cycling, which keeps replays deterministic.
+
+Configured from the environment:
+    DEEPSEEK_CASSETTE       path to the cassette file
+    DEEPSEEK_CASSETTE_MODE  record | replay (default replay)
+    DEEPSEEK_REPLAY_LATENCY latency scale for replay; 1 = as recorded, 0 = none
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import metrics
+from logger import get_logger
+from resilience import UpstreamUnavailable
+
+logger = get_logger("cassette")
+
+RECORD = 'record'
+REPLAY = 'replay'
+KEY_FIELDS = ('model', 'temperature', 'max_tokens')
+
+
+class CassetteMiss(UpstreamUnavailable):
+    """Replay found no recording for the request."""
+
+
+def normalize_request(payload):
+    """The parts of a completion request that determine its answer."""
+    normalized = {field: payload.get(field) for field in KEY_FIELDS}
+    normalized['messages'] = [
+        {'role': m.get('role'), 'content': ' '.join(str(m.get('content', '')).split())}
+        for m in payload.get('messages', [])
+    ]
+    return normalized
+
+
+def request_key(payload):
+    canonical = json.dumps(normalize_request(payload), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class Cassette:
+    """Recorded completions keyed by request hash."""
+
+    def __init__(self, path, mode=REPLAY, latency_scale=1.0, sleep=time.sleep):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.sleep = sleep
+        self.entries = {}
+        self.positions = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            self._load()
+        logger.info(f"Cassette {mode} | {path} | {sum(len(v) for v in self.entries.values())} recordings")
+
+    def _load(self):
+        with _open(self.path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries.setdefault(entry['key'], []).append(entry)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.values())
+
+    def record(self, payload, content, usage, latency):
+        """Append one successful completion."""
+        messages = payload.get('messages', [])
+        query = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+        entry = {
+            'key': request_key(payload),
+            'query': query[-200:],
+            'content': content,
+            'usage': usage,
+            'latency': round(latency, 4),
+            'recorded': datetime.now().isoformat(timespec='seconds'),
+        }
+        with self.lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with _open(self.path, 'a') as f:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self.entries.setdefault(entry['key'], []).append(entry)
+        metrics.increment('cassette.recorded')
+
+    def replay(self, payload):
+        """Return (content, usage) for payload, sleeping the scaled recorded latency.
+
+        Raises CassetteMiss when nothing was recorded for the request.
+        """
+        key = request_key(payload)
+        with self.lock:
+            entries = self.entries.get(key)
+            if not entries:
+                metrics.increment('cassette.miss')
+                raise CassetteMiss(f"No recording for request {key[:12]}")
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+        entry = entries[position % len(entries)]
+        metrics.increment('cassette.hit')
+        if self.latency_scale:
+            self.sleep(entry['latency'] * self.latency_scale)
+        return entry['content'], entry.get('usage') or {}
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def from_env():
+    """Return the shared cassette configured by DEEPSEEK_CASSETTE, or None."""
+    global _cassette
+    path = os.environ.get('DEEPSEEK_CASSETTE')
+    if not path:
+        return None
+    with _cassette_lock:
+        if _cassette is None or _cassette.path != path:
+            _cassette = Cassette(
+                path,
+                mode=os.environ.get('DEEPSEEK_CASSETTE_MODE', REPLAY).lower(),
+                latency_scale=float(os.environ.get('DEEPSEEK_REPLAY_LATENCY', 1.0))
+            )
+        return _cassette
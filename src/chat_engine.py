@@ -6,56 +6,87 @@ import json
 import time
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 
 BASE_DIR = Path(__file__).parent.parent
 sys.path.insert(0, str(BASE_DIR))
 
+import metrics
 from logger import setup_logging, get_logger
+from entity_matcher import get_matcher, HERB
+from herb_index import get_index as get_herb_index
+from symptom_ranker import get_ranker
+from conversation_summary import HISTORY_WINDOW
+from cassette import from_env as cassette_from_env, RECORD as CASSETTE_RECORD, REPLAY as CASSETTE_REPLAY
+from resilience import CircuitBreaker, LatencyTracker, UpstreamUnavailable, UpstreamThrottled, hedged_call
 from knowledge_base import (
     get_formula_info,
     get_all_formulas,
     get_terminology,
     get_pattern_info,
     SYSTEM_PROMPT,
+    KB_VERSION,
     TERMINOLOGY,
     PATTERN_INFO,
     FORMULAS
 )
 
-chat_logger = setup_logging("chat", level=logging.DEBUG)
+chat_logger = setup_logging("chat", level=getattr(logging, os.environ.get('LOG_LEVEL', 'INFO').upper()))
 chat_logger.info("Chat engine initialized")
 
+# Shared by every DeepSeekClient so breaker state survives across requests.
+UPSTREAM_BREAKER = CircuitBreaker('deepseek')
+UPSTREAM_LATENCY = LatencyTracker()
+# Keep-alive connections to the API, so a chat does not pay DNS, TCP and TLS setup.
+UPSTREAM_POOL = requests.Session()
+UPSTREAM_POOL.mount('https://', HTTPAdapter(pool_maxsize=int(os.environ.get('DEEPSEEK_POOL_SIZE', 8))))
+UPSTREAM_POOL.mount('http://', HTTPAdapter(pool_maxsize=int(os.environ.get('DEEPSEEK_POOL_SIZE', 8))))
+UPSTREAM_WARM_TIMEOUT = float(os.environ.get('DEEPSEEK_WARM_TIMEOUT', 3))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 1.0
+SYMPTOM_MIN_SIGNS = 2
+
+USAGE_FIELDS = (
+    'prompt_tokens',
+    'completion_tokens',
+    'prompt_cache_hit_tokens',
+    'prompt_cache_miss_tokens',
+)
+
+
+def record_usage(usage):
+    """Accumulate the provider's token usage, including prompt-cache hits and misses."""
+    metrics.increment('upstream.responses')
+    for field in USAGE_FIELDS:
+        metrics.increment(f'upstream.{field}', usage.get(field) or 0)
+    hit = metrics.get_counter('upstream.prompt_cache_hit_tokens')
+    miss = metrics.get_counter('upstream.prompt_cache_miss_tokens')
+    if hit + miss:
+        metrics.set_gauge('upstream.prompt_cache_hit_ratio', round(hit / (hit + miss), 4))
+
 
 class DeepSeekClient:
     """DeepSeek API client."""
     
     def __init__(self, api_key=None):
         self.api_key = api_key or os.environ.get('DEEPSEEK_API_KEY')
-        self.base_url = "https://api.deepseek.com"
+        self.base_url = os.environ.get('DEEPSEEK_BASE_URL', "https://api.deepseek.com").rstrip('/')
         self.model = "deepseek-chat"
         self.max_retries = 3
-        self.timeout = 60
-        chat_logger.info(f"DeepSeekClient initialized | Model: {self.model} | Timeout: {self.timeout}s")
+        self.timeout = float(os.environ.get('DEEPSEEK_TIMEOUT', 60))
+        self.hedge = os.environ.get('DEEPSEEK_HEDGE', 'false').lower() == 'true'
+        self.last_usage = {}
+        self.cassette = cassette_from_env()
+        chat_logger.info(f"DeepSeekClient initialized | URL: {self.base_url} | Model: {self.model} | Timeout: {self.timeout}s | Hedge: {self.hedge}")
     
     def chat(self, messages, system_prompt=None):
         """Send chat request to DeepSeek API with retry logic."""
         chat_logger.debug(f"DeepSeekClient.chat called with {len(messages)} messages")
         
-        if not self.api_key:
-            chat_logger.error("DeepSeek API key not configured")
-            raise ValueError("DeepSeek API key not configured")
-        
-        chat_logger.debug(f"Using API key: {self.api_key[:8]}...{self.api_key[-4:]}")  # Log partial for security
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",  # Full key for request
-            "Content-Type": "application/json"
-        }
-        
         all_messages = []
         if system_prompt:
-            all_messages.append({"role": "system", "content": system_prompt[:100] + "..."})
+            all_messages.append({"role": "system", "content": system_prompt})
         all_messages.extend(messages)
         
         payload = {
@@ -65,54 +96,109 @@ class DeepSeekClient:
             "max_tokens": 1000
         }
         
+        if self.cassette is not None and self.cassette.mode == CASSETTE_REPLAY:
+            content, self.last_usage = self.cassette.replay(payload)
+            record_usage(self.last_usage)
+            chat_logger.info(f"Replayed response from cassette | Response length: {len(content)} chars")
+            return content
+        
+        if not self.api_key:
+            chat_logger.error("DeepSeek API key not configured")
+            raise ValueError("DeepSeek API key not configured")
+        
+        chat_logger.debug(f"Using API key: {self.api_key[:8]}...{self.api_key[-4:]}")  # Log partial for security
+        
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",  # Full key for request
+            "Content-Type": "application/json"
+        }
+        
         chat_logger.info(f"Sending request to DeepSeek API | Attempt 1/{self.max_retries}")
         
         last_error = None
         for attempt in range(self.max_retries):
+            UPSTREAM_BREAKER.before_call()  # fails fast while the circuit is open
+            started = time.monotonic()
             try:
                 chat_logger.debug(f"API attempt {attempt + 1}/{self.max_retries}")
-                
-                response = requests.post(
-                    f"{self.base_url}/v1/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=self.timeout
-                )
-                
-                if response.status_code == 401:
-                    chat_logger.error("API authentication failed - invalid key")
-                    raise Exception("Invalid API key - please check DEEPSEEK_API_KEY")
-                elif response.status_code == 429:
-                    wait_time = 2 ** attempt
-                    chat_logger.warning(f"Rate limited (429), waiting {wait_time}s before retry")
-                    time.sleep(wait_time)
-                    continue
-                elif response.status_code != 200:
-                    error_msg = f"API returned status {response.status_code}: {response.text[:200]}"
-                    chat_logger.error(error_msg)
-                    raise Exception(f"DeepSeek API error: {response.text}")
-                
-                result = response.json()
-                content = result['choices'][0]['message']['content']
-                chat_logger.info(f"API request successful | Response length: {len(content)} chars")
-                return content
-                
-            except requests.exceptions.Timeout as e:
+                response = self._post(headers, payload)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                UPSTREAM_BREAKER.record_failure(time.monotonic() - started)
                 last_error = e
-                chat_logger.warning(f"Request timeout (attempt {attempt + 1}/{self.max_retries}): {e}")
+                chat_logger.warning(f"Request failed (attempt {attempt + 1}/{self.max_retries}): {e}")
                 if attempt < self.max_retries - 1:
                     wait_time = 2 ** attempt
                     chat_logger.info(f"Retrying in {wait_time}s...")
                     time.sleep(wait_time)
-                    continue
-            except requests.exceptions.ConnectionError as e:
-                last_error = e
-                if attempt < self.max_retries - 1:
-                    wait_time = 2 ** attempt
-                    time.sleep(wait_time)
-                    continue
+                continue
+            except Exception:
+                # Any other error still has to settle the call slot, or a
+                # half-open breaker would keep its probe reserved forever.
+                UPSTREAM_BREAKER.record_failure(time.monotonic() - started)
+                raise
+            
+            duration = time.monotonic() - started
+            if response.status_code == 429 or response.status_code >= 500:
+                UPSTREAM_BREAKER.record_failure(duration)
+            else:
+                UPSTREAM_BREAKER.record_success(duration)
+            
+            if response.status_code == 401:
+                chat_logger.error("API authentication failed - invalid key")
+                raise Exception("Invalid API key - please check DEEPSEEK_API_KEY")
+            elif response.status_code == 429:
+                # No sleeping here: the admission controller backs off instead.
+                chat_logger.warning("Rate limited (429) by DeepSeek API")
+                raise UpstreamThrottled("DeepSeek API rate limited (429)")
+            elif response.status_code >= 500:
+                chat_logger.error(f"API returned status {response.status_code}: {response.text[:200]}")
+                raise UpstreamUnavailable(f"DeepSeek API error: {response.status_code}")
+            elif response.status_code != 200:
+                error_msg = f"API returned status {response.status_code}: {response.text[:200]}"
+                chat_logger.error(error_msg)
+                raise Exception(f"DeepSeek API error: {response.text}")
+            
+            UPSTREAM_LATENCY.observe(duration)
+            result = response.json()
+            content = result['choices'][0]['message']['content']
+            self.last_usage = result.get('usage') or {}
+            record_usage(self.last_usage)
+            if self.cassette is not None and self.cassette.mode == CASSETTE_RECORD:
+                self.cassette.record(payload, content, self.last_usage, duration)
+            chat_logger.info(
+                f"API request successful | Response length: {len(content)} chars | "
+                f"Cache hit/miss tokens: {self.last_usage.get('prompt_cache_hit_tokens', 0)}/"
+                f"{self.last_usage.get('prompt_cache_miss_tokens', 0)}"
+            )
+            return content
+        
+        raise UpstreamUnavailable(f"DeepSeek API timeout after {self.max_retries} attempts: {last_error}")
+    
+    def _post(self, headers, payload):
+        """POST the completion request, hedged with a duplicate when enabled."""
+        def send():
+            return UPSTREAM_POOL.post(
+                f"{self.base_url}/v1/chat/completions",
+                headers=headers,
+                json=payload,
+                timeout=self.timeout
+            )
         
-        raise Exception(f"DeepSeek API timeout after {self.max_retries} attempts: {last_error}")
+        if self.hedge and len(UPSTREAM_LATENCY) >= HEDGE_MIN_SAMPLES:
+            delay = max(HEDGE_MIN_DELAY, UPSTREAM_LATENCY.percentile(95))
+            return hedged_call(send, delay, 'deepseek')
+        return send()
+
+
+def warm_upstream():
+    """Open a pooled connection to the API host; skipped without a key or when replaying a cassette."""
+    recorded = cassette_from_env()
+    if not os.environ.get('DEEPSEEK_API_KEY') or (recorded is not None and recorded.mode == CASSETTE_REPLAY):
+        return False
+    base_url = os.environ.get('DEEPSEEK_BASE_URL', "https://api.deepseek.com").rstrip('/')
+    UPSTREAM_POOL.head(base_url, timeout=UPSTREAM_WARM_TIMEOUT)
+    chat_logger.info(f"Upstream connection warmed: {base_url}")
+    return True
 
 
 def build_context(query):
@@ -150,20 +236,77 @@ def build_context(query):
             context_parts.append(format_pattern_context(pattern, pattern_key))
             sources.append(f"Shang Han Lun - {pattern['name']['en']} Pattern")
     
-    herbs = ['ma huang', 'gui zhi', 'chai hu', 'shi gao', 'huang qin', 'ban xia', 
-             'fu ling', 'dang gui', 'sheng di', 'wu wei zi', 'hou po', 'zhi shi',
-             '麻黄', '桂枝', '柴胡', '石膏', '黄芩', '半夏', '茯苓', '当归', '生地']
+    herb_parts, herb_sources = build_herb_context(query)
+    context_parts.extend(herb_parts)
+    sources.extend(herb_sources)
     
-    for herb in herbs:
-        if herb in query_lower:
-            context_parts.append(f"Note: Query mentions herb '{herb}' - refer to relevant formulas for usage context")
-            break
+    symptom_parts, symptom_sources = build_symptom_context(query)
+    context_parts.extend(symptom_parts)
+    sources.extend(symptom_sources)
     
     if not context_parts:
         context_parts.append("General reference: The Shang Han Lun contains 112 classical formulas organized by the Six Channel (六经辨证) pattern identification system.")
         sources.append("Shang Han Lun - General Reference")
     
-    return "\n\n".join(context_parts), list(set(sources))
+    return "\n\n".join(context_parts), list(dict.fromkeys(sources))
+
+
+def build_herb_context(query):
+    """Context lines for herbs mentioned in the query, from the herb index.
+
+    Lists every formula containing each herb with its dosage and role and,
+    when several herbs are mentioned, the formulas containing all of them.
+    """
+    index = get_herb_index()
+    herbs = [entity.key for entity in get_matcher().entities(query, HERB)]
+    parts = []
+    sources = []
+    
+    for herb in herbs:
+        postings = index.postings[herb]
+        uses = "; ".join(
+            f"{FORMULAS[p.formula]['names']['pinyin']} {FORMULAS[p.formula]['names']['zh']} {p.dosage} ({p.role})"
+            for p in postings
+        )
+        parts.append(f"Herb: {herb} ({postings[0].pinyin}, {postings[0].en}) appears in: {uses}")
+        sources.extend(f"Shang Han Lun - {FORMULAS[p.formula]['names']['pinyin']}" for p in postings)
+    
+    if len(herbs) > 1:
+        shared = index.query(include=herbs)
+        names = ", ".join(FORMULAS[key]['names']['pinyin'] for key in shared) or "none"
+        parts.append(f"Formulas containing all of {', '.join(herbs)}: {names}")
+    
+    return parts, sources
+
+
+def build_symptom_context(query, min_signs=SYMPTOM_MIN_SIGNS):
+    """Context lines ranking formulas and patterns against the signs in the query.
+
+    Only used when the query describes at least min_signs known signs, so
+    plain lookups ("What is Ma Huang?") are left alone.
+    """
+    ranking = get_ranker().rank(query)
+    if len(ranking['matched']) < min_signs:
+        return [], []
+    
+    parts = [f"Presenting signs: {', '.join(ranking['matched'])}"]
+    sources = []
+    formulas = "; ".join(
+        f"{FORMULAS[r['key']]['names']['pinyin']} {FORMULAS[r['key']]['names']['zh']} "
+        f"(score {r['score']}, matches {', '.join(r['matched_signs'])})"
+        for r in ranking['formulas']
+    )
+    if formulas:
+        parts.append(f"Best-matching formulas: {formulas}")
+        sources.extend(f"Shang Han Lun - {FORMULAS[r['key']]['names']['pinyin']}" for r in ranking['formulas'])
+    patterns = "; ".join(
+        f"{PATTERN_INFO[r['key']]['name']['en']} {PATTERN_INFO[r['key']]['name']['zh']} (score {r['score']})"
+        for r in ranking['patterns']
+    )
+    if patterns:
+        parts.append(f"Best-matching patterns: {patterns}")
+        sources.extend(f"Shang Han Lun - {PATTERN_INFO[r['key']]['name']['en']} Pattern" for r in ranking['patterns'])
+    return parts, sources
 
 
 def format_formula_context(formula):
@@ -198,6 +341,25 @@ Characteristics: {characteristics}
 Sub-patterns: {sub_patterns}"""
 
 
+def build_kb_preamble():
+    """Build the knowledge base preamble that every prompt starts with.
+
+    The text only depends on the knowledge base, so it is byte-identical
+    across requests and can be served from the upstream's prompt cache.
+    """
+    parts = [f"Shang Han Lun knowledge base (version {KB_VERSION})"]
+    parts.extend(format_formula_context(formula) for formula in FORMULAS.values())
+    parts.extend(format_pattern_context(pattern, key) for key, pattern in PATTERN_INFO.items())
+    terms = "\n".join(
+        f"{term} ({info.get('pinyin', '')}) - {info.get('en', '')}" for term, info in TERMINOLOGY.items()
+    )
+    parts.append(f"Terminology:\n{terms}")
+    return "\n\n".join(parts)
+
+
+KB_PREAMBLE = build_kb_preamble()
+
+
 class ChatEngine:
     """Chat engine for Shang Han Lun queries."""
     
@@ -206,12 +368,17 @@ class ChatEngine:
         self.system_prompt = SYSTEM_PROMPT
         chat_logger.info("ChatEngine initialized")
     
-    def process_query(self, query, conversation_history=None):
-        """Process user query with conversation history and return answer with sources."""
+    def process_query(self, query, conversation_history=None, summary=None):
+        """Process user query with conversation history and return answer with sources.
+
+        When a rolling summary is given, conversation_history should only hold
+        the turns that have not been folded into it yet. UpstreamUnavailable
+        is re-raised so the caller can serve a fallback answer.
+        """
         if conversation_history is None:
             conversation_history = []
         
-        chat_logger.info(f"Processing query: {query[:100]}... | History: {len(conversation_history)} messages")
+        chat_logger.info(f"Processing query: {query[:100]}... | History: {len(conversation_history)} messages | Summary: {len(summary or '')} chars")
         
         context, sources = build_context(query)
         chat_logger.debug(f"Built context with {len(context)} chars, sources: {sources}")
@@ -230,9 +397,19 @@ Instructions:
 - Focus on most relevant information only"""
         
         try:
-            messages = []
+            # Stable prefix first (system prompt, KB preamble), then the
+            # per-session parts, then the new question with its retrieved context.
+            messages = [{'role': 'system', 'content': KB_PREAMBLE}]
+            
+            if summary:
+                messages.append({
+                    'role': 'system',
+                    'content': f"Summary of the earlier conversation:\n{summary}"
+                })
             
-            for msg in conversation_history[-10:]:  # Last 10 messages for context
+            # prompt_inputs keeps the unfolded tail within HISTORY_WINDOW, so
+            # with a summary nothing is cut here.
+            for msg in conversation_history[-HISTORY_WINDOW:]:
                 if msg.get('role') in ['user', 'assistant']:
                     messages.append({
                         'role': msg['role'],
@@ -244,6 +421,8 @@ Instructions:
             chat_logger.debug(f"Sending {len(messages)} messages to DeepSeek")
             answer = self.client.chat(messages, self.system_prompt)
             chat_logger.info(f"Query processed successfully, answer length: {len(answer)} chars")
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             chat_logger.error(f"Error processing query: {e}")
             answer = f"I apologize, but I encountered an error processing your query: {str(e)}. Please ensure the DeepSeek API key is properly configured."
@@ -252,10 +431,10 @@ Instructions:
         return answer, sources
 
 
-def process_query(query, conversation_history=None, api_key=None):
+def process_query(query, conversation_history=None, api_key=None, summary=None):
     """Convenience function to process a query."""
     engine = ChatEngine(api_key)
-    return engine.process_query(query, conversation_history)
+    return engine.process_query(query, conversation_history, summary)
 
 
 def test_connection(api_key):
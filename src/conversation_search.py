@@ -0,0 +1,350 @@
+"""Full-text search over saved conversations for the admin API.
+
+An inverted index in SQLite (data/search_index.sqlite3) maps each token to
+the messages that contain it and the token positions within each message.
+Latin text is split into lowercase words and digits; runs of CJK characters
+become overlapping bigrams (小柴胡汤 -> 小柴 柴胡 胡汤), so any two adjacent
+characters can be found without a dictionary.
+
+Query syntax: whitespace-separated terms, all of which must appear in the
+conversation; each term, and each "quoted phrase", must match as consecutive
+tokens inside one message. A single CJK character matches every bigram that
+starts with it.
+
+Conversations are indexed as they are saved; sync() catches up with files
+written or archived elsewhere and is run before a search whenever the
+conversation or archive directories have changed.
+
+Usage:
+    python conversation_search.py --rebuild
+    python conversation_search.py '"小柴胡汤"' --since 2026-09-01 --until 2026-09-30
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+from archive import ARCHIVE_DIR, ArchiveReader, file_day
+from http_cache import file_version, store_version
+from logger import get_logger
+
+logger = get_logger("conversation_search")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONVERSATIONS_DIR = os.environ.get('CONVERSATIONS_DIR', os.path.join(BASE_DIR, 'data', 'conversations'))
+INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH', os.path.join(BASE_DIR, 'data', 'search_index.sqlite3'))
+MAX_PER_PAGE = 100
+SNIPPETS_PER_RESULT = 3
+SNIPPET_CONTEXT = 60
+
+_TOKEN = re.compile(r'[㐀-鿿]+|[a-z0-9]+')
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    version TEXT,
+    session_id TEXT,
+    user_email TEXT,
+    timestamp TEXT,
+    day TEXT,
+    message_count INTEGER,
+    archived TEXT
+);
+CREATE INDEX IF NOT EXISTS docs_user_day ON docs (user_email, day);
+CREATE INDEX IF NOT EXISTS docs_day ON docs (day);
+CREATE TABLE IF NOT EXISTS messages (
+    doc INTEGER NOT NULL,
+    msg INTEGER NOT NULL,
+    role TEXT,
+    content TEXT,
+    PRIMARY KEY (doc, msg)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS postings (
+    token TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    msg INTEGER NOT NULL,
+    positions BLOB NOT NULL,
+    PRIMARY KEY (token, doc, msg)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);
+CREATE INDEX IF NOT EXISTS postings_last_char ON postings (substr(token, -1)) WHERE length(token) = 2;
+"""
+
+
+def tokenize(text):
+    """[(token, char offset)] for text: lowercase words, CJK bigrams (a lone CJK character stays whole)."""
+    tokens = []
+    for match in _TOKEN.finditer((text or '').lower()):
+        run, start = match.group(), match.start()
+        if run[0].isascii() or len(run) == 1:
+            tokens.append((run, start))
+        else:
+            tokens.extend((run[i:i + 2], start + i) for i in range(len(run) - 1))
+    return tokens
+
+
+def parse_query(query):
+    """Query string -> list of phrases, each a list of tokens that must be consecutive."""
+    phrases = []
+    for match in _TERM.finditer(query or ''):
+        tokens = [token for token, _ in tokenize(match.group(1) if match.group(1) is not None else match.group(2))]
+        if tokens:
+            phrases.append(tokens)
+    if not phrases:
+        raise ValueError("Query has no searchable terms")
+    return phrases
+
+
+def version_of(path):
+    """file_version(path) as stored in docs.version; sync() reindexes files whose version differs."""
+    version = file_version(path)
+    return ':'.join(map(str, version)) if version else None
+
+
+def _positions(blob):
+    values = array('I')
+    values.frombytes(blob)
+    return values
+
+
+def _snippet(content, position):
+    tokens = tokenize(content)
+    if position >= len(tokens):
+        return content[:2 * SNIPPET_CONTEXT]
+    offset = tokens[position][1]
+    start, end = max(0, offset - SNIPPET_CONTEXT), offset + SNIPPET_CONTEXT
+    return ('…' if start else '') + content[start:end] + ('…' if end < len(content) else '')
+
+
+class SearchIndex:
+    """The SQLite index, with one connection per thread (and per process after a fork)."""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._synced = None
+
+    def _db(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._db()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def add(self, key, data, version=None, archived=None):
+        """(Re)index one conversation under key, its file name."""
+        messages = data.get('messages', [])
+        row = (version, data.get('session_id'), data.get('user_email'), data.get('timestamp'),
+               (data.get('timestamp') or '')[:10] or str(file_day(key) or ''), len(messages), archived)
+        with self._write() as conn:
+            found = conn.execute('SELECT id FROM docs WHERE key = ?', (key,)).fetchone()
+            if found:
+                doc = found[0]
+                conn.execute('DELETE FROM postings WHERE doc = ?', (doc,))
+                conn.execute('DELETE FROM messages WHERE doc = ?', (doc,))
+                conn.execute('UPDATE docs SET version = ?, session_id = ?, user_email = ?, timestamp = ?, day = ?, '
+                             'message_count = ?, archived = ? WHERE id = ?', row + (doc,))
+            else:
+                doc = conn.execute('INSERT INTO docs (version, session_id, user_email, timestamp, day, message_count, '
+                                   'archived, key) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', row + (key,)).lastrowid
+            for msg, message in enumerate(messages):
+                content = message.get('content') or ''
+                conn.execute('INSERT INTO messages VALUES (?, ?, ?, ?)', (doc, msg, message.get('role'), content))
+                positions = {}
+                for position, (token, _) in enumerate(tokenize(content)):
+                    positions.setdefault(token, array('I')).append(position)
+                conn.executemany('INSERT INTO postings VALUES (?, ?, ?, ?)',
+                                 [(token, doc, msg, values.tobytes()) for token, values in positions.items()])
+
+    def remove(self, key):
+        with self._write() as conn:
+            found = conn.execute('SELECT id FROM docs WHERE key = ?', (key,)).fetchone()
+            if found:
+                for table, column in (('postings', 'doc'), ('messages', 'doc'), ('docs', 'id')):
+                    conn.execute(f'DELETE FROM {table} WHERE {column} = ?', (found[0],))
+
+    def sync(self, conversations_dir=CONVERSATIONS_DIR, archive_reader=None):
+        """Bring the index in line with the hot directory and the archive; returns (indexed, removed)."""
+        indexed = {key: (version, archived) for key, version, archived
+                   in self._db().execute('SELECT key, version, archived FROM docs')}
+        hot = {}
+        if os.path.isdir(conversations_dir):
+            for entry in os.scandir(conversations_dir):
+                if entry.name.endswith('.json'):
+                    hot[entry.name] = version_of(entry.path)
+        archived = {key: month for month, key, _ in archive_reader.entries()} if archive_reader else {}
+
+        added = 0
+        for key, version in hot.items():
+            if indexed.get(key, (None,))[0] != version:
+                try:
+                    with open(os.path.join(conversations_dir, key), 'r', encoding='utf-8') as f:
+                        self.add(key, json.load(f), version)
+                    added += 1
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Not indexing unreadable {key}: {e}")
+        missing = {key: month for key, month in archived.items() if key not in hot and key not in indexed}
+        if missing:
+            for month, key, _, data in archive_reader.records(sorted(set(missing.values()))):
+                if key in missing:
+                    self.add(key, json.loads(data), 'archive', month)
+                    added += 1
+        with self._write() as conn:
+            conn.executemany('UPDATE docs SET archived = ?, version = ? WHERE key = ?', [
+                (archived[key], 'archive', key) for key, (_, month) in indexed.items()
+                if key not in hot and key in archived and month != archived[key]
+            ])
+        gone = [key for key in indexed if key not in hot and key not in archived]
+        for key in gone:
+            self.remove(key)
+        if added or gone:
+            logger.info(f"Search index synced: {added} indexed, {len(gone)} removed")
+        return added, len(gone)
+
+    def ensure_current(self, conversations_dir=CONVERSATIONS_DIR, archive_reader=None):
+        """sync() if either store has changed since this process last synced."""
+        validator = (store_version(conversations_dir), archive_reader and store_version(archive_reader.directory))
+        if validator != self._synced:
+            self.sync(conversations_dir, archive_reader)
+            self._synced = validator
+
+    def _phrase_hits(self, tokens, filters, params):
+        """{doc: {msg: first position}} for messages containing tokens consecutively."""
+        conn = self._db()
+        if len(tokens) == 1 and len(tokens[0]) == 1 and not tokens[0].isascii():
+            # A lone CJK character: bigrams starting with it, plus bigrams ending
+            # with it, which is the only token the last character of a run is in.
+            lookups = [('(p.token >= ? AND p.token < ? OR length(p.token) = 2 AND substr(p.token, -1) = ?)',
+                        [tokens[0], tokens[0] + '\U0010ffff', tokens[0]])]
+        else:
+            lookups = [('p.token = ?', [token]) for token in tokens]
+        postings = []
+        for clause, args in lookups:
+            rows = {}
+            for doc, msg, blob in conn.execute(
+                f'SELECT p.doc, p.msg, p.positions FROM postings p JOIN docs d ON d.id = p.doc '
+                f'WHERE {clause}{filters}', args + params
+            ):
+                rows.setdefault((doc, msg), array('I')).extend(_positions(blob))
+            if not rows:
+                return {}
+            postings.append(rows)
+        hits = {}
+        for key in set.intersection(*(set(rows) for rows in postings)):
+            later = [set(rows[key]) for rows in postings[1:]]
+            for start in sorted(postings[0][key]):
+                if all(start + i + 1 in positions for i, positions in enumerate(later)):
+                    hits.setdefault(key[0], {})[key[1]] = start
+                    break
+        return hits
+
+    def search(self, query, user=None, since=None, until=None, page=1, per_page=20):
+        """One page of conversations matching every term, newest first, with message snippets."""
+        phrases = parse_query(query)
+        page, per_page = max(1, page), max(1, min(per_page, MAX_PER_PAGE))
+        filters, params = '', []
+        for column, op, value in (('user_email', '=', user), ('day', '>=', since), ('day', '<=', until)):
+            if value:
+                filters += f' AND d.{column} {op} ?'
+                params.append(str(value))
+
+        hits = None
+        for tokens in phrases:
+            found = self._phrase_hits(tokens, filters, params)
+            if hits is None:
+                hits = found
+            else:
+                hits = {doc: {**hits[doc], **found[doc]} for doc in hits.keys() & found.keys()}
+            if not hits:
+                break
+
+        conn = self._db()
+        docs = []
+        ids = list(hits)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            docs.extend(conn.execute(
+                f"SELECT id, session_id, user_email, timestamp, message_count, archived FROM docs "
+                f"WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        docs.sort(key=lambda row: row[3] or '', reverse=True)
+
+        results = []
+        for doc, session_id, user_email, timestamp, message_count, archived in docs[(page - 1) * per_page:page * per_page]:
+            matched = sorted(hits[doc].items())
+            snippets = []
+            for msg, position in matched[:SNIPPETS_PER_RESULT]:
+                role, content = conn.execute('SELECT role, content FROM messages WHERE doc = ? AND msg = ?',
+                                             (doc, msg)).fetchone()
+                snippets.append({'index': msg, 'role': role, 'text': _snippet(content, position)})
+            results.append({
+                'session_id': session_id,
+                'user_email': user_email,
+                'timestamp': timestamp,
+                'message_count': message_count,
+                'archived': archived,
+                'matching_messages': len(matched),
+                'snippets': snippets,
+            })
+        return {'total': len(docs), 'page': page, 'per_page': per_page, 'results': results}
+
+
+_index = None
+
+
+def get_index():
+    global _index
+    if _index is None:
+        _index = SearchIndex()
+    return _index
+
+
+def main():
+    from export import parse_date
+    parser = argparse.ArgumentParser(description="Search saved conversations")
+    parser.add_argument('query', nargs='?')
+    parser.add_argument('--rebuild', action='store_true', help="reindex every conversation from scratch")
+    parser.add_argument('--user')
+    parser.add_argument('--since', type=parse_date)
+    parser.add_argument('--until', type=parse_date)
+    parser.add_argument('--page', type=int, default=1)
+    args = parser.parse_args()
+
+    index = get_index()
+    if args.rebuild:
+        with index._write() as conn:
+            for table in ('postings', 'messages', 'docs'):
+                conn.execute(f'DELETE FROM {table}')
+    started = time.perf_counter()
+    added, removed = index.sync(CONVERSATIONS_DIR, ArchiveReader(os.path.join(ARCHIVE_DIR, 'conversations')))
+    print(f"Synced in {time.perf_counter() - started:.2f}s: {added} indexed, {removed} removed")
+    if args.query:
+        print(json.dumps(index.search(args.query, args.user, args.since, args.until, args.page),
+                         indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
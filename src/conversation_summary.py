@@ -0,0 +1,219 @@
+"""Rolling conversation summaries for long chat sessions."""
+
+import os
+import re
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from logger import get_logger
+from knowledge_base import FORMULAS, PATTERN_INFO
+
+logger = get_logger("summary")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SUMMARIES_DIR = os.environ.get('SUMMARIES_DIR', os.path.join(BASE_DIR, 'data', 'summaries'))
+
+KEEP_RECENT = 4          # messages always sent verbatim after the summary
+FOLD_THRESHOLD = 8       # fold once this many messages are unfolded
+HISTORY_WINDOW = KEEP_RECENT + FOLD_THRESHOLD  # most unfolded messages a prompt carries
+MAX_SUMMARY_CHARS = 1500
+QUESTION_CHARS = 120
+ANSWER_CHARS = 160
+
+_SENTENCE_END = re.compile(r'(?<=[.!?。！？])\s*')
+
+
+def _entity_names():
+    """Surface forms used to tag summary lines with topics."""
+    names = []
+    for formula in FORMULAS.values():
+        names.append((formula['names']['zh'], formula['names']['pinyin']))
+        names.append((formula['names']['pinyin'], formula['names']['pinyin']))
+    for pattern in PATTERN_INFO.values():
+        names.append((pattern['name']['zh'], pattern['name']['en']))
+    return names
+
+
+ENTITY_NAMES = _entity_names()
+
+
+def _clip(text, limit):
+    text = ' '.join(str(text).split())
+    if len(text) <= limit:
+        return text
+    return text[:limit - 3].rstrip() + '...'
+
+
+def _first_sentence(text):
+    text = re.sub(r'[#*]+', '', str(text)).strip()
+    parts = _SENTENCE_END.split(text, maxsplit=1)
+    return parts[0] if parts else text
+
+
+def _topics(text):
+    found = []
+    lowered = text.lower()
+    for surface, label in ENTITY_NAMES:
+        if surface.lower() in lowered and label not in found:
+            found.append(label)
+    return found
+
+
+def fold_messages(summary, messages):
+    """Fold chat messages into a running summary and return the new summary.
+
+    Each question/answer pair becomes one line; the oldest lines are dropped
+    once the summary exceeds MAX_SUMMARY_CHARS so its size stays bounded.
+    """
+    lines = [line for line in (summary or '').split('\n') if line.strip()]
+    pending_question = None
+
+    for msg in messages:
+        role = msg.get('role')
+        content = msg.get('content', '')
+        if role == 'user':
+            if pending_question:
+                lines.append(f"- Q: {pending_question}")
+            pending_question = _clip(content, QUESTION_CHARS)
+        elif role == 'assistant':
+            answer = _clip(_first_sentence(content), ANSWER_CHARS)
+            topics = _topics(content)
+            line = f"- Q: {pending_question} -> A: {answer}" if pending_question else f"- A: {answer}"
+            if topics:
+                line += f" [{', '.join(topics)}]"
+            lines.append(line)
+            pending_question = None
+
+    if pending_question:
+        lines.append(f"- Q: {pending_question}")
+
+    while len(lines) > 1 and len('\n'.join(lines)) > MAX_SUMMARY_CHARS:
+        lines.pop(0)
+
+    return '\n'.join(lines)
+
+
+class SummaryStore:
+    """Per-session summaries kept in memory and persisted as JSON files."""
+
+    def __init__(self, directory=SUMMARIES_DIR):
+        self.directory = directory
+        self._cache = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, session_id):
+        return os.path.join(self.directory, f"summary_{session_id}.json")
+
+    @staticmethod
+    def _version(filepath):
+        try:
+            st = os.stat(filepath)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def get(self, session_id):
+        """Return the summary record for a session ({'summary': str, 'folded': int}).
+
+        The cached record is reused while the file is unchanged (saves replace
+        it, so its inode and mtime change), so a summary written by another
+        worker is picked up on the next call.
+        """
+        filepath = self._path(session_id)
+        version = self._version(filepath)
+        with self._lock:
+            cached = self._cache.get(session_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        record = {'summary': '', 'folded': 0}
+        if version is not None:
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read summary for session {session_id}: {e}")
+
+        with self._lock:
+            self._cache[session_id] = (version, record)
+        return record
+
+    def save(self, session_id, record):
+        record = dict(record, updated=datetime.now().isoformat())
+        filepath = self._path(session_id)
+        tmp = f"{filepath}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp, filepath)
+        with self._lock:
+            self._cache[session_id] = (self._version(filepath), record)
+
+    def discard(self, session_id):
+        """Forget a session's summary, in memory and on disk."""
+        with self._lock:
+            self._cache.pop(session_id, None)
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def update(self, session_id, messages):
+        """Fold everything but the last KEEP_RECENT messages into the summary."""
+        record = self.get(session_id)
+        folded = record.get('folded', 0)
+        if folded > len(messages):
+            folded = 0
+        if len(messages) - folded < FOLD_THRESHOLD:
+            return record
+
+        fold_until = len(messages) - KEEP_RECENT
+        summary = fold_messages(record.get('summary', ''), messages[folded:fold_until])
+        record = {'summary': summary, 'folded': fold_until}
+        self.save(session_id, record)
+        logger.debug(f"Summary updated for session {session_id} | Folded: {fold_until} messages | {len(summary)} chars")
+        return record
+
+    def prompt_inputs(self, session_id, messages):
+        """Return (summary, unfolded_messages) to build the next prompt from.
+
+        The tail never exceeds HISTORY_WINDOW: if the background fold has
+        fallen that far behind, the fold runs here, so no message is left
+        out of both the summary and the prompt.
+        """
+        if not session_id:
+            return '', messages
+        record = self.get(session_id)
+        folded = record.get('folded', 0)
+        if folded > len(messages):
+            return '', messages
+        if len(messages) - folded > HISTORY_WINDOW:
+            record = self.update(session_id, messages)
+            folded = record['folded']
+        return record.get('summary', ''), messages[folded:]
+
+
+_store = None
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = SummaryStore()
+    return _store
+
+
+def schedule_update(session_id, messages):
+    """Fold the session history in the background, off the request path."""
+    snapshot = [dict(m) for m in messages]
+
+    def run():
+        try:
+            get_store().update(session_id, snapshot)
+        except Exception as e:
+            logger.error(f"Summary update failed for session {session_id}: {e}")
+
+    return _executor.submit(run)
@@ -0,0 +1,119 @@
+"""Match knowledge base entities (formulas, herbs, patterns, terms) in free text."""
+
+import re
+from collections import namedtuple
+
+from knowledge_base import FORMULAS, TERMINOLOGY, PATTERN_INFO
+
+Entity = namedtuple('Entity', ['type', 'key'])
+Match = namedtuple('Match', ['surface', 'start', 'end', 'entities'])
+
+FORMULA = 'formula'
+HERB = 'herb'
+PATTERN = 'pattern'
+TERM = 'term'
+
+# Names used in class and in the lectures that differ from the KB entry names.
+FORMULA_ALIASES = {
+    'da_xiao_chi_hu_tang': ['小柴胡汤', '大柴胡汤', '柴胡汤', 'xiao chai hu tang', 'da chai hu tang',
+                            'chai hu tang', 'minor bupleurum decoction', 'major bupleurum decoction'],
+    'cheng_shi_tang': ['承气汤', '大承气汤', '小承气汤', '调胃承气汤', 'da cheng qi tang',
+                       'xiao cheng qi tang', 'cheng qi tang'],
+}
+
+_CJK = re.compile(r'[㐀-鿿]')
+
+
+def has_cjk(text):
+    return bool(_CJK.search(text))
+
+
+class EntityMatcher:
+    """Longest-match, non-overlapping scanner over every KB surface form.
+
+    Latin surfaces only match on word boundaries; Chinese surfaces match
+    anywhere. A surface can name several entities (麻黄 is both a herb and
+    a term), so each match carries all of them.
+    """
+
+    def __init__(self):
+        self.surfaces = {}
+        self._add_formulas()
+        self._add_herbs()
+        self._add_patterns()
+        self._add_terms()
+
+        parts = []
+        for surface in sorted(self.surfaces, key=len, reverse=True):
+            escaped = re.escape(surface).replace(r'\ ', r'\s+')
+            if has_cjk(surface):
+                parts.append(escaped)
+            else:
+                parts.append(rf'(?<![a-z]){escaped}(?![a-z])')
+        self._pattern = re.compile('|'.join(parts), re.IGNORECASE)
+
+    def _add(self, surface, entity):
+        surface = ' '.join(str(surface).lower().split())
+        if len(surface) < 2:
+            return
+        entities = self.surfaces.setdefault(surface, [])
+        if entity not in entities:
+            entities.append(entity)
+
+    def _add_formulas(self):
+        for key, formula in FORMULAS.items():
+            entity = Entity(FORMULA, key)
+            for name in formula['names'].values():
+                self._add(name, entity)
+            self._add(key.replace('_', ' '), entity)
+            for alias in FORMULA_ALIASES.get(key, []):
+                self._add(alias, entity)
+
+    def _add_herbs(self):
+        for formula in FORMULAS.values():
+            for item in formula['composition']:
+                entity = Entity(HERB, item['herb'])
+                for surface in (item['herb'], item['pinyin'], item['en']):
+                    self._add(surface, entity)
+
+    def _add_patterns(self):
+        for key, pattern in PATTERN_INFO.items():
+            entity = Entity(PATTERN, key)
+            self._add(pattern['name']['zh'], entity)
+            self._add(pattern['name']['en'], entity)
+            self._add(pattern['name']['en'].split(' (')[0], entity)
+            self._add(key.replace('_', ' '), entity)
+
+    def _add_terms(self):
+        for term, info in TERMINOLOGY.items():
+            entity = Entity(TERM, term)
+            for surface in (term, info.get('en', ''), info.get('pinyin', '')):
+                self._add(surface, entity)
+
+    def match(self, text):
+        """Return the Matches found in text, in order of appearance."""
+        matches = []
+        for m in self._pattern.finditer(text):
+            surface = ' '.join(m.group(0).lower().split())
+            matches.append(Match(surface, m.start(), m.end(), self.surfaces[surface]))
+        return matches
+
+    def entities(self, text, entity_type=None):
+        """Return the distinct entities mentioned in text, in order of appearance."""
+        found = []
+        for match in self.match(text):
+            for entity in match.entities:
+                if (entity_type is None or entity.type == entity_type) and entity not in found:
+                    found.append(entity)
+        return found
+
+
+_matcher = None
+
+
+def get_matcher():
+    """Return the shared matcher, building it on first use."""
+    global _matcher
+    if _matcher is None:
+        _matcher = EntityMatcher()
+    return _matcher
@@ -0,0 +1,240 @@
+"""Offline evaluation of the retrieval stage (build_context) on a labeled set.
+
+Each labeled question names the formulas, patterns and Shang Han Lun
+LINEs a good retrieval should surface:
+
+    {"id": "gzt-en", "question": "What is Gui Zhi Tang used for?",
+     "formulas": ["gui_zhi_tang"], "patterns": [], "lines": [12]}
+
+Questions are run through the retrieval stages only, spread over a
+process pool; the LLM is never called. The report has recall@k and MRR
+over formulas and patterns, line recall, and latency percentiles per
+stage, and can be compared with a saved baseline.
+
+Usage:
+    python evaluate_retrieval.py                          # default labeled set
+    python evaluate_retrieval.py --save-baseline
+    python evaluate_retrieval.py --compare --fail-on-regression
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SET = os.path.join(BASE_DIR, 'eval_sets', 'retrieval.jsonl')
+BASELINE_PATH = os.path.join(BASE_DIR, 'data', 'eval', 'retrieval_baseline.json')
+K_VALUES = (1, 3, 5)
+REPEAT = 5  # timing runs per question per stage
+
+_LINE = re.compile(r'(?:\bLINE|\bLine|第)\s*(\d{1,3})\s*条?')
+
+
+def load_labeled(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def source_ids():
+    """Map build_context source strings to 'formula:<key>' / 'pattern:<key>' ids."""
+    from knowledge_base import FORMULAS, PATTERN_INFO
+
+    ids = {f"Shang Han Lun - {f['names']['pinyin']}": f"formula:{key}" for key, f in FORMULAS.items()}
+    ids.update({f"Shang Han Lun - {p['name']['en']} Pattern": f"pattern:{key}" for key, p in PATTERN_INFO.items()})
+    return ids
+
+
+def _forbid_llm(*args, **kwargs):
+    raise RuntimeError("evaluate_retrieval must not call the LLM")
+
+
+def _init_worker():
+    logging.disable(logging.CRITICAL)  # per-call debug logging would dominate the timings
+    import chat_engine
+    chat_engine.DeepSeekClient.chat = _forbid_llm
+
+
+def _stages():
+    from chat_engine import build_context, build_herb_context, build_symptom_context
+    from entity_matcher import get_matcher
+    import query_router
+
+    return {
+        'entities': lambda q: get_matcher().entities(q),
+        'classify': query_router.classify,
+        'herb_context': build_herb_context,
+        'symptom_context': build_symptom_context,
+        'build_context': build_context,
+    }
+
+
+def evaluate_question(item):
+    """Retrieve for one labeled question; returns ranked ids and stage timings."""
+    stages = _stages()
+    timings = {}
+    for name, stage in stages.items():
+        runs = []
+        for _ in range(REPEAT):
+            started = time.perf_counter()
+            stage(item['question'])
+            runs.append(time.perf_counter() - started)
+        timings[name] = min(runs)
+
+    context, sources = stages['build_context'](item['question'])
+    ids = source_ids()
+    retrieved = []
+    for source in sources:
+        source_id = ids.get(source)
+        if source_id and source_id not in retrieved:
+            retrieved.append(source_id)
+    lines = sorted({int(n) for n in _LINE.findall(context)})
+    return {'id': item['id'], 'retrieved': retrieved, 'lines': lines, 'timings': timings}
+
+
+def expected_ids(item):
+    return [f"formula:{k}" for k in item.get('formulas', [])] + [f"pattern:{k}" for k in item.get('patterns', [])]
+
+
+def score(item, result):
+    """recall@k, reciprocal rank and line recall for one question."""
+    expected = set(expected_ids(item))
+    retrieved = result['retrieved']
+    scores = {'id': item['id'], 'retrieved': retrieved, 'expected': sorted(expected)}
+    for k in K_VALUES:
+        scores[f'recall@{k}'] = len(expected & set(retrieved[:k])) / len(expected) if expected else None
+    rank = next((i for i, r in enumerate(retrieved, 1) if r in expected), None)
+    scores['rr'] = 1.0 / rank if rank else 0.0
+    scores['first_hit'] = rank
+    lines = set(item.get('lines', []))
+    scores['line_recall'] = len(lines & set(result['lines'])) / len(lines) if lines else None
+    return scores
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values), 4) if values else None
+
+
+def _pct(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def evaluate(labeled, workers=None):
+    """Run the labeled set and return the report dict."""
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        results = list(pool.map(evaluate_question, labeled, chunksize=max(1, len(labeled) // 16)))
+    elapsed = time.perf_counter() - started
+
+    questions = [score(item, result) for item, result in zip(labeled, results)]
+    summary = {f'recall@{k}': _mean(q[f'recall@{k}'] for q in questions) for k in K_VALUES}
+    summary['mrr'] = _mean(q['rr'] for q in questions if q['expected'])
+    summary['line_recall'] = _mean(q['line_recall'] for q in questions)
+    summary['mean_retrieved'] = _mean(len(q['retrieved']) for q in questions)
+
+    latency = {}
+    for stage in results[0]['timings'] if results else []:
+        values = [r['timings'][stage] * 1000 for r in results]
+        latency[stage] = {
+            'p50_ms': round(_pct(values, 50), 3),
+            'p95_ms': round(_pct(values, 95), 3),
+            'max_ms': round(max(values), 3),
+        }
+    return {
+        'created': datetime.now().isoformat(),
+        'questions_evaluated': len(questions),
+        'wall_seconds': round(elapsed, 2),
+        'summary': summary,
+        'latency': latency,
+        'questions': questions,
+    }
+
+
+def compare(baseline, current):
+    """Metric deltas and questions whose first relevant hit got worse."""
+    metrics = []
+    for name, value in current['summary'].items():
+        old = baseline['summary'].get(name)
+        if old is not None and value is not None:
+            metrics.append({'metric': name, 'baseline': old, 'current': value, 'delta': round(value - old, 4)})
+    for stage, values in current['latency'].items():
+        old = baseline['latency'].get(stage)
+        if old:
+            for field in ('p50_ms', 'p95_ms'):
+                metrics.append({'metric': f"{stage}.{field}", 'baseline': old[field], 'current': values[field],
+                                'delta': round(values[field] - old[field], 3)})
+    before = {q['id']: q for q in baseline['questions']}
+    worse = []
+    for q in current['questions']:
+        old = before.get(q['id'])
+        if old and q['rr'] < old['rr']:
+            worse.append({'id': q['id'], 'baseline_first_hit': old['first_hit'], 'current_first_hit': q['first_hit']})
+    return {'metrics': metrics, 'worse_questions': worse}
+
+
+QUALITY_METRICS = tuple(f'recall@{k}' for k in K_VALUES) + ('mrr', 'line_recall')
+
+
+def print_report(report, diff=None):
+    print(f"{report['questions_evaluated']} questions in {report['wall_seconds']}s")
+    for name, value in report['summary'].items():
+        print(f"  {name:<16}{'n/a' if value is None else value}")
+    print(f"  {'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for stage, values in report['latency'].items():
+        print(f"  {stage:<16}{values['p50_ms']:>10}{values['p95_ms']:>10}{values['max_ms']:>10}")
+    missed = [q['id'] for q in report['questions'] if q['expected'] and not q['first_hit']]
+    if missed:
+        print(f"  no relevant result: {', '.join(missed)}")
+    if diff:
+        print("\nAgainst baseline:")
+        for row in diff['metrics']:
+            print(f"  {row['metric']:<28}{row['baseline']:>10}{row['current']:>10}{row['delta']:>+10}")
+        for row in diff['worse_questions']:
+            print(f"  worse: {row['id']} first hit {row['baseline_first_hit']} -> {row['current_first_hit']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and latency without the LLM")
+    parser.add_argument('labeled', nargs='?', default=DEFAULT_SET, help="labeled questions (JSONL)")
+    parser.add_argument('--workers', type=int, help="process pool size (default: CPU count)")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help="diff against the baseline")
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help="exit 1 when a quality metric drops below the baseline")
+    parser.add_argument('--json', help="also write the full report here")
+    args = parser.parse_args()
+
+    report = evaluate(load_labeled(args.labeled), args.workers)
+    diff = None
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first")
+            return 2
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            diff = compare(json.load(f), report)
+    print_report(report, diff)
+
+    for path in filter(None, [args.json, args.baseline if args.save_baseline else None]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Report saved to {path}")
+
+    if diff and args.fail_on_regression:
+        dropped = [row for row in diff['metrics'] if row['metric'] in QUALITY_METRICS and row['delta'] < 0]
+        if dropped:
+            print(f"Quality regressed: {', '.join(row['metric'] for row in dropped)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
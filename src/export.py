@@ -0,0 +1,225 @@
+"""Streaming export of conversations, messages and feedback as NDJSON or CSV.
+
+Records are read one file (or one archive block) at a time and encoded as
+they are read, so memory use does not depend on the date range; gzip is
+applied on the fly to the same stream. Archived months are included.
+
+Usage:
+    python export.py feedback --format csv -o feedback.csv
+    python export.py messages --since 2026-01-01 --until 2026-06-30 --gzip -o h1.ndjson.gz
+    python export.py conversations --user prof@tcm.org
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import zlib
+from datetime import date
+
+from archive import ARCHIVE_DIR, ArchiveReader, file_day, month_of
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONVERSATIONS_DIR = os.environ.get('CONVERSATIONS_DIR', os.path.join(BASE_DIR, 'data', 'conversations'))
+FEEDBACK_DIR = os.environ.get('FEEDBACK_DIR', os.path.join(BASE_DIR, 'data', 'feedback'))
+
+FIELDS = {
+    'conversations': ('session_id', 'user_email', 'timestamp', 'message_count', 'first_question'),
+    'messages': ('session_id', 'user_email', 'index', 'role', 'timestamp', 'served_by', 'sources', 'content'),
+    'feedback': ('timestamp', 'user_email', 'message_id', 'rating', 'feedback'),
+}
+KINDS = tuple(FIELDS)
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+CHUNK_BYTES = 64 * 1024
+
+
+def parse_date(value):
+    """'YYYY-MM-DD' -> date; empty -> None."""
+    return date.fromisoformat(value) if value else None
+
+
+class ExportFilter:
+    """Inclusive date range on the record timestamp plus an optional user."""
+
+    def __init__(self, since=None, until=None, user=None):
+        self.since = since
+        self.until = until
+        self.user = user or None
+
+    def day_in_range(self, day):
+        return (self.since is None or day >= self.since) and (self.until is None or day <= self.until)
+
+    def matches(self, record):
+        if self.user and record.get('user_email') != self.user:
+            return False
+        try:
+            day = date.fromisoformat((record.get('timestamp') or '')[:10])
+        except ValueError:
+            return self.since is None and self.until is None
+        return self.day_in_range(day)
+
+
+def _files(directory, flt):
+    """Store files in date order, skipping those whose filename date is out of range."""
+    try:
+        names = [entry.name for entry in os.scandir(directory) if entry.name.endswith('.json')]
+    except FileNotFoundError:
+        return []
+    dated = []
+    for name in names:
+        day = file_day(name)
+        if day is None or flt.day_in_range(day):
+            dated.append((day or date.min, name))
+    dated.sort()
+    return [os.path.join(directory, name) for _, name in dated]
+
+
+def _load(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # removed or half-written while exporting
+
+
+def iter_conversations(directory, flt, archive_dir=None):
+    """Archived conversations (if archive_dir is given) for the months in range, then hot ones."""
+    if archive_dir:
+        reader = ArchiveReader(os.path.join(archive_dir, 'conversations'))
+        months = [
+            month for month in reader.months()
+            if (flt.since is None or month >= month_of(flt.since))
+            and (flt.until is None or month <= month_of(flt.until))
+        ]
+        for _, _, entry, data in reader.records(months):
+            if flt.matches(entry):  # the index entry has the user and timestamp
+                yield json.loads(data)
+    for path in _files(directory, flt):
+        data = _load(path)
+        if data and flt.matches(data):
+            yield data
+
+
+def iter_records(kind, flt, conversations_dir=CONVERSATIONS_DIR, feedback_dir=FEEDBACK_DIR, archive_dir=None):
+    """Export rows (dicts keyed by FIELDS[kind]) for one kind, oldest first."""
+    if kind == 'feedback':
+        for path in _files(feedback_dir, flt):
+            data = _load(path)
+            if data and flt.matches(data):
+                yield {field: data.get(field) for field in FIELDS['feedback']}
+        return
+    for data in iter_conversations(conversations_dir, flt, archive_dir):
+        messages = data.get('messages', [])
+        if kind == 'conversations':
+            first = next((m.get('content') for m in messages if m.get('role') == 'user'), None)
+            yield {
+                'session_id': data.get('session_id'),
+                'user_email': data.get('user_email'),
+                'timestamp': data.get('timestamp'),
+                'message_count': len(messages),
+                'first_question': first,
+            }
+            continue
+        for index, message in enumerate(messages):
+            yield {
+                'session_id': data.get('session_id'),
+                'user_email': data.get('user_email'),
+                'index': index,
+                'role': message.get('role'),
+                'timestamp': message.get('timestamp'),
+                'served_by': message.get('served_by'),
+                'sources': message.get('sources'),
+                'content': message.get('content'),
+            }
+
+
+def encode_ndjson(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def encode_csv(records, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for record in records:
+        writer.writerow([
+            json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict)) else value
+            for value in (record.get(field) for field in fields)
+        ])
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _chunks(pieces):
+    """Group small encoded pieces into ~CHUNK_BYTES byte strings."""
+    parts, size = [], 0
+    for piece in pieces:
+        data = piece.encode('utf-8')
+        parts.append(data)
+        size += len(data)
+        if size >= CHUNK_BYTES:
+            yield b''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(kind, fmt='ndjson', compress=False, flt=None, **dirs):
+    """Iterator of bytes for the whole export."""
+    if kind not in FIELDS:
+        raise ValueError(f"Unknown export: {kind} (expected one of {', '.join(KINDS)})")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt} (expected ndjson or csv)")
+    records = iter_records(kind, flt or ExportFilter(), **dirs)
+    pieces = encode_csv(records, FIELDS[kind]) if fmt == 'csv' else encode_ndjson(records)
+    chunks = _chunks(pieces)
+    return _gzip(chunks) if compress else chunks
+
+
+def filename(kind, fmt, compress, flt):
+    span = '_'.join(str(d) for d in (flt.since, flt.until) if d)
+    return f"{kind}{'_' + span if span else ''}.{fmt}{'.gz' if compress else ''}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export conversations, messages or feedback")
+    parser.add_argument('kind', choices=KINDS)
+    parser.add_argument('--format', choices=tuple(FORMATS), default='ndjson')
+    parser.add_argument('--since', type=parse_date, help="first day (YYYY-MM-DD), inclusive")
+    parser.add_argument('--until', type=parse_date, help="last day (YYYY-MM-DD), inclusive")
+    parser.add_argument('--user', help="only this user's records")
+    parser.add_argument('--gzip', action='store_true', help="gzip the output")
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    flt = ExportFilter(args.since, args.until, args.user)
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        written = 0
+        for chunk in export(args.kind, args.format, args.gzip, flt, archive_dir=ARCHIVE_DIR):
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"Wrote {written} bytes to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
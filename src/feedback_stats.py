@@ -0,0 +1,191 @@
+"""Incrementally maintained feedback rollups for the admin dashboard.
+
+Every feedback write folds one record into data/feedback_rollup.json:
+counts per rating overall, per day, per user and per entity (formula, herb,
+pattern) mentioned in the rated answer, plus the answers with the most
+ratings. Days and answers are capped, so the rollup, and with it both the
+update and the dashboard query, stays the same size however much feedback
+accumulates.
+
+Usage:
+    python feedback_stats.py --rebuild     # recompute from data/feedback
+"""
+
+import argparse
+import fcntl
+import glob
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+from logger import get_logger
+
+logger = get_logger("feedback_stats")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FEEDBACK_DIR = os.environ.get('FEEDBACK_DIR', os.path.join(BASE_DIR, 'data', 'feedback'))
+ROLLUP_PATH = os.environ.get('FEEDBACK_ROLLUP_PATH', os.path.join(BASE_DIR, 'data', 'feedback_rollup.json'))
+MAX_DAYS = 400
+MAX_ANSWERS = 500
+ENTITY_TYPES = ('formula', 'herb', 'pattern')
+
+
+def empty_rollup():
+    return {'total': {}, 'days': {}, 'users': {}, 'entities': {}, 'answers': {}}
+
+
+def _bump(counts, rating):
+    counts[rating] = counts.get(rating, 0) + 1
+
+
+def apply(rollup, record):
+    """Fold one feedback record into rollup (in place)."""
+    rating = str(record.get('rating')).lower()
+    timestamp = record.get('timestamp') or ''
+    _bump(rollup['total'], rating)
+    if timestamp[:10]:
+        _bump(rollup['days'].setdefault(timestamp[:10], {}), rating)
+    if record.get('user_email'):
+        _bump(rollup['users'].setdefault(record['user_email'], {}), rating)
+    for entity in record.get('entities') or []:
+        _bump(rollup['entities'].setdefault(entity, {}), rating)
+    if record.get('session_id') and record.get('message_id'):
+        key = f"{record['session_id']}:{record['message_id']}"
+        answer = rollup['answers'].setdefault(key, {'question': record.get('question'), 'counts': {}})
+        _bump(answer['counts'], rating)
+        answer['last'] = timestamp
+
+    if len(rollup['days']) > MAX_DAYS:
+        for day in sorted(rollup['days'])[:-MAX_DAYS]:
+            del rollup['days'][day]
+    if len(rollup['answers']) > MAX_ANSWERS:
+        oldest = min(rollup['answers'], key=lambda k: rollup['answers'][k].get('last') or '')
+        del rollup['answers'][oldest]
+    return rollup
+
+
+def rebuild(feedback_dir=FEEDBACK_DIR):
+    rollup = empty_rollup()
+    records = []
+    for path in glob.glob(os.path.join(feedback_dir, '*.json')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                records.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    for record in sorted(records, key=lambda r: r.get('timestamp') or ''):
+        apply(rollup, record)
+    return rollup
+
+
+class FeedbackRollup:
+    """The rollup file, updated under an flock so every worker can write to it."""
+
+    def __init__(self, path=ROLLUP_PATH, feedback_dir=FEEDBACK_DIR):
+        self.path = path
+        self.feedback_dir = feedback_dir
+        self._cached = (None, None)
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        """Fold in a feedback record that has just been saved to the feedback directory."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(f"{self.path}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    rollup = apply(json.load(f), record)
+            except FileNotFoundError:
+                # First use: start from everything on disk, which includes this record.
+                rollup = rebuild(self.feedback_dir)
+                logger.info(f"Feedback rollup rebuilt from {self.feedback_dir}")
+            self._write(rollup)
+
+    def rebuild(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(f"{self.path}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            rollup = rebuild(self.feedback_dir)
+            self._write(rollup)
+        return rollup
+
+    def _write(self, rollup):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(rollup, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp, self.path)
+
+    def read(self):
+        """The current rollup, re-read only when the file has changed."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return empty_rollup()
+        with self._lock:
+            if self._cached[0] != mtime:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._cached = (mtime, json.load(f))
+            return self._cached[1]
+
+
+def _rate(counts, rating='down'):
+    total = sum(counts.values())
+    return round(counts.get(rating, 0) / total, 4) if total else None
+
+
+def _top(items, limit):
+    ranked = sorted(items.items(), key=lambda kv: (-kv[1].get('down', 0), -sum(kv[1].values()), kv[0]))
+    return [{'key': key, 'counts': counts, 'down_rate': _rate(counts)} for key, counts in ranked[:limit]]
+
+
+def summarize(rollup, days=7, today=None, limit=20):
+    """Dashboard view: window totals and daily series, top users, entities and poorly rated answers."""
+    today = today or date.today()
+    series = []
+    window = {}
+    for offset in range(days - 1, -1, -1):
+        day = (today - timedelta(days=offset)).isoformat()
+        counts = rollup['days'].get(day, {})
+        series.append({'day': day, 'counts': counts})
+        for rating, count in counts.items():
+            window[rating] = window.get(rating, 0) + count
+    answers = sorted(
+        rollup['answers'].items(),
+        key=lambda kv: (-kv[1]['counts'].get('down', 0), -sum(kv[1]['counts'].values()), kv[0])
+    )
+    return {
+        'total': {'counts': rollup['total'], 'down_rate': _rate(rollup['total'])},
+        'window': {'days': days, 'counts': window, 'down_rate': _rate(window)},
+        'daily': series,
+        'users': _top(rollup['users'], limit),
+        'entities': _top(rollup['entities'], limit),
+        'poor_answers': [
+            {'answer': key, 'question': answer.get('question'), 'counts': answer['counts'],
+             'down_rate': _rate(answer['counts']), 'last': answer.get('last')}
+            for key, answer in answers[:limit] if answer['counts'].get('down')
+        ],
+    }
+
+
+_rollup = None
+
+
+def get_rollup():
+    global _rollup
+    if _rollup is None:
+        _rollup = FeedbackRollup()
+    return _rollup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Feedback rollups")
+    parser.add_argument('--rebuild', action='store_true', help="recompute the rollup from the feedback files")
+    parser.add_argument('--days', type=int, default=7)
+    args = parser.parse_args()
+    rollup = get_rollup().rebuild() if args.rebuild else get_rollup().read()
+    print(json.dumps(summarize(rollup, args.days), indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
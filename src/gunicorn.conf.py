@@ -0,0 +1,32 @@
+"""gunicorn settings for production (see deploy/setup-app.sh)."""
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = 120
+
+# Load the app once in the master so the knowledge base and retrieval
+# indexes are shared copy-on-write by every worker. The rate limiter and
+# answer cache live in memory-mapped files and are shared explicitly.
+preload_app = True
+
+
+def when_ready(server):
+    # Build indexes and compile templates in the master so every worker,
+    # including respawned ones, starts with them.
+    import startup
+    from server import app
+    startup.warm_shared(app, freeze=True)
+
+
+def post_fork(server, worker):
+    # Every worker runs the archiver loop; a file lock lets one pass run at a time.
+    import archive
+    archive.start_background()
+    # Connections, mmaps and threads are per process: each worker maps the
+    # shared stores, starts the profiling plan watcher and opens its own
+    # upstream connection before it accepts requests.
+    import startup
+    startup.warm_worker()
@@ -0,0 +1,103 @@
+"""Inverted index from herbs to the formulas that contain them."""
+
+import re
+from collections import namedtuple
+
+from knowledge_base import FORMULAS
+
+Posting = namedtuple('Posting', ['formula', 'herb', 'pinyin', 'en', 'dosage', 'grams', 'pieces', 'role'])
+
+_GRAMS = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(?:-\s*(\d+(?:\.\d+)?))?\s*g\s*$', re.IGNORECASE)
+_PIECES = re.compile(r'^\s*(\d+)\s*pieces?\s*$', re.IGNORECASE)
+
+
+def parse_dosage(dosage):
+    """Parse a dosage string into ((min_g, max_g) or None, pieces or None).
+
+    >>> parse_dosage("12-24g")
+    ((12.0, 24.0), None)
+    >>> parse_dosage("3 pieces")
+    (None, 3)
+    """
+    match = _GRAMS.match(dosage)
+    if match:
+        low = float(match.group(1))
+        high = float(match.group(2)) if match.group(2) else low
+        return (low, high), None
+    match = _PIECES.match(dosage)
+    if match:
+        return None, int(match.group(1))
+    return None, None
+
+
+class UnknownHerb(KeyError):
+    """A query named a herb that is not in any formula."""
+
+
+class HerbIndex:
+    """herb -> [(formula, dosage, role)] postings plus one formula bitset per herb.
+
+    Bit i of a herb's bitset is set when formula_keys[i] contains the
+    herb, so set queries over formulas are integer AND/OR/NOT.
+    """
+
+    def __init__(self, formulas=FORMULAS):
+        self.formulas = formulas
+        self.formula_keys = list(formulas)
+        self.all_bits = (1 << len(self.formula_keys)) - 1
+        self.postings = {}
+        self.bits = {}
+        self.aliases = {}
+
+        for index, (key, formula) in enumerate(formulas.items()):
+            for item in formula['composition']:
+                herb = item['herb']
+                grams, pieces = parse_dosage(item['dosage'])
+                self.postings.setdefault(herb, []).append(Posting(
+                    key, herb, item['pinyin'], item['en'], item['dosage'], grams, pieces, item['role']
+                ))
+                self.bits[herb] = self.bits.get(herb, 0) | (1 << index)
+                for name in (herb, item['pinyin'], item['en']):
+                    self.aliases[' '.join(name.lower().split())] = herb
+
+    def resolve(self, name):
+        """Map a zh/pinyin/English herb name to its index key."""
+        herb = self.aliases.get(' '.join(str(name).lower().split()))
+        if herb is None:
+            raise UnknownHerb(name)
+        return herb
+
+    def formulas_for_bits(self, bits):
+        return [key for index, key in enumerate(self.formula_keys) if bits >> index & 1]
+
+    def query(self, include=(), exclude=(), any_of=()):
+        """Formula keys containing every herb in include, at least one herb in
+        any_of (when given), and none of the herbs in exclude."""
+        bits = self.all_bits
+        for name in include:
+            bits &= self.bits[self.resolve(name)]
+        if any_of:
+            union = 0
+            for name in any_of:
+                union |= self.bits[self.resolve(name)]
+            bits &= union
+        for name in exclude:
+            bits &= ~self.bits[self.resolve(name)]
+        return self.formulas_for_bits(bits)
+
+    def posting(self, herb, formula_key):
+        for posting in self.postings.get(herb, []):
+            if posting.formula == formula_key:
+                return posting
+        return None
+
+
+_index = None
+
+
+def get_index():
+    """Return the shared index, building it on first use."""
+    global _index
+    if _index is None:
+        _index = HerbIndex()
+    return _index
@@ -0,0 +1,92 @@
+"""Cheap validators and conditional GET (ETag / If-None-Match) for JSON endpoints.
+
+A validator is a small tuple describing the state of the storage behind a
+response: file sizes, mtimes, a version counter. It is hashed into an
+ETag; when the client already holds that ETag the handler answers 304
+without reading or encoding anything.
+"""
+
+import fcntl
+import hashlib
+import os
+import struct
+
+from flask import current_app, jsonify, request
+
+VERSION_FILE = '.version'
+_COUNTER = struct.Struct('<Q')
+
+
+def bump_version(directory):
+    """Record a write to a file-per-record store.
+
+    Creating or deleting a file changes the directory mtime, but rewriting
+    an existing file does not, so writers also increment a counter here.
+    The counter is 8 bytes, shared by every worker process and updated
+    under an flock.
+    """
+    fd = os.open(os.path.join(directory, VERSION_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.pwrite(fd, _COUNTER.pack(_read_counter(fd) + 1), 0)
+        os.ftruncate(fd, _COUNTER.size)  # older stores appended a byte per write
+    finally:
+        os.close(fd)
+
+
+def _read_counter(fd):
+    data = os.pread(fd, _COUNTER.size, 0)
+    return _COUNTER.unpack(data)[0] if len(data) == _COUNTER.size else len(data)
+
+
+def read_version(directory):
+    """The bump_version counter of a store directory (0 before the first bump)."""
+    try:
+        fd = os.open(os.path.join(directory, VERSION_FILE), os.O_RDONLY)
+    except OSError:
+        return 0
+    try:
+        return _read_counter(fd)
+    finally:
+        os.close(fd)
+
+
+def store_version(directory):
+    """High-water mark of a store directory: its mtime plus the bump_version counter."""
+    try:
+        st = os.stat(directory)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, read_version(directory))
+
+
+def file_version(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def make_etag(validator):
+    return hashlib.blake2b(repr(validator).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def conditional_json(validator, build):
+    """jsonify(build()) with an ETag, or an empty 304 when the client's copy is current.
+
+    build may return (payload, status) for an error, which is sent without
+    an ETag. The comparison is weak, since nginx marks ETags weak when it
+    gzips a response.
+    """
+    etag = make_etag(validator)
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        payload = build()
+        if isinstance(payload, tuple):
+            return jsonify(payload[0]), payload[1]
+        response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
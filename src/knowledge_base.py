@@ -1,5 +1,8 @@
 """Knowledge base for Shang Han Lun."""
 
+import json
+import hashlib
+
 FORMULAS = {
     "ma_huang_tang": {
         "names": {"zh": "麻黄汤", "pinyin": "Ma Huang Tang", "en": "Ephedra Decoction"},
@@ -205,6 +208,11 @@ Guidelines:
 
 Never claim to be a licensed practitioner."""
 
+# Changes whenever the knowledge base content changes; part of the prompt prefix.
+KB_VERSION = hashlib.sha256(
+    json.dumps([FORMULAS, TERMINOLOGY, PATTERN_INFO], sort_keys=True, ensure_ascii=False).encode('utf-8')
+).hexdigest()[:12]
+
 
 def get_formula_info(formula_key):
     """Get formula information by key."""
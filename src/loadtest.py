@@ -0,0 +1,346 @@
+"""Load generator for the chat server.
+
+Virtual users log in, hold multi-turn conversations through /api/chat,
+leave feedback and log out again. Every request is recorded with its
+latency, status and the size of the session cookie, and the run is
+summarized overall and per time interval.
+
+Usage:
+    # spawn server.py against a local mock upstream and drive it
+    python loadtest.py --spawn --scenario steady --users 20 --duration 60
+
+    # drive an already running server (or nginx in front of it)
+    python loadtest.py --url https://localhost --insecure --users 10
+
+    # compare with an earlier report
+    python loadtest.py --spawn --compare data/loadtest/report_20261019_101500.json
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import requests
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_DIR = os.path.join(BASE_DIR, 'data', 'loadtest')
+
+ACCOUNTS = [('prof@tcm.org', 'password123'), ('regular@tcm.org', 'userpass123')]
+COOKIE_LIMIT = 4096  # browsers drop larger cookies
+
+# Each conversation is a list of turns; later turns lean on earlier ones.
+CONVERSATIONS = [
+    ["What is Gui Zhi Tang?", "Why is Bai Shao paired with Gui Zhi?", "How would you modify it for neck stiffness?"],
+    ["fever, aversion to cold, no sweating, floating tight pulse", "Which formula fits best and why?",
+     "What if the patient also wheezes?"],
+    ["What are the symptoms of Shaoyang pattern?", "Compare Xiao Chai Hu Tang with Da Chai Hu Tang."],
+    ["麻黄汤的组成是什么？", "为什么用杏仁？", "和桂枝汤有什么区别？"],
+    ["What is the dosage of Shi Gao in Bai Hu Tang?", "When should it be avoided?"],
+    ["What is the Shang Han Lun?", "How are the six channels ordered?", "Where does Jueyin fit?",
+     "Give a case where Taiyin turns into Shaoyin."],
+]
+
+Sample = namedtuple('Sample', ['t', 'endpoint', 'status', 'latency', 'cookie_bytes', 'served_by', 'error'])
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list, or None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Recorder:
+    """Thread-safe list of samples, timed from the start of the run."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.samples = []
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, status, latency, cookie_bytes=0, served_by=None, error=None):
+        sample = Sample(round(time.monotonic() - self.started, 4), endpoint, status,
+                        latency, cookie_bytes, served_by, error)
+        with self.lock:
+            self.samples.append(sample)
+
+
+class VirtualUser(threading.Thread):
+    """One simulated user looping over login, a conversation, feedback and logout."""
+
+    def __init__(self, index, base_url, recorder, stop_at, think_time=1.0, feedback_rate=0.3,
+                 verify=True, seed=None):
+        super().__init__(daemon=True, name=f"vu-{index}")
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.stop_at = stop_at
+        self.think_time = think_time
+        self.feedback_rate = feedback_rate
+        self.account = ACCOUNTS[index % len(ACCOUNTS)]
+        self.rng = random.Random(seed if seed is None else seed + index)
+        self.http = requests.Session()
+        self.http.verify = verify
+
+    def request(self, endpoint, payload):
+        started = time.monotonic()
+        try:
+            response = self.http.post(f"{self.base_url}{endpoint}", json=payload, timeout=120)
+        except requests.RequestException as e:
+            self.recorder.add(endpoint, 0, time.monotonic() - started, error=type(e).__name__)
+            return None
+        latency = time.monotonic() - started
+        cookie = self.http.cookies.get('session') or ''
+        served_by = None
+        if endpoint == '/api/chat' and response.status_code == 200:
+            served_by = response.json().get('served_by')
+        self.recorder.add(endpoint, response.status_code, latency, len(cookie), served_by)
+        return response
+
+    def pause(self):
+        if self.think_time:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.think_time)
+
+    def run(self):
+        while time.monotonic() < self.stop_at:
+            email, password = self.account
+            response = self.request('/api/login', {'email': email, 'password': password})
+            if response is None or response.status_code != 200:
+                time.sleep(1)
+                continue
+            for turn in self.rng.choice(CONVERSATIONS):
+                if time.monotonic() >= self.stop_at:
+                    break
+                response = self.request('/api/chat', {'message': turn})
+                if response is not None and response.status_code == 200 and self.rng.random() < self.feedback_rate:
+                    self.request('/api/feedback', {
+                        'message_id': response.json().get('message_id'),
+                        'rating': self.rng.choice(['up', 'up', 'down']),
+                        'feedback': 'load test'
+                    })
+                elif response is not None and response.status_code in (429, 503):
+                    time.sleep(float(response.headers.get('Retry-After', 1)))
+                self.pause()
+            self.request('/api/logout', {})
+
+
+def summarize_samples(samples, duration):
+    """Counts, throughput, latency percentiles and error rate for samples."""
+    latencies = [s.latency for s in samples]
+    errors = [s for s in samples if s.error or s.status >= 400 or s.status == 0]
+    statuses = {}
+    for s in samples:
+        key = s.error or str(s.status)
+        statuses[key] = statuses.get(key, 0) + 1
+    cookies = [s.cookie_bytes for s in samples if s.cookie_bytes]
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / duration, 3) if duration else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        'p90_ms': round(percentile(latencies, 90) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+        'max_ms': round(max(latencies) * 1000, 1) if latencies else None,
+        'error_rate': round(len(errors) / len(samples), 4) if samples else 0.0,
+        'statuses': statuses,
+        'cookie_bytes_mean': round(sum(cookies) / len(cookies)) if cookies else 0,
+        'cookie_bytes_max': max(cookies) if cookies else 0,
+        'cookies_over_limit': sum(1 for c in cookies if c > COOKIE_LIMIT),
+    }
+
+
+def build_report(samples, duration, interval=10.0, config=None):
+    """Summaries overall, per endpoint and per time interval."""
+    endpoints = sorted({s.endpoint for s in samples})
+    served_by = {}
+    for s in samples:
+        if s.served_by:
+            served_by[s.served_by] = served_by.get(s.served_by, 0) + 1
+
+    timeline = []
+    buckets = int(duration // interval) + (1 if duration % interval else 0)
+    for bucket in range(buckets):
+        start = bucket * interval
+        window = [s for s in samples if start <= s.t < start + interval]
+        span = min(interval, duration - start)
+        entry = summarize_samples(window, span)
+        entry['t'] = start
+        del entry['statuses']
+        timeline.append(entry)
+
+    return {
+        'created': datetime.now().isoformat(),
+        'config': config or {},
+        'duration_seconds': round(duration, 3),
+        'overall': summarize_samples(samples, duration),
+        'endpoints': {e: summarize_samples([s for s in samples if s.endpoint == e], duration) for e in endpoints},
+        'served_by': served_by,
+        'timeline': timeline,
+    }
+
+
+COMPARED = ('throughput_rps', 'p50_ms', 'p99_ms', 'error_rate', 'cookie_bytes_max')
+
+
+def compare_reports(baseline, current):
+    """Per endpoint deltas of the headline numbers between two reports."""
+    rows = []
+    for endpoint in ['overall'] + sorted(current['endpoints']):
+        before = baseline['overall'] if endpoint == 'overall' else baseline['endpoints'].get(endpoint)
+        after = current['overall'] if endpoint == 'overall' else current['endpoints'][endpoint]
+        if not before:
+            continue
+        for field in COMPARED:
+            old, new = before.get(field), after.get(field)
+            if old is None or new is None:
+                continue
+            change = round((new - old) / old * 100, 1) if old else None
+            rows.append({'endpoint': endpoint, 'metric': field, 'baseline': old, 'current': new, 'change_pct': change})
+    return rows
+
+
+def print_report(report, comparison=None):
+    overall = report['overall']
+    print(f"\nDuration {report['duration_seconds']}s | {overall['requests']} requests | "
+          f"{overall['throughput_rps']} req/s | errors {overall['error_rate']:.2%}")
+    print(f"{'endpoint':<16}{'count':>8}{'rps':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'err':>8}")
+    for endpoint, s in report['endpoints'].items():
+        print(f"{endpoint:<16}{s['requests']:>8}{s['throughput_rps']:>9}{s['p50_ms']:>10}"
+              f"{s['p90_ms']:>10}{s['p99_ms']:>10}{s['error_rate']:>8.2%}")
+    print(f"Served by: {report['served_by']}")
+    print(f"Session cookie: mean {overall['cookie_bytes_mean']} B, max {overall['cookie_bytes_max']} B, "
+          f"{overall['cookies_over_limit']} responses over {COOKIE_LIMIT} B")
+    print(f"\n{'t':>6}{'rps':>9}{'p50 ms':>10}{'p99 ms':>10}{'err':>8}{'cookie max':>12}")
+    for entry in report['timeline']:
+        print(f"{entry['t']:>6.0f}{entry['throughput_rps']:>9}{str(entry['p50_ms']):>10}"
+              f"{str(entry['p99_ms']):>10}{entry['error_rate']:>8.2%}{entry['cookie_bytes_max']:>12}")
+    if comparison:
+        print(f"\n{'endpoint':<16}{'metric':<18}{'baseline':>12}{'current':>12}{'change':>10}")
+        for row in comparison:
+            change = f"{row['change_pct']:+.1f}%" if row['change_pct'] is not None else 'n/a'
+            print(f"{row['endpoint']:<16}{row['metric']:<18}{row['baseline']:>12}{row['current']:>12}{change:>10}")
+
+
+def spawn_stack(port, scenario):
+    """Start a mock upstream in-process and server.py pointed at it."""
+    from mock_upstream import MockUpstream, load_scenario
+
+    upstream = MockUpstream(load_scenario(scenario) if scenario else None).start()
+    state_dir = tempfile.mkdtemp()
+    env = os.environ.copy()
+    env.update({
+        'PORT': str(port),
+        'FLASK_DEBUG': 'false',
+        'DEEPSEEK_API_KEY': 'mock',
+        'DEEPSEEK_BASE_URL': upstream.url,
+        'DEEPSEEK_TIMEOUT': env.get('DEEPSEEK_TIMEOUT', '30'),
+        # keep the run's conversations, feedback and other state out of data/
+        'DATA_DIR': state_dir,
+        'CONVERSATIONS_DIR': os.path.join(state_dir, 'conversations'),
+        'FEEDBACK_DIR': os.path.join(state_dir, 'feedback'),
+        'FEEDBACK_ROLLUP_PATH': os.path.join(state_dir, 'feedback_rollup.json'),
+        'ARCHIVE_DIR': os.path.join(state_dir, 'archive'),
+        'SEARCH_INDEX_PATH': os.path.join(state_dir, 'search_index.sqlite3'),
+        'BATCH_DIR': os.path.join(state_dir, 'batches'),
+        'SUMMARIES_DIR': os.path.join(state_dir, 'summaries'),
+        'ROUTING_DIR': os.path.join(state_dir, 'routing'),
+        'PROFILE_DIR': os.path.join(state_dir, 'profiles'),
+        'RATE_LIMIT_STORE': os.path.join(state_dir, 'ratelimit.bin'),
+        'ANSWER_CACHE_PATH': os.path.join(state_dir, 'answer_cache.bin'),
+        # every virtual user shares two accounts and one IP
+        'RATE_LIMITS': env.get('RATE_LIMITS', json.dumps({'chat': [], 'login': []})),
+    })
+    server = subprocess.Popen([sys.executable, 'server.py'], env=env, cwd=BASE_DIR,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(30):
+        try:
+            requests.get(base_url, timeout=1)
+            return upstream, server, base_url
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.5)
+    server.terminate()
+    upstream.stop()
+    raise RuntimeError("Server failed to start")
+
+
+def run(base_url, users=10, duration=30.0, ramp=5.0, think_time=1.0, feedback_rate=0.3,
+        interval=10.0, verify=True, seed=None):
+    """Drive base_url with virtual users and return the report dict."""
+    recorder = Recorder()
+    stop_at = recorder.started + duration
+    threads = []
+    for index in range(users):
+        vu = VirtualUser(index, base_url, recorder, stop_at, think_time, feedback_rate, verify, seed)
+        threads.append(vu)
+        vu.start()
+        if ramp and users > 1:
+            time.sleep(ramp / users)
+    for vu in threads:
+        vu.join()
+    elapsed = time.monotonic() - recorder.started
+    config = {'url': base_url, 'users': users, 'duration': duration, 'ramp': ramp,
+              'think_time': think_time, 'feedback_rate': feedback_rate}
+    return build_report(recorder.samples, elapsed, interval, config)
+
+
+def save_report(report, directory=REPORT_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Shanghan-TCM chat server")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="server or nginx base URL")
+    parser.add_argument('--spawn', action='store_true', help="start server.py against the mock upstream")
+    parser.add_argument('--port', type=int, default=5055, help="port for --spawn")
+    parser.add_argument('--scenario', default='steady', help="mock upstream scenario for --spawn")
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--ramp', type=float, default=5.0, help="seconds to start all users")
+    parser.add_argument('--think-time', type=float, default=1.0)
+    parser.add_argument('--feedback-rate', type=float, default=0.3)
+    parser.add_argument('--interval', type=float, default=10.0, help="timeline bucket seconds")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--insecure', action='store_true', help="skip TLS verification (self-signed nginx)")
+    parser.add_argument('--out', default=REPORT_DIR, help="report directory")
+    parser.add_argument('--compare', help="earlier report to compare against")
+    args = parser.parse_args()
+
+    upstream = server = None
+    base_url = args.url
+    if args.spawn:
+        upstream, server, base_url = spawn_stack(args.port, args.scenario)
+    try:
+        report = run(base_url, args.users, args.duration, args.ramp, args.think_time,
+                     args.feedback_rate, args.interval, not args.insecure, args.seed)
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+        if upstream:
+            upstream.stop()
+
+    comparison = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            comparison = compare_reports(json.load(f), report)
+        report['comparison'] = {'baseline': args.compare, 'rows': comparison}
+    path = save_report(report, args.out)
+    print_report(report, comparison)
+    print(f"\nReport saved to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""Shared tail of the newest log file for the live admin log feed.
+
+One background thread per process follows the log the way `tail -F`
+does (including rotation) and keeps the most recent records in memory.
+Every admin tab reads from that buffer, so watching the log never
+re-reads the file.
+
+A record's cursor is "<inode>:<byte offset after the line>". Every
+worker tails the same file, so a cursor handed out by one worker is
+valid on any other. A client resumes after reconnecting by sending its
+last cursor.
+"""
+
+import glob
+import os
+import threading
+import time
+from collections import deque
+
+from logger import get_logger
+
+logger = get_logger("log_feed")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.path.join(BASE_DIR, 'logs')
+BUFFER_RECORDS = int(os.environ.get('LOG_FEED_BUFFER', 5000))
+BACKLOG_BYTES = 1024 * 1024  # history loaded when the tailer starts
+POLL_SECONDS = 0.25
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+def parse_line(line):
+    """Split a formatted log line into fields; other lines are kept as raw."""
+    parts = [part.strip() for part in line.strip().split(' | ', 4)]
+    if len(parts) == 5 and parts[1] in LEVELS:
+        return {
+            'timestamp': parts[0],
+            'level': parts[1],
+            'location': parts[2],
+            'function': parts[3],
+            'message': parts[4]
+        }
+    return {'raw': line.strip()}
+
+
+def parse_levels(value):
+    """'warning,error' -> {'WARNING', 'ERROR'}; empty means every level."""
+    levels = {part.strip().upper() for part in (value or '').split(',') if part.strip()}
+    unknown = levels - set(LEVELS)
+    if unknown:
+        raise ValueError(f"Unknown level: {', '.join(sorted(unknown))}")
+    return levels or None
+
+
+def parse_cursor(value):
+    try:
+        inode, offset = value.split(':')
+        return int(inode), int(offset)
+    except (AttributeError, ValueError):
+        return None
+
+
+def matches(record, levels):
+    return levels is None or record.get('level') in levels
+
+
+class LogTailer:
+    """Follows the newest *.log file in a directory into a bounded record buffer."""
+
+    def __init__(self, directory=LOG_DIR, buffer_records=BUFFER_RECORDS, poll_seconds=POLL_SECONDS):
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self._records = deque(maxlen=buffer_records)
+        self._changed = threading.Condition()
+        self._thread = None
+        self._file = None
+        self._inode = None
+        self._offset = 0
+        self._partial = b''
+        self._level = None  # level of the last formatted line, given to traceback lines
+
+    def ensure_started(self):
+        """Start the tail thread (again after a fork, which does not copy threads)."""
+        with self._changed:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='log-tailer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Log tailer poll failed: {e}")
+            time.sleep(self.poll_seconds)
+
+    def _newest(self):
+        files = sorted(glob.glob(os.path.join(self.directory, '*.log')), reverse=True)
+        return files[0] if files else None
+
+    def poll(self):
+        """Read whatever was appended since the last poll; returns the number of new records."""
+        path = self._newest()
+        if path is None:
+            return 0
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return 0
+        added = 0
+        if self._file is None or st.st_ino != self._inode:
+            rotated = self._file is not None
+            if rotated:
+                added += self._read()  # drain the rotated-away file first
+                self._file.close()
+            self._file = open(path, 'rb')
+            self._inode = st.st_ino
+            start = 0 if rotated else max(0, st.st_size - BACKLOG_BYTES)
+            self._file.seek(start)
+            if start:
+                self._file.readline()  # skip the partial first line
+            self._offset = self._file.tell()
+            self._partial = b''
+        elif st.st_size < self._offset:
+            self._file.seek(0)  # truncated in place
+            self._offset = 0
+            self._partial = b''
+        added += self._read()
+        return added
+
+    def _read(self):
+        data = self._file.read()
+        if not data:
+            return 0
+        data = self._partial + data
+        lines = data.split(b'\n')
+        self._partial = lines.pop()
+        offset = self._offset
+        new = []
+        for line in lines:
+            offset += len(line) + 1
+            if not line.strip():
+                continue
+            record = parse_line(line.decode('utf-8', errors='replace'))
+            if 'level' in record:
+                self._level = record['level']
+            elif self._level:
+                record['level'] = self._level
+            record['cursor'] = f"{self._inode}:{offset}"
+            record['_position'] = (self._inode, offset)
+            new.append(record)
+        self._offset = offset
+        if new:
+            with self._changed:
+                self._records.extend(new)
+                self._changed.notify_all()
+        return len(new)
+
+    def _after(self, cursor):
+        """Records newer than cursor.
+
+        A cursor older than the buffer resumes at the first buffered record of
+        its file. An unknown or malformed cursor resumes at the first buffered
+        record of the current file, so older files are not replayed.
+        """
+        position = parse_cursor(cursor)
+        records = self._records
+        if position is not None:
+            inode, offset = position
+            first = None
+            for index in range(len(records) - 1, -1, -1):
+                record_inode, record_offset = records[index]['_position']
+                if record_inode == inode:
+                    if record_offset <= offset:
+                        return [records[i] for i in range(index + 1, len(records))]
+                    first = index
+            if first is not None:
+                return [records[i] for i in range(first, len(records))]
+        start = len(records)
+        while start and records[start - 1]['_position'][0] == self._inode:
+            start -= 1
+        return [records[i] for i in range(start, len(records))]
+
+    def tail(self, count, levels=None):
+        """The last count matching records and the cursor to continue from."""
+        with self._changed:
+            cursor = self._records[-1]['cursor'] if self._records else None
+            selected = [r for r in self._records if matches(r, levels)][-count:] if count else []
+        return [public(r) for r in selected], cursor
+
+    def wait(self, cursor, levels=None, timeout=0.0):
+        """Matching records after cursor, waiting up to timeout for some to arrive.
+
+        Returns (records, cursor); the cursor advances past records that were
+        filtered out, so they are not scanned again.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                new = self._after(cursor)
+                if new:
+                    cursor = new[-1]['cursor']
+                    selected = [public(r) for r in new if matches(r, levels)]
+                    if selected:
+                        return selected, cursor
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], cursor
+                self._changed.wait(remaining)
+
+
+def public(record):
+    return {key: value for key, value in record.items() if key != '_position'}
+
+
+_tailer = None
+_tailer_lock = threading.Lock()
+
+
+def get_tailer():
+    """The process-wide tailer of the application log, started on first use."""
+    global _tailer
+    with _tailer_lock:
+        if _tailer is None:
+            _tailer = LogTailer()
+            _tailer.poll()  # load the backlog before the first caller asks for a tail
+        _tailer.ensure_started()
+    return _tailer
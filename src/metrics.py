@@ -0,0 +1,43 @@
+"""In-process counters and gauges for the admin metrics view."""
+
+import threading
+import time
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_started = time.time()
+
+
+def increment(name, value=1):
+    """Add value to a counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    """Set a gauge to its current value."""
+    with _lock:
+        _gauges[name] = value
+
+
+def get_counter(name):
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot():
+    """Return a copy of all counters and gauges."""
+    with _lock:
+        return {
+            'uptime_seconds': round(time.time() - _started, 1),
+            'counters': dict(sorted(_counters.items())),
+            'gauges': dict(sorted(_gauges.items())),
+        }
+
+
+def reset():
+    """Clear all metrics (used by tests and benchmarks)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
@@ -0,0 +1,325 @@
+"""Local stand-in for the DeepSeek /v1/chat/completions endpoint.
+
+Point DeepSeekClient at it with DEEPSEEK_BASE_URL=http://127.0.0.1:8900
+(any DEEPSEEK_API_KEY works). Latency, streaming speed and injected
+failures come from a scenario file:
+
+    {
+      "seed": 7,
+      "latency": {"distribution": "lognormal", "median": 1.2, "sigma": 0.5},
+      "tokens_per_second": 40,
+      "completion_tokens": 180,
+      "errors": {"429": 0.05, "503": 0.02, "timeout": 0.01, "reset": 0.01},
+      "phases": [
+        {"duration": 30},
+        {"duration": 20, "errors": {"503": 0.6}},
+        {"duration": 30}
+      ]
+    }
+
+Phases run back to back from server start (or the last POST /mock/scenario),
+each overriding the top-level settings; the last phase stays in effect.
+
+Usage:
+    python mock_upstream.py --port 8900 --scenario scenarios/brownout.json
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from logger import get_logger
+
+logger = get_logger("mock_upstream")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCENARIO_DIR = os.path.join(BASE_DIR, 'scenarios')
+
+DEFAULT_SCENARIO = {
+    'seed': None,
+    'latency': {'distribution': 'fixed', 'seconds': 0.05},
+    'tokens_per_second': 0,        # 0 sends the whole completion at once
+    'completion_tokens': 120,
+    'errors': {},                  # status code or "timeout"/"reset" -> probability
+    'timeout_seconds': 120.0,      # how long an injected timeout hangs
+    'reply': None,                 # fixed reply text; generated when None
+    'phases': [],
+}
+
+WORDS = (
+    "Zhang Zhongjing describes this pattern in the Shang Han Lun. The formula releases the exterior, "
+    "harmonizes ying and wei, and is adjusted according to sweating, pulse and the stage of disease. "
+    "Consider the six channel framework when comparing presentations."
+).split()
+
+
+def load_scenario(path):
+    """Read a scenario file; a bare name is looked up in scenarios/."""
+    if not os.path.exists(path):
+        candidate = os.path.join(SCENARIO_DIR, path if path.endswith('.json') else f"{path}.json")
+        if os.path.exists(candidate):
+            path = candidate
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def sample_latency(spec, rng):
+    """Draw one latency in seconds from a distribution spec."""
+    kind = spec.get('distribution', 'fixed')
+    if kind == 'fixed':
+        value = spec.get('seconds', 0.0)
+    elif kind == 'uniform':
+        value = rng.uniform(spec['low'], spec['high'])
+    elif kind == 'normal':
+        value = rng.gauss(spec['mean'], spec['stddev'])
+    elif kind == 'exponential':
+        value = rng.expovariate(1.0 / spec['mean'])
+    elif kind == 'lognormal':
+        value = rng.lognormvariate(math.log(spec['median']), spec['sigma'])
+    else:
+        raise ValueError(f"Unknown latency distribution: {kind}")
+    return max(0.0, min(value, spec.get('max', float('inf'))))
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class Scenario:
+    """Scenario settings with time-based phases."""
+
+    def __init__(self, config=None, clock=time.monotonic):
+        self.config = dict(DEFAULT_SCENARIO, **(config or {}))
+        self.clock = clock
+        self.started = clock()
+        self.rng = random.Random(self.config['seed'])
+        self.lock = threading.Lock()
+
+    def current(self):
+        """Settings in effect now: the top level merged with the active phase."""
+        settings = {k: v for k, v in self.config.items() if k != 'phases'}
+        elapsed = self.clock() - self.started
+        phase = None
+        for candidate in self.config['phases']:
+            phase = candidate
+            elapsed -= candidate.get('duration', float('inf'))
+            if elapsed < 0:
+                break
+        if phase:
+            settings.update({k: v for k, v in phase.items() if k != 'duration'})
+        return settings
+
+    def draw(self):
+        """Pick (settings, outcome, latency) for one request."""
+        settings = self.current()
+        with self.lock:
+            roll = self.rng.random()
+            latency = sample_latency(settings['latency'], self.rng)
+        outcome = 'ok'
+        for name, probability in settings['errors'].items():
+            if roll < probability:
+                outcome = str(name)
+                break
+            roll -= probability
+        return settings, outcome, latency
+
+
+class MockUpstream:
+    """ThreadingHTTPServer serving the mock endpoint; usable in-process."""
+
+    def __init__(self, scenario=None, host='127.0.0.1', port=0):
+        self.scenario = Scenario(scenario)
+        self.stats = {'requests': 0, 'ok': 0, 'streamed': 0, 'errors': {}}
+        self.stats_lock = threading.Lock()
+        self.seen_prefixes = set()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info(f"Mock upstream listening on {self.url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, outcome, streamed=False):
+        with self.stats_lock:
+            self.stats['requests'] += 1
+            if outcome == 'ok':
+                self.stats['ok'] += 1
+                self.stats['streamed'] += int(streamed)
+            else:
+                self.stats['errors'][outcome] = self.stats['errors'].get(outcome, 0) + 1
+
+    def usage(self, messages, completion_tokens):
+        """DeepSeek-style usage; a system prompt seen before counts as cache hits."""
+        prompt_tokens = sum(estimate_tokens(m.get('content', '')) for m in messages)
+        prefix = messages[0].get('content', '') if messages and messages[0].get('role') == 'system' else ''
+        digest = hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+        with self.stats_lock:
+            hit = estimate_tokens(prefix) if prefix and digest in self.seen_prefixes else 0
+            self.seen_prefixes.add(digest)
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'prompt_cache_hit_tokens': hit,
+            'prompt_cache_miss_tokens': prompt_tokens - hit,
+        }
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                logger.debug(f"{self.address_string()} {format % args}")
+
+            def send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def read_json(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length) or b'{}')
+
+            def do_GET(self):
+                if self.path == '/mock/stats':
+                    with upstream.stats_lock:
+                        body = json.loads(json.dumps(upstream.stats))
+                    body['settings'] = upstream.scenario.current()
+                    return self.send_json(200, body)
+                self.send_json(404, {'error': {'message': 'Not found'}})
+
+            def do_POST(self):
+                if self.path == '/mock/scenario':
+                    upstream.scenario = Scenario(self.read_json())
+                    logger.info("Mock upstream scenario replaced")
+                    return self.send_json(200, {'ok': True})
+                if self.path.rstrip('/') not in ('/v1/chat/completions', '/chat/completions'):
+                    return self.send_json(404, {'error': {'message': 'Not found'}})
+                if not self.headers.get('Authorization', '').startswith('Bearer '):
+                    return self.send_json(401, {'error': {'message': 'Missing API key'}})
+                try:
+                    payload = self.read_json()
+                except ValueError:
+                    return self.send_json(400, {'error': {'message': 'Invalid JSON'}})
+                self.complete(payload)
+
+            def complete(self, payload):
+                settings, outcome, latency = upstream.scenario.draw()
+                upstream.count(outcome, streamed=bool(payload.get('stream')))
+
+                if outcome == 'timeout':
+                    time.sleep(settings['timeout_seconds'])
+                    self.close_connection = True
+                    return
+                if outcome == 'reset':
+                    time.sleep(latency)
+                    self.close_connection = True
+                    return
+                if outcome != 'ok':
+                    time.sleep(latency)
+                    status = int(outcome)
+                    headers = {'Retry-After': '1'} if status == 429 else None
+                    return self.send_json(status, {'error': {'message': f'Injected {status}'}}, headers)
+
+                messages = payload.get('messages') or []
+                tokens = self.reply_tokens(settings, messages, payload)
+                usage = upstream.usage(messages, len(tokens))
+                time.sleep(latency)
+                if payload.get('stream'):
+                    return self.stream(settings, tokens, usage, payload)
+                if settings['tokens_per_second']:
+                    time.sleep(len(tokens) / settings['tokens_per_second'])
+                self.send_json(200, {
+                    'id': f"mock-{upstream.stats['requests']}",
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': payload.get('model', 'deepseek-chat'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                        'finish_reason': 'stop',
+                    }],
+                    'usage': usage,
+                })
+
+            def reply_tokens(self, settings, messages, payload):
+                if settings['reply']:
+                    words = settings['reply'].split()
+                else:
+                    question = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+                    words = [f"(mock reply to: {question[-80:]!r})"]
+                    while len(words) < settings['completion_tokens']:
+                        words.extend(WORDS)
+                    limit = min(settings['completion_tokens'], payload.get('max_tokens') or settings['completion_tokens'])
+                    words = words[:limit]
+                return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+            def stream(self, settings, tokens, usage, payload):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                interval = 1.0 / settings['tokens_per_second'] if settings['tokens_per_second'] else 0
+                base = {'object': 'chat.completion.chunk', 'model': payload.get('model', 'deepseek-chat')}
+                try:
+                    for token in tokens:
+                        chunk = dict(base, choices=[{'index': 0, 'delta': {'content': token}, 'finish_reason': None}])
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                        if interval:
+                            time.sleep(interval)
+                    final = dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], usage=usage)
+                    self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+                except (BrokenPipeError, ConnectionResetError):
+                    logger.debug("Client disconnected mid-stream")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock DeepSeek chat completions server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--scenario', help="scenario JSON file or name in scenarios/")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario) if args.scenario else None
+    upstream = MockUpstream(scenario, host=args.host, port=args.port)
+    print(f"Mock DeepSeek upstream on {upstream.url} (DEEPSEEK_BASE_URL={upstream.url})")
+    try:
+        upstream.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        upstream.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Deterministic answers composed from the knowledge base, used when the LLM is unavailable."""
+
+import functools
+
+from knowledge_base import FORMULAS, TERMINOLOGY, PATTERN_INFO
+from entity_matcher import get_matcher, FORMULA, HERB, PATTERN, TERM
+
+MAX_DETAILED = 2
+BOOK_TERMS = ('伤寒论', '张仲景', '经方', '六经辨证')
+OFFLINE_NOTE = "_Offline answer from the knowledge base; the AI assistant is currently unavailable. 离线回答（知识库）。_"
+
+
+def source_for_formula(key):
+    return f"Shang Han Lun - {FORMULAS[key]['names']['pinyin']}"
+
+
+def source_for_pattern(key):
+    return f"Shang Han Lun - {PATTERN_INFO[key]['name']['en']} Pattern"
+
+
+def formulas_with_herb(herb):
+    """(formula_key, composition item) for every formula containing herb."""
+    found = []
+    for key, formula in FORMULAS.items():
+        for item in formula['composition']:
+            if item['herb'] == herb:
+                found.append((key, item))
+    return found
+
+
+def formulas_for_pattern(pattern_key):
+    """Formula keys whose pattern field names the given channel pattern."""
+    names = {pattern_key.replace('_', ' '), pattern_key.replace('_', '')}
+    names.add(PATTERN_INFO[pattern_key]['name']['en'].split(' (')[0].lower())
+    return [
+        key for key, formula in FORMULAS.items()
+        if any(name in formula['pattern'].lower() for name in names)
+    ]
+
+
+def formula_answer(key):
+    formula = FORMULAS[key]
+    names = formula['names']
+    herbs = "\n".join(
+        f"- **{item['pinyin']}** {item['herb']} ({item['en']}) {item['dosage']} — {item['role']}"
+        for item in formula['composition']
+    )
+    return (
+        f"## {names['zh']} **{names['pinyin']}** ({names['en']})\n"
+        f"**Composition 组成:**\n{herbs}\n"
+        f"**Indications 主治:** {formula['indications']}\n"
+        f"**Functions 功效:** {formula['functions']}\n"
+        f"**Pattern 证型:** {formula['pattern']}"
+    ), [source_for_formula(key)]
+
+
+def herb_answer(herb):
+    usages = formulas_with_herb(herb)
+    item = usages[0][1]
+    lines = "\n".join(
+        f"- **{FORMULAS[key]['names']['pinyin']}** {FORMULAS[key]['names']['zh']}: {use['dosage']}, {use['role']}"
+        for key, use in usages
+    )
+    return (
+        f"## {herb} **{item['pinyin']}** ({item['en']})\n"
+        f"Used in {len(usages)} formula(s) 所在方剂:\n{lines}"
+    ), [source_for_formula(key) for key, _ in usages]
+
+
+def pattern_answer(key):
+    pattern = PATTERN_INFO[key]
+    text = (
+        f"## {pattern['name']['zh']} **{pattern['name']['en']}**\n"
+        f"**Location 病位:** {pattern['location']}\n"
+        f"**Characteristics 主症:** {pattern['characteristics']}\n"
+        f"**Sub-patterns 分型:** {', '.join(pattern['sub_patterns'])}"
+    )
+    formula_keys = formulas_for_pattern(key)
+    if formula_keys:
+        text += "\n**Formulas 方剂:** " + ", ".join(
+            f"**{FORMULAS[k]['names']['pinyin']}** {FORMULAS[k]['names']['zh']}" for k in formula_keys
+        )
+    return text, [source_for_pattern(key)] + [source_for_formula(k) for k in formula_keys]
+
+
+def overview_answer():
+    formulas = ", ".join(f"**{f['names']['pinyin']}** {f['names']['zh']}" for f in FORMULAS.values())
+    patterns = ", ".join(f"{p['name']['zh']} {p['name']['en']}" for p in PATTERN_INFO.values())
+    return (
+        "The **Shang Han Lun** 伤寒论 (Treatise on Cold Damage) by Zhang Zhongjing 张仲景 is the "
+        "foundational text of classical formula prescribing, organized by Six Channel Pattern "
+        "Identification 六经辨证.\n"
+        f"**Channels 六经:** {patterns}\n"
+        f"**Formulas in this knowledge base:** {formulas}\n"
+        "Ask about a specific formula, herb, pattern or term."
+    ), ["Shang Han Lun - General Reference"]
+
+
+def term_answer(term):
+    if term in BOOK_TERMS:
+        text, sources = overview_answer()
+        return f"**{term}** ({TERMINOLOGY[term]['pinyin']}): {TERMINOLOGY[term]['en']}.\n\n{text}", sources
+    info = TERMINOLOGY[term]
+    return f"**{term}** ({info['pinyin']}): {info['en']}.", ["Shang Han Lun - Terminology"]
+
+
+ANSWER_BUILDERS = {
+    FORMULA: formula_answer,
+    HERB: herb_answer,
+    PATTERN: pattern_answer,
+    TERM: term_answer,
+}
+PRIORITY = (FORMULA, HERB, PATTERN, TERM)
+
+
+def zh_name(entity):
+    if entity.type == FORMULA:
+        return FORMULAS[entity.key]['names']['zh']
+    if entity.type == PATTERN:
+        return PATTERN_INFO[entity.key]['name']['zh']
+    return entity.key
+
+
+def select_entities(query):
+    """Pick which matched entities to answer about, most specific kinds first.
+
+    A term that only repeats the name of a selected herb or pattern
+    (麻黄, 太阳病) is skipped.
+    """
+    entities = get_matcher().entities(query)
+    selected = []
+    for kind in PRIORITY:
+        for entity in entities:
+            if entity.type != kind or len(selected) >= MAX_DETAILED:
+                continue
+            if entity.type == TERM and entity.key in {zh_name(e) for e in selected}:
+                continue
+            selected.append(entity)
+    return selected
+
+
+def answer_offline(query):
+    """Compose a structured, bilingual, source-cited answer for query.
+
+    Returns (answer, sources) like ChatEngine.process_query.
+    """
+    answer, sources = _compose(query)
+    return answer, list(sources)
+
+
+@functools.lru_cache(maxsize=2048)
+def _compose(query):
+    entities = select_entities(query)
+    if not entities:
+        text, sources = overview_answer()
+        parts, all_sources = [text], sources
+    else:
+        parts, all_sources = [], []
+        for entity in entities:
+            text, sources = ANSWER_BUILDERS[entity.type](entity.key)
+            parts.append(text)
+            all_sources.extend(s for s in sources if s not in all_sources)
+    return "\n\n".join(parts + [OFFLINE_NOTE]), tuple(all_sources)
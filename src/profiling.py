@@ -0,0 +1,326 @@
+"""Admin-armed request profiling for log_route.
+
+An admin arms a plan (a route, a user, a sample rate and a number of
+requests) through /admin/api/profiling. The plan lives in
+data/profiles/plan.json so every worker sees it: a watcher thread in each
+worker re-reads it once a second and sets Profiler.plan. While no plan is
+armed, plan is None and the only cost per request is that attribute check.
+
+A matching request is run under any of:
+
+- cprofile: deterministic function timings, saved as <capture>.prof (pstats)
+- stacks: the request thread's stack sampled every few milliseconds, saved as
+  <capture>.folded in collapsed-stack format for flamegraph.pl or speedscope
+- memory: tracemalloc around the request; allocations still held at the end
+  are saved as <capture>.alloc.folded (bytes per allocation stack)
+
+One request per worker is profiled at a time; others that match run
+normally. tracemalloc traces every thread, so concurrent requests can show
+up in an allocation profile.
+"""
+
+import cProfile
+import fcntl
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from logger import get_logger
+
+logger = get_logger("profiling")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'data', 'profiles'))
+MODES = ('cprofile', 'stacks', 'memory')
+MAX_REQUESTS = 100
+MAX_MINUTES = 120
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+MEMORY_FRAMES = 25
+WATCH_SECONDS = 1.0
+
+_CAPTURE_NAME = re.compile(r'^[\w.-]+\.(prof|folded|json)$')
+
+
+def new_plan(route=None, user=None, requests=10, sample=1.0, modes=MODES, minutes=15):
+    """Validated plan dict; raises ValueError for out-of-range settings."""
+    requests, sample, minutes = int(requests), float(sample), float(minutes)
+    if not 1 <= requests <= MAX_REQUESTS:
+        raise ValueError(f"requests must be between 1 and {MAX_REQUESTS}")
+    if not 0 < sample <= 1:
+        raise ValueError("sample must be in (0, 1]")
+    if not 0 < minutes <= MAX_MINUTES:
+        raise ValueError(f"minutes must be in (0, {MAX_MINUTES}]")
+    modes = list(modes)
+    unknown = set(modes) - set(MODES)
+    if unknown or not modes:
+        raise ValueError(f"modes must be some of: {', '.join(MODES)}")
+    return {
+        'id': datetime.now().strftime('%Y%m%d-%H%M%S'),
+        'route': route or None,
+        'user': user or None,
+        'remaining': requests,
+        'sample': sample,
+        'modes': modes,
+        'expires': time.time() + minutes * 60,
+    }
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Counts collapsed stacks of one thread, sampled from a helper thread."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_stack(frame)] += 1
+
+
+def allocation_stacks(snapshot):
+    """tracemalloc snapshot -> Counter of collapsed allocation stacks (root first) to bytes."""
+    stacks = Counter()
+    for stat in snapshot.statistics('traceback'):
+        frames = [f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in reversed(stat.traceback)]
+        stacks[';'.join(frames)] += stat.size
+    return stacks
+
+
+def write_folded(path, stacks):
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """Per-process view of the shared plan, and the runner for profiled requests."""
+
+    def __init__(self, directory=PROFILE_DIR):
+        self.directory = directory
+        self.plan_path = os.path.join(directory, 'plan.json')
+        self.plan = None
+        self._busy = threading.Lock()
+        self._watcher = None
+        self._plan_version = None
+
+    # -- plan ------------------------------------------------------------
+
+    def arm(self, plan):
+        self._update(lambda current: plan)
+        self.refresh()
+        logger.info(f"Profiling armed: {plan}")
+        return plan
+
+    def disarm(self):
+        self._update(lambda current: None)
+        self.refresh()
+        logger.info("Profiling disarmed")
+
+    def _update(self, change):
+        """Apply change(current plan) -> new plan under the plan file lock; returns (old, new)."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{self.plan_path}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            current = self._read()
+            plan = change(current)
+            if plan is None:
+                try:
+                    os.remove(self.plan_path)
+                except FileNotFoundError:
+                    pass
+            elif plan is not current:
+                tmp = f"{self.plan_path}.tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(plan, f)
+                os.replace(tmp, self.plan_path)
+            return current, plan
+
+    def _read(self):
+        try:
+            with open(self.plan_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def refresh(self):
+        """Reload the plan file if it changed; expired or used-up plans read as None."""
+        try:
+            st = os.stat(self.plan_path)
+            version = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            version = None
+        if version != self._plan_version:
+            self._plan_version = version
+            self.plan = self._read() if version else None
+        plan = self.plan
+        if plan is not None and (plan.get('remaining', 0) <= 0 or plan.get('expires', 0) < time.time()):
+            self.plan = None
+
+    def start_watcher(self):
+        """Follow the plan file from a daemon thread (again after a fork, which does not copy threads)."""
+        if self._watcher is None or not self._watcher.is_alive():
+            self._watcher = threading.Thread(target=self._watch, name='profile-watcher', daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Profiling plan refresh failed: {e}")
+            time.sleep(WATCH_SECONDS)
+
+    def _claim(self, plan):
+        """Take one request from the shared budget; False when another worker took the last one."""
+        def take(current):
+            if not current or current.get('id') != plan['id'] or current['remaining'] <= 0:
+                return current
+            return dict(current, remaining=current['remaining'] - 1)
+        old, new = self._update(take)
+        return new is not old
+
+    # -- requests ----------------------------------------------------------
+
+    def matches(self, plan, path, user):
+        if path.startswith('/admin/api/profiling'):
+            return False
+        if plan['route'] and plan['route'] != path:
+            return False
+        if plan['user'] and plan['user'] != user:
+            return False
+        return plan['sample'] >= 1 or random.random() < plan['sample']
+
+    def run(self, func, args, kwargs, method, path, user):
+        """Call func(*args, **kwargs), under the profilers if this request is selected."""
+        plan = self.plan
+        if plan is None or not self.matches(plan, path, user) or not self._busy.acquire(blocking=False):
+            return func(*args, **kwargs)
+        try:
+            if not self._claim(plan):
+                return func(*args, **kwargs)
+            return self._profile(plan, func, args, kwargs, method, path, user)
+        finally:
+            self._busy.release()
+
+    def _profile(self, plan, func, args, kwargs, method, path, user):
+        modes = plan['modes']
+        profile = cProfile.Profile() if 'cprofile' in modes else None
+        sampler = StackSampler(threading.get_ident()) if 'stacks' in modes else None
+        tracing = 'memory' in modes and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start(MEMORY_FRAMES)
+        if sampler:
+            sampler.start()
+        status = 500
+        started = time.perf_counter()
+        try:
+            if profile:
+                profile.enable()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                if profile:
+                    profile.disable()
+            status = getattr(result, 'status_code', 200)
+            return result
+        finally:
+            duration = time.perf_counter() - started
+            if sampler:
+                sampler.stop()
+            snapshot = None
+            if tracing:
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+            try:
+                self._save(plan, method, path, user, status, duration, profile, sampler, snapshot)
+            except Exception as e:
+                logger.error(f"Saving profile for {method} {path} failed: {e}")
+
+    def _save(self, plan, method, path, user, status, duration, profile, sampler, snapshot):
+        slug = re.sub(r'[^\w]+', '_', path).strip('_') or 'root'
+        name = f"{plan['id']}_{datetime.now().strftime('%H%M%S%f')}_{os.getpid()}_{method}_{slug}"
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        if profile:
+            profile.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+            files.append(f"{name}.prof")
+        if sampler:
+            write_folded(os.path.join(self.directory, f"{name}.folded"), sampler.stacks)
+            files.append(f"{name}.folded")
+        if snapshot:
+            write_folded(os.path.join(self.directory, f"{name}.alloc.folded"), allocation_stacks(snapshot))
+            files.append(f"{name}.alloc.folded")
+        meta = {
+            'name': name, 'plan': plan['id'], 'method': method, 'path': path, 'user': user,
+            'status': status, 'duration_ms': round(duration * 1000, 2), 'pid': os.getpid(),
+            'timestamp': datetime.now().isoformat(), 'files': files,
+        }
+        with open(os.path.join(self.directory, f"{name}.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        logger.info(f"Profiled {method} {path} in {meta['duration_ms']}ms -> {', '.join(files)}")
+
+    # -- results -----------------------------------------------------------
+
+    def captures(self, limit=200):
+        """Metadata of saved captures, newest first."""
+        try:
+            names = sorted((n for n in os.listdir(self.directory) if n.endswith('.json') and n != 'plan.json'),
+                           reverse=True)
+        except FileNotFoundError:
+            return []
+        captures = []
+        for name in names[:limit]:
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    captures.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return captures
+
+    def capture_path(self, filename):
+        """Path of a saved capture file, or None for names that are not capture files."""
+        if filename == 'plan.json' or not _CAPTURE_NAME.match(filename):
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
+
+
+_profiler = None
+
+
+def get_profiler():
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
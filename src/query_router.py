@@ -0,0 +1,277 @@
+"""Route pure lookup questions to deterministic knowledge base answers."""
+
+import os
+import json
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import metrics
+from logger import get_logger
+from knowledge_base import FORMULAS, PATTERN_INFO
+from entity_matcher import get_matcher, Entity, FORMULA, HERB, PATTERN, TERM
+from offline_answers import (
+    formula_answer, herb_answer, pattern_answer, term_answer,
+    formulas_with_herb, source_for_formula, source_for_pattern, zh_name
+)
+
+logger = get_logger("router")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROUTING_DIR = os.environ.get('ROUTING_DIR', os.path.join(BASE_DIR, 'data', 'routing'))
+CONFIDENCE_THRESHOLD = float(os.environ.get('FAST_PATH_THRESHOLD', 0.75))
+
+Route = namedtuple('Route', ['intent', 'confidence', 'entities', 'answer', 'sources'])
+
+# intent -> (cue phrases, entity types the intent can be answered for).
+# Latin cues match whole words (plurals included); a '*' matches any word ending.
+INTENTS = {
+    'composition': (
+        ('composition', 'ingredients', 'ingredient', 'herbs in', "what's in", 'what is in',
+         'made of', 'consist', '组成', '成分', '组方', '配伍', '由什么'),
+        (FORMULA,)
+    ),
+    'dosage': (
+        ('dosage', 'dose', 'how much', 'how many grams', 'grams of', '剂量', '用量', '多少克', '用多少'),
+        (HERB, FORMULA)
+    ),
+    'indications': (
+        ('indication', 'indicated', 'used for', 'use for', 'treat', '主治', '适应症', '治什么'),
+        (FORMULA,)
+    ),
+    'functions': (
+        ('function', 'actions', 'effect', '功效', '功用', '作用'),
+        (FORMULA,)
+    ),
+    'characteristics': (
+        ('symptoms of', 'characteristics', 'signs of', 'presentation of', '症状', '表现', '特点', '提纲'),
+        (PATTERN,)
+    ),
+    'definition': (
+        ('what does', 'meaning', 'mean', 'define', 'definition', 'what is', "what's", 'who is',
+         'translate', '什么意思', '是什么', '含义', '意思', '是谁'),
+        (TERM, PATTERN, HERB, FORMULA)
+    ),
+}
+
+# Cues that ask for reasoning or depend on the conversation; the LLM handles these.
+COMPLEX_CUES = (
+    'why', 'compar*', 'differ*', 'versus', 'vs', 'should', 'can i',
+    'patient', 'case', 'modif*', 'instead', 'that one', 'it', 'they',
+    # Safety and special populations: never answer these with a canned section.
+    'safe*', 'contraindicat*', 'side effect', 'adverse', 'toxic*', 'overdos*', 'interact*',
+    'pregnan*', 'child*', 'kid*', 'infant*', 'baby', 'babies', 'p*diatric*', 'elderly',
+    'year* old', 'year*-old', 'month* old', 'month*-old',
+    '为什么', '比较', '区别', '不同', '怎么办', '加减', '病人', '患者', '如何',
+    '孕', '儿童', '小儿', '婴', '岁', '老人', '禁忌', '副作用', '不良反应', '毒', '过量'
+)
+
+# Terms too generic to route on: "the formula for fever" is not asking what 方剂 means.
+GENERIC_TERMS = frozenset(('方剂', '经方'))
+
+# Terms that name a pattern (太阳病): answer with the pattern, not the translation.
+PATTERN_TERMS = {info['name']['zh']: key for key, info in PATTERN_INFO.items()}
+
+
+def _cue_pattern(cues):
+    parts = []
+    for cue in cues:
+        body = re.escape(cue).replace(r'\*', r'\w*')
+        if not cue.isascii():
+            parts.append(body)
+        elif cue.endswith('*'):
+            parts.append(rf'\b{body}')
+        else:
+            parts.append(rf'\b{body}(?:s|es)?\b')
+    return re.compile('|'.join(parts))
+
+
+INTENT_PATTERNS = {intent: _cue_pattern(cues) for intent, (cues, _) in INTENTS.items()}
+COMPLEX_PATTERN = _cue_pattern(COMPLEX_CUES)
+
+# A herb name followed by 汤/散/丸 names a formula the KB does not have (黄芩汤).
+FORMULA_SUFFIX = re.compile(r'[汤湯散丸]|\s+(?:tang|san|wan)(?![a-z])', re.IGNORECASE)
+
+
+def _names_unknown_formula(query, matches):
+    return any(
+        not any(e.type == FORMULA for e in m.entities) and FORMULA_SUFFIX.match(query, m.end)
+        for m in matches
+    )
+
+
+def _concepts(entities):
+    """Collapse entities naming the same thing (麻黄 the herb and the term)."""
+    seen = {}
+    for entity in entities:
+        if entity.type == TERM:
+            if entity.key in GENERIC_TERMS:
+                continue
+            if entity.key in PATTERN_TERMS:
+                entity = Entity(PATTERN, PATTERN_TERMS[entity.key])
+        name = zh_name(entity)
+        current = seen.get(name)
+        if current is None or (current.type == TERM and entity.type != TERM):
+            seen[name] = entity
+    return list(seen.values())
+
+
+def _is_short(query):
+    cjk = sum(1 for ch in query if '㐀' <= ch <= '鿿')
+    return len(query.split()) <= 12 and cjk <= 24
+
+
+def classify(query):
+    """Return (intent, confidence, entities) for query."""
+    lowered = query.lower()
+    matcher = get_matcher()
+    entities = _concepts(matcher.entities(query))
+    if _names_unknown_formula(query, matcher.match(query)):
+        return None, 0.0, entities
+
+    for intent, (cues, types) in INTENTS.items():
+        if not INTENT_PATTERNS[intent].search(lowered):
+            continue
+        relevant = [e for e in entities if e.type in types]
+        if not relevant:
+            continue
+
+        if intent == 'dosage':
+            herbs = [e for e in relevant if e.type == HERB]
+            formulas = [e for e in relevant if e.type == FORMULA]
+            exact = (len(herbs) == 1 and len(formulas) <= 1) or (not herbs and len(formulas) == 1)
+            relevant = herbs + formulas
+        else:
+            exact = len(relevant) == 1
+            relevant = relevant[:1]
+
+        confidence = 0.6
+        if exact and len(entities) == len(relevant):
+            confidence += 0.25
+        if _is_short(query):
+            confidence += 0.15
+        if COMPLEX_PATTERN.search(lowered):
+            confidence -= 0.4
+        return intent, round(max(0.0, confidence), 2), relevant
+
+    return None, 0.0, entities
+
+
+def _formula_section(key, label, field):
+    formula = FORMULAS[key]
+    names = formula['names']
+    return (
+        f"## {names['zh']} **{names['pinyin']}** — {label}\n{formula[field]}",
+        [source_for_formula(key)]
+    )
+
+
+def _composition(entities, label='Composition 组成'):
+    key = entities[0].key
+    names = FORMULAS[key]['names']
+    herbs = "\n".join(
+        f"- **{item['pinyin']}** {item['herb']} ({item['en']}) {item['dosage']} — {item['role']}"
+        for item in FORMULAS[key]['composition']
+    )
+    return f"## {names['zh']} **{names['pinyin']}** — {label}\n{herbs}", [source_for_formula(key)]
+
+
+def _dosage(entities):
+    """One herb (optionally within named formulas), or the doses of one formula's herbs."""
+    herbs = [e.key for e in entities if e.type == HERB]
+    formula_keys = [e.key for e in entities if e.type == FORMULA]
+    if not herbs and len(formula_keys) == 1:
+        return _composition(entities, 'Dosage 剂量')
+    if len(herbs) != 1:
+        return None, []
+    herb = herbs[0]
+    usages = [(k, item) for k, item in formulas_with_herb(herb) if not formula_keys or k in formula_keys]
+    if not usages:
+        return None, []
+    lines = "\n".join(
+        f"- **{item['pinyin']}** {item['herb']} in **{FORMULAS[k]['names']['pinyin']}** "
+        f"{FORMULAS[k]['names']['zh']}: {item['dosage']} ({item['role']})"
+        for k, item in usages
+    )
+    return f"## Dosage 剂量\n{lines}", [source_for_formula(k) for k, _ in usages]
+
+
+def _characteristics(entities):
+    key = entities[0].key
+    pattern = PATTERN_INFO[key]
+    return (
+        f"## {pattern['name']['zh']} **{pattern['name']['en']}** — Characteristics 主症\n"
+        f"{pattern['characteristics']}",
+        [source_for_pattern(key)]
+    )
+
+
+def _definition(entities):
+    entity = entities[0]
+    if entity.type == TERM:
+        return term_answer(entity.key)
+    if entity.type == PATTERN:
+        return pattern_answer(entity.key)
+    if entity.type == HERB:
+        return herb_answer(entity.key)
+    return formula_answer(entity.key)
+
+
+ANSWERERS = {
+    'composition': _composition,
+    'dosage': _dosage,
+    'indications': lambda entities: _formula_section(entities[0].key, 'Indications 主治', 'indications'),
+    'functions': lambda entities: _formula_section(entities[0].key, 'Functions 功效', 'functions'),
+    'characteristics': _characteristics,
+    'definition': _definition,
+}
+
+
+_log_lock = threading.Lock()
+
+
+def log_decision(query, route, served, duration):
+    """Append one routing decision to data/routing/routing_YYYYMMDD.jsonl."""
+    record = {
+        'timestamp': datetime.now().isoformat(),
+        'query': query[:200],
+        'intent': route.intent,
+        'confidence': route.confidence,
+        'entities': [f"{e.type}:{e.key}" for e in route.entities],
+        'served_by': served,
+        'duration_ms': round(duration * 1000, 3),
+    }
+    os.makedirs(ROUTING_DIR, exist_ok=True)
+    filepath = os.path.join(ROUTING_DIR, f"routing_{datetime.now().strftime('%Y%m%d')}.jsonl")
+    with _log_lock:
+        with open(filepath, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def route(query, threshold=None):
+    """Classify query and answer it directly when it is a confident lookup.
+
+    Returns a Route; answer is None when the question should go to the LLM.
+    """
+    threshold = CONFIDENCE_THRESHOLD if threshold is None else threshold
+    started = time.perf_counter()
+    intent, confidence, entities = classify(query)
+    answer, sources = None, []
+    if intent and confidence >= threshold:
+        try:
+            answer, sources = ANSWERERS[intent](entities)
+        except Exception as e:
+            logger.error(f"Fast path {intent} failed, falling back to the LLM: {e}")
+            answer, sources = None, []
+    result = Route(intent, confidence, entities, answer, list(sources))
+
+    served = 'fast_path' if answer else 'llm'
+    metrics.increment(f'router.{served}')
+    try:
+        log_decision(query, result, served, time.perf_counter() - started)
+    except OSError as e:
+        logger.warning(f"Could not write routing log: {e}")
+    logger.debug(f"Routing: intent={intent} confidence={confidence} served_by={served}")
+    return result
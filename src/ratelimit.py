@@ -0,0 +1,170 @@
+"""Token-bucket rate limiting with bucket state shared across worker processes."""
+
+import os
+import json
+import mmap
+import fcntl
+import struct
+import hashlib
+import threading
+import time
+
+import metrics
+from logger import get_logger
+
+logger = get_logger("ratelimit")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORE_PATH = os.path.join(BASE_DIR, 'data', 'ratelimit.bin')
+
+# route -> [(scope, capacity, per_seconds)]; a bucket holds `capacity` tokens
+# and refills at capacity / per_seconds tokens per second.
+DEFAULT_RULES = {
+    'chat': [('user', 20, 60), ('ip', 60, 60)],
+    'login': [('ip', 20, 60), ('user', 10, 60)],
+}
+
+_MAGIC = b'SHRL0001'
+_HEADER = struct.Struct('<8sI')
+_SLOT = struct.Struct('<Qdd')  # key hash, tokens, last update (epoch seconds)
+_MAX_PROBES = 8
+
+
+def _key_hash(key):
+    value = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+    return value or 1  # 0 marks an empty slot
+
+
+class SharedBucketStore:
+    """Fixed-size open-addressing table of token buckets in a memory-mapped file.
+
+    Every process that opens the same path sees the same buckets. Updates
+    are serialized with an flock on the file (across processes) and a
+    thread lock (within a process). When all probe positions for a key are
+    taken, the bucket idle the longest is recycled; an evicted bucket simply
+    starts over full, which is the state it would have refilled to anyway.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, slots=8192):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            size = os.fstat(self._fd).st_size
+            if size >= _HEADER.size:
+                magic, existing = _HEADER.unpack(os.pread(self._fd, _HEADER.size, 0))
+                if magic == _MAGIC:
+                    slots = existing
+                else:
+                    size = 0
+            total = _HEADER.size + slots * _SLOT.size
+            if size < total:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, total)
+                os.pwrite(self._fd, _HEADER.pack(_MAGIC, slots), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self.slots = slots
+        self._map = mmap.mmap(self._fd, _HEADER.size + slots * _SLOT.size)
+        self._pid = os.getpid()
+
+    def _lock_fd(self):
+        """The descriptor to flock; reopened after a fork so workers do not share one lock."""
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR)
+            self._pid = os.getpid()
+        return self._fd
+
+    def take(self, key, capacity, rate, cost=1.0, now=None):
+        """Try to take `cost` tokens from the bucket for key.
+
+        Returns (allowed, retry_after_seconds, tokens_left).
+        """
+        now = time.time() if now is None else now
+        key_hash = _key_hash(key)
+        start = key_hash % self.slots
+        with self._thread_lock:
+            fcntl.flock(self._lock_fd(), fcntl.LOCK_EX)
+            try:
+                offset, tokens, updated = self._find(key_hash, start, capacity, now)
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                if tokens >= cost:
+                    tokens -= cost
+                    allowed, retry_after = True, 0.0
+                else:
+                    allowed, retry_after = False, (cost - tokens) / rate
+                _SLOT.pack_into(self._map, offset, key_hash, tokens, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return allowed, retry_after, tokens
+
+    def _find(self, key_hash, start, capacity, now):
+        """Locate the slot for key_hash; returns (offset, tokens, updated)."""
+        victim = None
+        for probe in range(_MAX_PROBES):
+            offset = _HEADER.size + ((start + probe) % self.slots) * _SLOT.size
+            slot_hash, tokens, updated = _SLOT.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                return offset, tokens, updated
+            if slot_hash == 0:
+                return offset, float(capacity), now
+            if victim is None or updated < victim[1]:
+                victim = (offset, updated)
+        return victim[0], float(capacity), now
+
+    def reset(self):
+        with self._thread_lock:
+            fcntl.flock(self._lock_fd(), fcntl.LOCK_EX)
+            try:
+                self._map[_HEADER.size:] = bytes(self.slots * _SLOT.size)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class RateLimited(Exception):
+    """A request exceeded one of its route's buckets."""
+
+    def __init__(self, bucket, retry_after):
+        super().__init__(f"Rate limit exceeded for {bucket}")
+        self.bucket = bucket
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Applies per-route token-bucket rules keyed by user and client IP."""
+
+    def __init__(self, store, rules=None):
+        self.store = store
+        self.rules = rules if rules is not None else DEFAULT_RULES
+
+    def check(self, route, user=None, ip=None):
+        """Charge one token from each applicable bucket or raise RateLimited."""
+        identities = {'user': user, 'ip': ip}
+        for scope, capacity, per_seconds in self.rules.get(route, []):
+            identity = identities.get(scope)
+            if not identity:
+                continue
+            bucket = f"{route}:{scope}"
+            allowed, retry_after, _ = self.store.take(
+                f"{bucket}:{identity}", capacity, capacity / per_seconds
+            )
+            if not allowed:
+                metrics.increment(f'ratelimit.rejected.{bucket}')
+                logger.warning(f"Rate limit hit | Bucket: {bucket} | Identity: {identity} | Retry after {retry_after:.1f}s")
+                raise RateLimited(bucket, retry_after)
+        metrics.increment(f'ratelimit.allowed.{route}')
+
+
+def load_rules():
+    """Read rules from RATE_LIMITS (JSON, same shape as DEFAULT_RULES) if set."""
+    raw = os.environ.get('RATE_LIMITS')
+    if not raw:
+        return DEFAULT_RULES
+    try:
+        rules = json.loads(raw)
+        return {route: [tuple(rule) for rule in route_rules] for route, route_rules in rules.items()}
+    except (ValueError, TypeError) as e:
+        logger.error(f"Invalid RATE_LIMITS, using defaults: {e}")
+        return DEFAULT_RULES
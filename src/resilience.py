@@ -0,0 +1,208 @@
+"""Circuit breaker, latency tracking and request hedging for upstream calls."""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import metrics
+from logger import get_logger
+
+logger = get_logger("resilience")
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+BREAKERS = {}
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream cannot serve the request; callers should fall back."""
+
+
+class UpstreamThrottled(UpstreamUnavailable):
+    """The upstream answered 429; admission control should back off."""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """Raised without calling the upstream while the breaker is open."""
+
+
+class LatencyTracker:
+    """Rolling window of call durations with percentile lookups."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """Return the pct-th percentile in seconds, or None without samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+
+class CircuitBreaker:
+    """Count-based circuit breaker over a rolling window of call outcomes.
+
+    The breaker opens when, over the last `window` calls (and at least
+    `min_calls`), the failure rate or the rate of calls slower than
+    `slow_call_seconds` reaches its threshold. While open every call is
+    rejected with CircuitOpenError; after `open_seconds` up to
+    `half_open_probes` calls are let through, and their outcome decides
+    whether the breaker closes again or re-opens.
+    """
+
+    def __init__(self, name, window=20, min_calls=5, failure_rate=0.5,
+                 slow_call_seconds=20.0, slow_call_rate=0.8, open_seconds=30.0,
+                 half_open_probes=1, clock=time.monotonic):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # (failed, slow)
+        self._state = CLOSED
+        self._opened_at = None
+        self._probes_in_flight = 0
+        self._transitions = deque(maxlen=20)
+        BREAKERS[name] = self
+        metrics.set_gauge(f'breaker.{name}.state', CLOSED)
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _transition(self, new_state, reason):
+        old_state = self._state
+        self._state = new_state
+        self._transitions.append({
+            'at': time.time(),
+            'from': old_state,
+            'to': new_state,
+            'reason': reason,
+        })
+        metrics.set_gauge(f'breaker.{self.name}.state', new_state)
+        metrics.increment(f'breaker.{self.name}.transitions.{old_state}_to_{new_state}')
+        logger.warning(f"Circuit breaker '{self.name}': {old_state} -> {new_state} ({reason})")
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._probes_in_flight = 0
+            self._transition(HALF_OPEN, f"open for {self.open_seconds}s")
+
+    def before_call(self):
+        """Reserve a call slot or raise CircuitOpenError."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return
+            metrics.increment(f'breaker.{self.name}.rejected')
+        raise CircuitOpenError(f"Circuit '{self.name}' is open, upstream call skipped")
+
+    def record_success(self, duration):
+        self._record(False, duration)
+
+    def record_failure(self, duration):
+        self._record(True, duration)
+
+    def _record(self, failed, duration):
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed or slow:
+                    self._open("half-open probe failed" if failed else "half-open probe too slow")
+                else:
+                    self._outcomes.clear()
+                    self._transition(CLOSED, "half-open probe succeeded")
+                return
+            if self._state == OPEN:
+                return
+
+            self._outcomes.append((failed, slow))
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for f, _ in self._outcomes if f)
+            slow_calls = sum(1 for _, s in self._outcomes if s)
+            if failures / calls >= self.failure_rate:
+                self._open(f"failure rate {failures}/{calls}")
+            elif slow_calls / calls >= self.slow_call_rate:
+                self._open(f"slow call rate {slow_calls}/{calls}")
+
+    def _open(self, reason):
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        self._transition(OPEN, reason)
+
+    def snapshot(self):
+        with self._lock:
+            self._maybe_half_open()
+            calls = len(self._outcomes)
+            return {
+                'state': self._state,
+                'window_calls': calls,
+                'window_failures': sum(1 for f, _ in self._outcomes if f),
+                'window_slow_calls': sum(1 for _, s in self._outcomes if s),
+                'transitions': list(self._transitions),
+            }
+
+
+def snapshot():
+    """Return the state of every registered breaker."""
+    return {name: breaker.snapshot() for name, breaker in BREAKERS.items()}
+
+
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+
+
+def hedged_call(fn, delay, name='upstream'):
+    """Call fn(); if it has not finished after `delay` seconds, fire a second
+    identical call and return whichever succeeds first.
+
+    A failure is only raised once every attempt has failed.
+    """
+    primary = _hedge_executor.submit(fn)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    metrics.increment(f'hedge.{name}.fired')
+    logger.debug(f"Hedging '{name}' after {delay:.2f}s")
+    pending = {primary, _hedge_executor.submit(fn)}
+    last_error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            if future is not primary:
+                metrics.increment(f'hedge.{name}.won')
+            return result
+    raise last_error
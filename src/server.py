@@ -9,20 +9,35 @@ import time
 import functools
 import logging
 import glob
+import math
+import re
+import threading
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, send_file, url_for
 from logger import setup_logging, get_logger, log_request, log_error, log_user_action
+import conversation_summary
+import metrics
+import resilience
+from resilience import UpstreamUnavailable, UpstreamThrottled
+from admission import AdmissionController, AdmissionRejected
+from offline_answers import answer_offline
+import query_router
+from herb_index import get_index as get_herb_index, UnknownHerb
+from knowledge_base import FORMULAS, PATTERN_INFO, KB_VERSION
+from fast_json import FastJSONProvider
+from http_cache import bump_version, conditional_json, file_version, store_version
+import feedback_stats
+import startup
+from entity_matcher import get_matcher
+from ratelimit import SharedBucketStore, RateLimiter, RateLimited, DEFAULT_STORE_PATH, load_rules
 
-log = setup_logging("shanghan", level=logging.DEBUG)
+log = setup_logging("shanghan", level=getattr(logging, os.environ.get('LOG_LEVEL', 'INFO').upper()))
 logger = get_logger("server")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, 'data')
-FEEDBACK_DIR = os.path.join(DATA_DIR, 'feedback')
-CONVERSATIONS_DIR = os.path.join(DATA_DIR, 'conversations')
-
-os.makedirs(FEEDBACK_DIR, exist_ok=True)
-os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(BASE_DIR, 'data'))
+FEEDBACK_DIR = os.environ.get('FEEDBACK_DIR', os.path.join(DATA_DIR, 'feedback'))
+CONVERSATIONS_DIR = os.environ.get('CONVERSATIONS_DIR', os.path.join(DATA_DIR, 'conversations'))
 
 logger.info("=" * 60)
 logger.info("Shanghan-TCM Evidence v1 Server Starting")
@@ -33,8 +48,138 @@ logger.info("=" * 60)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'shanghan-tcm-secret-key-v1')
+app.json = FastJSONProvider(app)
 logger.info("Flask app created")
 
+# Admin-only and page-only modules (assets, archive, export, search, profiling,
+# batches, the log feed) are imported by the code that uses them, not here.
+_asset_manifest = None
+
+
+def get_asset_manifest():
+    global _asset_manifest
+    if _asset_manifest is None:
+        from assets import AssetManifest
+        _asset_manifest = AssetManifest()
+    return _asset_manifest
+
+
+@app.context_processor
+def inject_asset_url():
+    """asset_url('css/chat.css') -> fingerprinted build when one exists, else the source file."""
+    return {'asset_url': lambda name: url_for('static', filename=get_asset_manifest().resolve(name))}
+
+
+@app.after_request
+def cache_fingerprinted_assets(response):
+    # nginx serves static/dist/ itself; this covers running Flask directly.
+    if request.path.startswith('/static/dist/') and response.status_code == 200:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+# In-memory only, so built at import; each forked worker starts with its own copy.
+admission = AdmissionController(
+    initial_limit=int(os.environ.get('ADMISSION_INITIAL_LIMIT', 4)),
+    max_limit=int(os.environ.get('ADMISSION_MAX_LIMIT', 32)),
+    queue_deadline=float(os.environ.get('ADMISSION_QUEUE_DEADLINE', 15)),
+    congestion_errors=(UpstreamThrottled,)
+)
+
+
+# Addresses of the reverse proxy; only requests from these may set X-Real-IP.
+TRUSTED_PROXIES = frozenset(
+    ip.strip() for ip in os.environ.get('TRUSTED_PROXIES', '127.0.0.1').split(',') if ip.strip()
+)
+
+# LLM answers to first-turn questions, shared by all workers on the box.
+ANSWER_CACHE_TTL = float(os.environ.get('ANSWER_CACHE_TTL', 3600))
+
+# The rate-limit store and the answer cache are memory-mapped files. Each process
+# maps them in its "state" warm-up step (or on first use), not at import.
+_state_lock = threading.Lock()
+_rate_limiter = None
+_answer_cache = None
+
+
+def get_rate_limiter():
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _state_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(
+                    SharedBucketStore(os.environ.get('RATE_LIMIT_STORE', DEFAULT_STORE_PATH)),
+                    load_rules()
+                )
+    return _rate_limiter
+
+
+def get_answer_cache():
+    global _answer_cache
+    if _answer_cache is None:
+        with _state_lock:
+            if _answer_cache is None:
+                from shared_cache import SharedCache, DEFAULT_CACHE_PATH
+                _answer_cache = SharedCache(
+                    os.environ.get('ANSWER_CACHE_PATH', DEFAULT_CACHE_PATH),
+                    budget_bytes=int(os.environ.get('ANSWER_CACHE_BYTES', 32 * 1024 * 1024)),
+                    slot_size=8192,
+                    name='answers'
+                )
+    return _answer_cache
+
+
+def make_data_dirs():
+    os.makedirs(FEEDBACK_DIR, exist_ok=True)
+    os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
+
+
+def open_shared_state():
+    make_data_dirs()
+    get_rate_limiter()
+    get_answer_cache()
+
+# Closed months of conversations and logs, moved out of the hot directories by archive.py.
+# A reader loads a month's index only when a request asks for it.
+_archive_readers = {}
+
+
+def get_archive_reader(kind):
+    """ArchiveReader for 'conversations' or 'logs', created on first use."""
+    reader = _archive_readers.get(kind)
+    if reader is None:
+        import archive
+        reader = _archive_readers.setdefault(kind, archive.ArchiveReader(os.path.join(archive.ARCHIVE_DIR, kind)))
+    return reader
+
+# Admin-armed request profiling; log_route checks profiler.plan, which is None while disarmed.
+# Each process loads the profiler, reads the plan and starts its watcher thread in the
+# "profiler" warm-up step; until then no request is profiled.
+profiler = None
+
+
+def get_profiler():
+    global profiler
+    if profiler is None:
+        import profiling
+        profiler = profiling.get_profiler()
+    return profiler
+
+
+def start_profiler():
+    get_profiler().refresh()
+    profiler.start_watcher()
+
+
+startup.on_worker('state', open_shared_state)
+startup.on_worker('profiler', start_profiler)
+
+# Live log streams hold a worker thread each; past the limit clients poll /admin/api/logs/feed.
+LOG_STREAM_SECONDS = float(os.environ.get('LOG_STREAM_SECONDS', 300))
+log_streams = threading.BoundedSemaphore(int(os.environ.get('LOG_STREAM_MAX', 2)))
+
+BATCH_MAX_QUESTIONS = int(os.environ.get('BATCH_MAX_QUESTIONS', 1000))
+BATCH_RETRY_SECONDS = 5.0
+
 PROFESSIONAL_USERS = {
     'prof@tcm.org': 'password123',  # Admin user
     'regular@tcm.org': 'userpass123'  # Regular user
@@ -62,14 +207,22 @@ def log_route(func):
         method = request.method
         path = request.path
         user = session.get('user', 'anonymous')
+        # Revalidation polls (If-None-Match) are not logged: the admin log
+        # viewer would otherwise change the log it is polling on every refresh.
+        quiet = method == 'GET' and bool(request.if_none_match)
         
-        logger.debug(f"Route call: {method} {path} | User: {user}")
+        if not quiet:
+            logger.debug(f"Route call: {method} {path} | User: {user}")
         
         try:
-            result = func(*args, **kwargs)
+            if profiler is None or profiler.plan is None:
+                result = func(*args, **kwargs)
+            else:
+                result = profiler.run(func, args, kwargs, method, path, user)
             duration = time.time() - start_time
             status = getattr(result, 'status_code', 200)
-            log_request(logger, method, path, status, duration)
+            if not quiet or status >= 400:
+                log_request(logger, method, path, status, duration)
             return result
         except Exception as e:
             duration = time.time() - start_time
@@ -78,6 +231,38 @@ def log_route(func):
     
     return wrapper
 
+def client_ip():
+    """Client address, as forwarded by nginx when the request comes from a trusted proxy."""
+    if request.remote_addr in TRUSTED_PROXIES:
+        return request.headers.get('X-Real-IP', request.remote_addr)
+    return request.remote_addr
+
+def rate_limited(route, identity=None):
+    """Decorator to apply the route's token buckets per user and per IP.
+
+    identity returns the user key for the request; it defaults to the
+    logged-in user.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            user = identity() if identity else session.get('user')
+            try:
+                get_rate_limiter().check(route, user=user, ip=client_ip())
+            except RateLimited as e:
+                response = jsonify({
+                    'success': False,
+                    'error': 'Too many requests. Please wait a moment and try again.'
+                })
+                response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+                return response, 429
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def login_identity():
+    return (request.get_json(silent=True) or {}).get('email') or None
+
 def get_user_hash(email):
     return hashlib.sha256(email.encode()).hexdigest()[:8]
 
@@ -93,8 +278,27 @@ def save_conversation(session_id, messages, user_email):
         'messages': messages
     }
     
+    os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(conversation_data, f, indent=2, ensure_ascii=False)
+    bump_version(CONVERSATIONS_DIR)
+    try:
+        import conversation_search
+        conversation_search.get_index().add(filename, conversation_data, conversation_search.version_of(filepath))
+    except Exception as e:
+        log_error(logger, e, "search index update")
+
+@app.route('/ready')
+def ready():
+    """Readiness for load balancers and deploys: 503 until this process has warmed up.
+
+    Not wrapped in log_route: it is polled.
+    """
+    if startup.ensure_warm(app):
+        return jsonify(startup.status())
+    response = jsonify(startup.status())
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 @app.route('/')
 @log_route
@@ -123,6 +327,7 @@ def chat():
 
 @app.route('/api/login', methods=['POST'])
 @log_route
+@rate_limited('login', identity=login_identity)
 def api_login():
     data = request.json
     email = data.get('email', '')
@@ -152,6 +357,8 @@ def api_logout():
     
     if user and session_id and messages:
         save_conversation(session_id, messages, user)
+    if session_id:
+        conversation_summary.get_store().discard(session_id)
     
     session.pop('user', None)
     session.pop('session_id', None)
@@ -162,6 +369,7 @@ def api_logout():
 
 @app.route('/api/chat', methods=['POST'])
 @log_route
+@rate_limited('chat')
 def api_chat():
     user = session.get('user')
     logger.info(f"Chat request from user: {user}")
@@ -176,7 +384,10 @@ def api_chat():
     
     session['messages'] = session.get('messages', [])
     
-    conversation_history = session['messages'].copy()
+    session_id = session.get('session_id')
+    summary, conversation_history = conversation_summary.get_store().prompt_inputs(
+        session_id, session['messages'].copy()
+    )
     
     session['messages'].append({
         'role': 'user',
@@ -184,24 +395,39 @@ def api_chat():
         'timestamp': datetime.now().isoformat()
     })
     
-    logger.debug(f"Processing query: {message[:50]}... | History: {len(conversation_history)} messages")
-    answer, sources = process_query(message, conversation_history)
-    logger.debug(f"Query processed, answer length: {len(answer)} chars, sources: {sources}")
+    logger.debug(f"Processing query: {message[:50]}... | History: {len(conversation_history)} messages | Summary: {len(summary)} chars")
+    try:
+        answer, sources, served_by = process_query(message, conversation_history, summary, user)
+    except AdmissionRejected as e:
+        session['messages'].pop()
+        logger.warning(f"Chat request shed for user: {user} | {e}")
+        response = jsonify({
+            'error': 'The assistant is busy right now. Please try again in a moment.',
+            'busy': True
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503
+    logger.debug(f"Query processed, answer length: {len(answer)} chars, sources: {sources}, served by: {served_by}")
     
     session['messages'].append({
         'role': 'assistant',
         'content': answer,
         'sources': sources,
+        'served_by': served_by,
         'timestamp': datetime.now().isoformat()
     })
     
     message_id = f"msg_{len(session['messages'])}"
     
+    if session_id:
+        conversation_summary.schedule_update(session_id, session['messages'])
+    
     logger.info(f"Chat response sent to user: {user} | Msg ID: {message_id}")
     return jsonify({
         'answer': answer,
         'sources': sources,
-        'message_id': message_id
+        'message_id': message_id,
+        'served_by': served_by
     })
 
 @app.route('/api/feedback', methods=['POST'])
@@ -234,15 +460,118 @@ def api_feedback():
         'timestamp': datetime.now().isoformat(),
         'user_email': session['user']
     }
+    question, answer = rated_answer(session.get('messages', []), message_id)
+    if answer:
+        feedback_data.update({
+            'session_id': session.get('session_id'),
+            'question': (question or '')[:200],
+            'sources': answer.get('sources', []),
+            'entities': [
+                f"{entity.type}:{entity.key}" for entity in get_matcher().entities(answer.get('content', ''))
+                if entity.type in feedback_stats.ENTITY_TYPES
+            ]
+        })
     
+    os.makedirs(FEEDBACK_DIR, exist_ok=True)
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(feedback_data, f, indent=2, ensure_ascii=False)
+    bump_version(FEEDBACK_DIR)
+    try:
+        feedback_stats.get_rollup().record(feedback_data)
+    except Exception as e:
+        log_error(logger, e, "feedback rollup update")
     
     logger.info(f"Feedback saved to: {filename}")
     log_user_action(logger, session['user'], "FEEDBACK", f"Rating={rating}, Message={message_id}")
     
     return jsonify({'success': True})
 
+def rated_answer(messages, message_id):
+    """(question, assistant message) for a msg_<n> id returned by /api/chat, or (None, None)."""
+    try:
+        index = int(str(message_id).rsplit('_', 1)[1]) - 1
+    except (IndexError, ValueError):
+        return None, None
+    if not 0 <= index < len(messages) or messages[index].get('role') != 'assistant':
+        return None, None
+    question = next((m.get('content') for m in reversed(messages[:index]) if m.get('role') == 'user'), None)
+    return question, messages[index]
+
+def split_param(name):
+    return [part.strip() for part in request.args.get(name, '').split(',') if part.strip()]
+
+@app.route('/api/herbs/formulas')
+@log_route
+def api_herb_formulas():
+    """Formulas containing all `include` herbs, any `any` herb and no `exclude` herb."""
+    if 'user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    # The answer depends only on the query and the knowledge base.
+    return conditional_json((KB_VERSION, request.query_string), herb_formulas)
+
+def herb_formulas():
+    include = split_param('include')
+    exclude = split_param('exclude')
+    any_of = split_param('any')
+    index = get_herb_index()
+    try:
+        formula_keys = index.query(include=include, exclude=exclude, any_of=any_of)
+        mentioned = [index.resolve(name) for name in include + any_of]
+    except UnknownHerb as e:
+        return {'error': f"Unknown herb: {e.args[0]}"}, 400
+    
+    formulas = []
+    for key in formula_keys:
+        herbs = []
+        for herb in mentioned:
+            posting = index.posting(herb, key)
+            if posting:
+                herbs.append({
+                    'herb': posting.herb,
+                    'pinyin': posting.pinyin,
+                    'dosage': posting.dosage,
+                    'grams': list(posting.grams) if posting.grams else None,
+                    'pieces': posting.pieces,
+                    'role': posting.role
+                })
+        formulas.append({'key': key, 'names': FORMULAS[key]['names'], 'herbs': herbs})
+    
+    logger.debug(f"Herb query include={include} exclude={exclude} any={any_of} -> {len(formulas)} formulas")
+    return {
+        'include': [index.resolve(name) for name in include],
+        'exclude': [index.resolve(name) for name in exclude],
+        'any': [index.resolve(name) for name in any_of],
+        'count': len(formulas),
+        'formulas': formulas
+    }
+
+@app.route('/api/rank', methods=['POST'])
+@log_route
+def api_rank():
+    """Rank formulas and patterns against a symptom list (string or array)."""
+    if 'user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    symptoms = data.get('symptoms')
+    if not symptoms or not isinstance(symptoms, (str, list)):
+        return jsonify({'error': 'symptoms must be a non-empty string or list'}), 400
+    try:
+        top_k = max(1, min(int(data.get('top_k', 3)), 20))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'top_k must be an integer'}), 400
+    
+    from symptom_ranker import get_ranker  # imports numpy; loaded by warm-up rather than with server
+    
+    ranking = get_ranker().rank([str(s) for s in symptoms] if isinstance(symptoms, list) else symptoms, top_k=top_k)
+    for item in ranking['formulas']:
+        item['names'] = FORMULAS[item['key']]['names']
+    for item in ranking['patterns']:
+        item['name'] = PATTERN_INFO[item['key']]['name']
+    logger.debug(f"Symptom ranking matched={ranking['matched']} -> {[r['key'] for r in ranking['formulas']]}")
+    return jsonify(ranking)
+
 @app.route('/admin')
 @log_route
 def admin():
@@ -259,30 +588,118 @@ def admin():
 @log_route
 @admin_required
 def admin_logs():
+    month = request.args.get('month')
+    if month:
+        return archived_logs(month)
     log_files = glob.glob(os.path.join(BASE_DIR, 'logs', '*.log'))
     log_files.sort(reverse=True)
+    # Only the newest file is read, so its size and mtime are the validator.
+    return conditional_json([(path, file_version(path)) for path in log_files[:1]],
+                            lambda: {'logs': read_logs(log_files[:1])})
+
+def read_logs(log_files):
+    import log_feed
     logs = []
-    for log_file in log_files[:1]:
+    for log_file in log_files:
         with open(log_file, 'r', encoding='utf-8') as f:
             lines = f.readlines()[-1000:]
-            for line in lines:
-                parts = line.strip().split(' | ')
-                if len(parts) >= 5:
-                    logs.append({
-                        'timestamp': parts[0],
-                        'level': parts[1],
-                        'location': parts[2],
-                        'function': parts[3],
-                        'message': parts[4]
-                    })
-                else:
-                    logs.append({'raw': line.strip()})
-    return jsonify({'logs': logs})
+            logs.extend(log_feed.parse_line(line) for line in lines)
+    return logs
+
+def archived_logs(month, limit=1000):
+    """The last `limit` lines logged in an archived month."""
+    import log_feed
+    month_archive, index = get_archive_reader('logs').index(month) if re.fullmatch(r'\d{4}-\d{2}', month) else (None, None)
+    if not index:
+        return jsonify({'error': f"No archived logs for {month}"}), 404
+
+    def build():
+        lines = []
+        for entry in sorted(index['entries'].values(), key=lambda e: e['mtime'], reverse=True):
+            text = month_archive.read(entry, index).decode('utf-8', errors='replace')
+            lines = text.splitlines()[-(limit - len(lines)):] + lines
+            if len(lines) >= limit:
+                break
+        return {'logs': [log_feed.parse_line(line) for line in lines], 'month': month}
+
+    return conditional_json(file_version(month_archive.index_path), build)
+
+def log_feed_params():
+    """(levels, tail) from the query string; raises ValueError on bad input."""
+    import log_feed
+    levels = log_feed.parse_levels(request.args.get('level'))
+    tail = max(0, min(int(request.args.get('tail', 200)), log_feed.BUFFER_RECORDS))
+    return levels, tail
+
+@app.route('/admin/api/logs/feed')
+@log_route
+@admin_required
+def admin_log_feed():
+    """Log records after `cursor` (or the last `tail` records), optionally waiting up to `wait` seconds."""
+    try:
+        levels, tail = log_feed_params()
+        wait = max(0.0, min(float(request.args.get('wait', 0)), 25.0))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    import log_feed
+    tailer = log_feed.get_tailer()
+    cursor = request.args.get('cursor')
+    if cursor:
+        logs, cursor = tailer.wait(cursor, levels, timeout=wait)
+    else:
+        logs, cursor = tailer.tail(tail, levels)
+    return jsonify({'logs': logs, 'cursor': cursor})
+
+@app.route('/admin/api/logs/stream')
+@log_route
+@admin_required
+def admin_log_stream():
+    """Server-sent events of new log records; resumes from Last-Event-ID after a reconnect."""
+    try:
+        levels, tail = log_feed_params()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not log_streams.acquire(blocking=False):
+        response = jsonify({'error': 'Too many log streams; poll /admin/api/logs/feed instead'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    import log_feed
+    tailer = log_feed.get_tailer()
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+
+    def event(record):
+        return f"id: {record['cursor']}\ndata: {json.dumps(record, ensure_ascii=False)}\n\n"
+
+    def generate():
+        nonlocal cursor
+        deadline = time.monotonic() + LOG_STREAM_SECONDS
+        yield "retry: 3000\n\n"
+        if not cursor:
+            records, cursor = tailer.tail(tail, levels)
+            for record in records:
+                yield event(record)
+        # The stream ends after LOG_STREAM_SECONDS; EventSource reconnects with Last-Event-ID.
+        while (remaining := deadline - time.monotonic()) > 0:
+            records, cursor = tailer.wait(cursor, levels, timeout=min(15.0, remaining))
+            for record in records:
+                yield event(record)
+            if not records:
+                yield ": keepalive\n\n"
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass events through unbuffered
+    response.call_on_close(log_streams.release)
+    return response
 
 @app.route('/admin/api/conversations')
 @log_route
 @admin_required
 def admin_conversations():
+    validator = (store_version(CONVERSATIONS_DIR), store_version(get_archive_reader('conversations').directory))
+    return conditional_json(validator, lambda: {'conversations': list_conversations() + list_archived_conversations()})
+
+def list_conversations():
     conversation_files = glob.glob(os.path.join(CONVERSATIONS_DIR, '*.json'))
     conversations = []
     for filepath in conversation_files:
@@ -294,7 +711,20 @@ def admin_conversations():
                 'timestamp': data.get('timestamp'),
                 'message_count': len(data.get('messages', []))
             })
-    return jsonify({'conversations': conversations})
+    return conversations
+
+def list_archived_conversations():
+    """Listing rows for archived conversations, straight from the archive indexes."""
+    return [
+        {
+            'session_id': entry.get('session_id'),
+            'user_email': entry.get('user_email'),
+            'timestamp': entry.get('timestamp'),
+            'message_count': entry.get('message_count'),
+            'archived': month
+        }
+        for month, _, entry in get_archive_reader('conversations').entries()
+    ]
 
 @app.route('/admin/api/conversation/<session_id>')
 @log_route
@@ -302,26 +732,233 @@ def admin_conversations():
 def admin_conversation(session_id):
     conversation_files = glob.glob(os.path.join(CONVERSATIONS_DIR, f'*{session_id}*.json'))
     if not conversation_files:
-        return jsonify({'error': 'Conversation not found'}), 404
+        conversation_archive = get_archive_reader('conversations')
+        data = conversation_archive.find(lambda entry: entry.get('session_id') == session_id)
+        if data is None:
+            return jsonify({'error': 'Conversation not found'}), 404
+        return conditional_json(store_version(conversation_archive.directory), lambda: json.loads(data))
     # pick the first match (should be only one)
-    with open(conversation_files[0], 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return jsonify(data)
+    return conditional_json((conversation_files[0], file_version(conversation_files[0])),
+                            lambda: read_json(conversation_files[0]))
+
+def read_json(filepath):
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+@app.route('/admin/api/search')
+@log_route
+@admin_required
+def admin_search():
+    """Full-text search over conversations: q, user, since, until (YYYY-MM-DD), page, per_page."""
+    import conversation_search
+    import export
+    started = time.perf_counter()
+    try:
+        index = conversation_search.get_index()
+        index.ensure_current(CONVERSATIONS_DIR, get_archive_reader('conversations'))
+        result = index.search(
+            request.args.get('q', ''),
+            user=request.args.get('user') or None,
+            since=export.parse_date(request.args.get('since')),
+            until=export.parse_date(request.args.get('until')),
+            page=int(request.args.get('page', 1)),
+            per_page=int(request.args.get('per_page', 20))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result['took_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    logger.info(f"Search q={request.args.get('q')!r}: {result['total']} conversations in {result['took_ms']}ms")
+    return jsonify(result)
 
 @app.route('/admin/api/feedback')
 @log_route
 @admin_required
 def admin_feedback():
+    return conditional_json(store_version(FEEDBACK_DIR), lambda: {'feedbacks': list_feedback()})
+
+def list_feedback():
     feedback_files = glob.glob(os.path.join(FEEDBACK_DIR, '*.json'))
-    feedbacks = []
-    for filepath in feedback_files:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            feedbacks.append(data)
-    return jsonify({'feedbacks': feedbacks})
+    return [read_json(filepath) for filepath in feedback_files]
+
+@app.route('/admin/api/export/<kind>')
+@log_route
+@admin_required
+def admin_export(kind):
+    """Stream conversations, messages or feedback as NDJSON or CSV, optionally gzipped."""
+    import archive
+    import export
+    fmt = request.args.get('format', 'ndjson')
+    compress = request.args.get('gzip') in ('1', 'true')
+    try:
+        flt = export.ExportFilter(
+            export.parse_date(request.args.get('since')),
+            export.parse_date(request.args.get('until')),
+            request.args.get('user')
+        )
+        chunks = export.export(kind, fmt, compress, flt, conversations_dir=CONVERSATIONS_DIR,
+                               feedback_dir=FEEDBACK_DIR, archive_dir=archive.ARCHIVE_DIR)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    logger.info(f"Export {kind} format={fmt} gzip={compress} since={flt.since} until={flt.until} user={flt.user}")
+    response = Response(chunks, mimetype='application/gzip' if compress else export.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{export.filename(kind, fmt, compress, flt)}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/admin/api/feedback/stats')
+@log_route
+@admin_required
+def admin_feedback_stats():
+    """Feedback rollups: totals, the last `days` days, and the users, entities and answers rated worst."""
+    try:
+        days = max(1, min(int(request.args.get('days', 7)), 90))
+    except ValueError:
+        return jsonify({'error': 'days must be an integer'}), 400
+    rollup = feedback_stats.get_rollup()
+    validator = (file_version(rollup.path), days, datetime.now().date().isoformat())
+    return conditional_json(validator, lambda: feedback_stats.summarize(rollup.read(), days))
+
+@app.route('/admin/api/profiling', methods=['GET', 'POST', 'DELETE'])
+@log_route
+@admin_required
+def admin_profiling():
+    """GET: current plan and captures. POST: arm a plan. DELETE: disarm."""
+    import profiling
+    profiler = get_profiler()
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            plan = profiling.new_plan(
+                route=data.get('route'),
+                user=data.get('user'),
+                requests=data.get('requests', 10),
+                sample=data.get('sample', 1.0),
+                modes=data.get('modes', profiling.MODES),
+                minutes=data.get('minutes', 15)
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'plan': profiler.arm(plan)})
+    if request.method == 'DELETE':
+        profiler.disarm()
+    profiler.refresh()
+    return jsonify({'plan': profiler.plan, 'captures': profiler.captures()})
+
+@app.route('/admin/api/profiling/<filename>')
+@log_route
+@admin_required
+def admin_profiling_download(filename):
+    path = get_profiler().capture_path(filename)
+    if path is None:
+        return jsonify({'error': 'Capture not found'}), 404
+    return send_file(path, mimetype='application/octet-stream' if filename.endswith('.prof') else 'text/plain',
+                     as_attachment=True, download_name=filename)
 
-def process_query(query, conversation_history=None):
-    """Process user query using DeepSeek API with knowledge base context."""
+@app.route('/admin/api/startup')
+@log_route
+@admin_required
+def admin_startup():
+    """Warm-up phases of this worker and the last import-time report written by startup.py."""
+    return jsonify({'startup': startup.status(), 'imports': startup.read_import_report()})
+
+@app.route('/admin/api/archives')
+@log_route
+@admin_required
+def admin_archives():
+    import archive
+    return jsonify({
+        'conversations': get_archive_reader('conversations').summary(),
+        'logs': get_archive_reader('logs').summary(),
+        'retention_months': archive.RETENTION
+    })
+
+@app.route('/admin/api/metrics')
+@log_route
+@admin_required
+def admin_metrics():
+    return jsonify({
+        'metrics': metrics.snapshot(),
+        'breakers': resilience.snapshot(),
+        'admission': admission.snapshot(),
+        'caches': {'answers': get_answer_cache().stats()}
+    })
+
+@app.route('/admin/api/batch', methods=['POST'])
+@log_route
+@admin_required
+def admin_batch():
+    """Answer a question set concurrently, streaming one NDJSON result per line.
+
+    Accepts JSON {"questions": [...], "concurrency": n, "batch_id": id} or a
+    multipart question file. Results are checkpointed per batch_id (by
+    default a hash of the questions), so re-submitting an interrupted
+    batch only answers what is missing.
+    """
+    from batch_runner import (
+        BatchRunner, Checkpoint, RetryLater, BATCH_DIR, BATCH_ID,
+        batch_id_for, load_checkpoint, normalize_questions, parse_questions
+    )
+    data = request.get_json(silent=True)
+    try:
+        if data is None and 'file' in request.files:
+            data = request.form
+            questions = parse_questions(request.files['file'].read().decode('utf-8'))
+        else:
+            data = data or {}
+            questions = normalize_questions(data.get('questions') or [])
+        concurrency = int(data.get('concurrency', 4))
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': f"Invalid batch: {e}"}), 400
+    if not questions:
+        return jsonify({'error': 'No questions given'}), 400
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return jsonify({'error': f"At most {BATCH_MAX_QUESTIONS} questions per batch"}), 400
+    batch_id = data.get('batch_id') or batch_id_for(questions)
+    if not BATCH_ID.match(batch_id):
+        return jsonify({'error': 'Invalid batch_id'}), 400
+    
+    user = session['user']
+    checkpoint = Checkpoint(os.path.join(BATCH_DIR, f"{batch_id}.ndjson"))
+    done = load_checkpoint(checkpoint.path)
+    upstream_configured = bool(os.environ.get('DEEPSEEK_API_KEY'))
+    
+    def answer(question):
+        try:
+            result = process_query(question, [], '', f"batch:{user}")
+        except AdmissionRejected as e:
+            raise RetryLater(str(e), e.retry_after)
+        if result[2] == 'offline' and upstream_configured:
+            raise RetryLater("Upstream unavailable", BATCH_RETRY_SECONDS)
+        return result
+    
+    runner = BatchRunner(answer, concurrency, checkpoint=checkpoint)
+    logger.info(f"Batch {batch_id} started by {user} | {len(questions)} questions | {len(done)} already done | Concurrency: {runner.concurrency}")
+    
+    def generate():
+        yield json.dumps({'type': 'batch', 'batch_id': batch_id, 'total': len(questions),
+                          'completed': len(done), 'concurrency': runner.concurrency}) + '\n'
+        answered = failed = 0
+        for record in runner.run(questions, done):
+            failed += bool(record.get('error'))
+            answered += not record.get('error')
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+        logger.info(f"Batch {batch_id} finished | Answered: {answered} | Failed: {failed}")
+        yield json.dumps({'type': 'summary', 'batch_id': batch_id, 'answered': answered,
+                          'failed': failed, 'skipped': len(done)}) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def process_query(query, conversation_history=None, summary=None, user=None):
+    """Process user query using DeepSeek API with knowledge base context.
+
+    Returns (answer, sources, served_by), where served_by is 'fast_path',
+    'cache', 'llm', 'offline' or 'error'. Pure lookups are answered by the query
+    router without calling the LLM. Upstream calls go through the
+    admission controller; AdmissionRejected propagates so the route can
+    answer with a fast "busy" response.
+    """
+    import cassette
     from chat_engine import ChatEngine
     
     if conversation_history is None:
@@ -329,81 +966,74 @@ def process_query(query, conversation_history=None):
     
     logger.debug(f"process_query called with: {query[:100]}... | History: {len(conversation_history)} messages")
     
+    routed = query_router.route(query)
+    if routed.answer:
+        logger.info(f"Fast path answered query | Intent: {routed.intent} | Confidence: {routed.confidence}")
+        return routed.answer, routed.sources, 'fast_path'
+    
     api_key = os.environ.get('DEEPSEEK_API_KEY')
+    recorded = cassette.from_env()
     
-    if not api_key:
+    if not api_key and not (recorded is not None and recorded.mode == cassette.REPLAY):
         logger.warning("No DEEPSEEK_API_KEY found, using fallback responses")
-        return get_fallback_response(query)
+        return (*get_fallback_response(query), 'offline')
+    
+    # Only first-turn questions are cached; later turns depend on the conversation.
+    cache_key = None
+    if ANSWER_CACHE_TTL > 0 and not conversation_history and not summary:
+        cache_key = f"{KB_VERSION}:{' '.join(query.lower().split())}"
+        cached = get_answer_cache().get(cache_key)
+        if cached:
+            logger.info(f"Answer cache hit for query: {query[:50]}...")
+            return cached['answer'], cached['sources'], 'cache'
     
     logger.info(f"Using DeepSeek API for query: {query[:50]}...")
     
     try:
         engine = ChatEngine(api_key)
-        result = engine.process_query(query, conversation_history)
+        with admission.admit(user or 'anonymous'):
+            result = engine.process_query(query, conversation_history, summary)
         logger.info(f"DeepSeek query successful, answer length: {len(result[0])} chars")
-        return result
+        if cache_key and result[1] != ["Error"]:
+            get_answer_cache().set(cache_key, {'answer': result[0], 'sources': result[1]}, ttl=ANSWER_CACHE_TTL)
+        return (*result, 'llm')
+    except AdmissionRejected:
+        raise
+    except UpstreamUnavailable as e:
+        logger.warning(f"DeepSeek unavailable ({e}), falling back to basic responses")
+        metrics.increment('chat.fallback')
+        return (*get_fallback_response(query), 'offline')
     except Exception as e:
         error_msg = str(e)
         logger.error(f"DeepSeek query failed: {error_msg}")
         
         if "timeout" in error_msg.lower() or "connection" in error_msg.lower():
             logger.warning("API timeout/connection error, falling back to basic responses")
-            return get_fallback_response(query)
+            return (*get_fallback_response(query), 'offline')
         elif "Invalid API key" in error_msg:
             logger.error(f"API key error: {error_msg}")
             return (
                 f"API key error: {error_msg}. Please check your DEEPSEEK_API_KEY.",
-                ["Configuration Error"]
+                ["Configuration Error"],
+                'error'
             )
         else:
             logger.warning(f"Unknown error, falling back: {error_msg}")
-            return get_fallback_response(query)
+            return (*get_fallback_response(query), 'offline')
 
 
 def get_fallback_response(query):
-    """Get fallback response when API is not available."""
-    query_lower = query.lower()
-    
-    if any(kw in query_lower for kw in ['ma huang', '麻黄', 'ephedra']):
-        return (
-            "Ma Huang (Ephedra) is the chief herb in the classic formula Ma Huang Tang. "
-            "It releases the exterior and promotes perspiration. The typical dosage is 6-10g. "
-            "It is indicated for exterior cold with wheezing and absence of sweating.",
-            ["Shang Han Lun - Chapter 3 (Ma Huang Tang)"]
-        )
-    elif any(kw in query_lower for kw in ['gui zhi', '桂枝', 'cinnamon']):
-        return (
-            "Gui Zhi (Cinnamon Twig) is the chief herb in Gui Zhi Tang. "
-            "It releases the exterior and harmonizes ying and wei. "
-            "The typical dosage is 6-10g. It is indicated for exterior cold with sweating.",
-            ["Shang Han Lun - Chapter 2 (Gui Zhi Tang)"]
-        )
-    elif any(kw in query_lower for kw in ['formula', 'prescription', '方', 'tang']):
-        return (
-            "The Shang Han Lun contains 112 classical formulas. "
-            "Each formula has specific indications based on the pattern diagnosis. "
-            "Common formulas include Gui Zhi Tang, Ma Huang Tang, Xiao Chai Hu Tang, and others. "
-            "The formula selection depends on the stage and pattern of the disease.",
-            ["Shang Han Lun - Complete Formula Compendium"]
-        )
-    elif any(kw in query_lower for kw in ['shang han lun', 'treatise', '伤寒论']):
-        return (
-            "The Shang Han Lun (Treatise on Cold Damage) is a classical TCM text written by Zhang Zhongjing. "
-            "It systematically presents 112 formulas organized by pattern diagnosis (六经辨证). "
-            "The text is foundational for understanding exterior diseases and formula selection in TCM.",
-            ["Shang Han Lun - Introduction"]
-        )
-    else:
-        return (
-            "Thank you for your question. The Shang Han Lun is the foundational text for classical TCM formula prescribing. "
-            "I can answer questions about specific formulas, their compositions, indications, and modifications. "
-            "Please ask about a specific formula, herb, or concept.",
-            ["Shang Han Lun - General Reference"]
-        )
+    """Get fallback response when API is not available.
+
+    Answers are composed from the knowledge base by offline_answers.
+    """
+    metrics.increment('chat.offline_answers')
+    return answer_offline(query)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     host = os.environ.get('FLASK_HOST', '127.0.0.1')
     debug = os.environ.get('FLASK_DEBUG', 'true').lower() == 'true'
     print(f"Starting Shanghan-TCM Evidence v1 on {host}:{port}")
+    startup.warm_up(app)
     app.run(debug=debug, host=host, port=port)
@@ -0,0 +1,234 @@
+"""Memory-mapped key/value cache shared by every worker process on the box."""
+
+import os
+import json
+import mmap
+import fcntl
+import struct
+import hashlib
+import threading
+import time
+
+import metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, 'data', 'answer_cache.bin')
+
+_MAGIC = b'SHMC0001'
+_HEADER = struct.Struct('<8sIII')       # magic, slots, slot size, worker stat rows
+_WORKER = struct.Struct('<qQQQQQ')      # pid, hits, misses, sets, evictions, oversize
+_ENTRY = struct.Struct('<QddI')         # key hash, expires at (0 = never), last access, length
+_MAX_PROBES = 8
+_WORKER_ROWS = 64
+STAT_FIELDS = ('hits', 'misses', 'sets', 'evictions', 'oversize')
+
+
+def _key_hash(key):
+    value = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+    return value or 1  # 0 marks an empty slot
+
+
+class SharedCache:
+    """Fixed-budget open-addressing table of JSON values in a memory-mapped file.
+
+    The file is split into equal slots of slot_size bytes, so the memory
+    budget is exact: budget_bytes // slot_size entries. Values that do not
+    fit in a slot are not cached. When every probe position for a key is
+    taken, the expired or least recently used entry is evicted.
+
+    Each process keeps a row of hit/miss counters in the file, so any worker
+    can report the statistics of all of them. Like SharedBucketStore, updates
+    are serialized with an flock; the file is reopened after a fork so
+    pre-forked workers do not share one lock.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, budget_bytes=32 * 1024 * 1024, slot_size=4096, name='cache'):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.name = name
+        self._thread_lock = threading.Lock()
+        self._pid = None
+        slots = max(1, (budget_bytes - self._table_offset()) // slot_size)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            size = os.fstat(fd).st_size
+            if size >= _HEADER.size:
+                magic, existing, existing_size, _ = _HEADER.unpack(os.pread(fd, _HEADER.size, 0))
+                if magic == _MAGIC and existing_size == slot_size:
+                    slots = existing
+                else:
+                    size = 0
+            total = self._table_offset() + slots * slot_size
+            if size < total:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, total)
+                os.pwrite(fd, _HEADER.pack(_MAGIC, slots, slot_size, _WORKER_ROWS), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self.slots = slots
+        self.slot_size = slot_size
+        self.max_value = slot_size - _ENTRY.size
+        self.budget_bytes = self._table_offset() + slots * slot_size
+        self._open()
+
+    @staticmethod
+    def _table_offset():
+        return _HEADER.size + _WORKER_ROWS * _WORKER.size
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_RDWR)
+        self._map = mmap.mmap(self._fd, self._table_offset() + self.slots * self.slot_size)
+        self._pid = os.getpid()
+        self._row = None
+        self._local = dict.fromkeys(STAT_FIELDS, 0)
+
+    def _locked(self):
+        if self._pid != os.getpid():
+            self._open()  # forked: get our own open file description for flock
+        return _FileLock(self._fd, self._thread_lock)
+
+    def _slot_offset(self, index):
+        return self._table_offset() + (index % self.slots) * self.slot_size
+
+    def _count(self, field):
+        """Bump a stat for this process, in the shared row and in metrics. Caller holds the lock."""
+        self._local[field] += 1
+        metrics.increment(f'cache.{self.name}.{field}')
+        if self._row is None:
+            self._row = self._claim_row()
+        offset = _HEADER.size + self._row * _WORKER.size
+        row = list(_WORKER.unpack_from(self._map, offset))
+        row[1 + STAT_FIELDS.index(field)] += 1
+        _WORKER.pack_into(self._map, offset, *row)
+
+    def _claim_row(self):
+        pid = os.getpid()
+        free = None
+        for row in range(_WORKER_ROWS):
+            row_pid = _WORKER.unpack_from(self._map, _HEADER.size + row * _WORKER.size)[0]
+            if row_pid == pid:
+                return row
+            if free is None and (row_pid == 0 or not _alive(row_pid)):
+                free = row
+        row = free if free is not None else pid % _WORKER_ROWS
+        _WORKER.pack_into(self._map, _HEADER.size + row * _WORKER.size, pid, 0, 0, 0, 0, 0)
+        return row
+
+    def _probe(self, key_hash):
+        """Yield (offset, slot hash, expires, last access) for key_hash's probe window."""
+        for probe in range(_MAX_PROBES):
+            offset = self._slot_offset(key_hash + probe)
+            slot_hash, expires, accessed, _ = _ENTRY.unpack_from(self._map, offset)
+            yield offset, slot_hash, expires, accessed
+
+    def get(self, key, default=None):
+        key_hash = _key_hash(key)
+        now = time.time()
+        data = None
+        with self._locked():
+            for offset, slot_hash, expires, accessed in self._probe(key_hash):
+                if slot_hash != key_hash:
+                    continue
+                if expires and expires <= now:
+                    _ENTRY.pack_into(self._map, offset, 0, 0.0, 0.0, 0)
+                    break
+                length = _ENTRY.unpack_from(self._map, offset)[3]
+                _ENTRY.pack_into(self._map, offset, slot_hash, expires, now, length)
+                start = offset + _ENTRY.size
+                data = bytes(self._map[start:start + length])
+                break
+            self._count('hits' if data is not None else 'misses')
+        return json.loads(data) if data is not None else default
+
+    def set(self, key, value, ttl=None):
+        """Store a JSON-serializable value; returns False if it exceeds the slot size."""
+        data = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        key_hash = _key_hash(key)
+        now = time.time()
+        with self._locked():
+            if len(data) > self.max_value:
+                self._count('oversize')
+                return False
+            # The key's own slot wins wherever it sits in the window, so a
+            # free slot ahead of it never leaves a stale second copy behind.
+            victim = None
+            for offset, slot_hash, expires, accessed in self._probe(key_hash):
+                if slot_hash == key_hash:
+                    victim = (offset, False)
+                    break
+                if victim is not None and victim[1] is False:
+                    continue
+                if slot_hash == 0 or (expires and expires <= now):
+                    victim = (offset, False)
+                elif victim is None or accessed < victim[1]:
+                    victim = (offset, accessed)
+            offset, evicting = victim
+            if evicting is not False:
+                self._count('evictions')
+            _ENTRY.pack_into(self._map, offset, key_hash, now + ttl if ttl else 0.0, now, len(data))
+            start = offset + _ENTRY.size
+            self._map[start:start + len(data)] = data
+            self._count('sets')
+        return True
+
+    def delete(self, key):
+        key_hash = _key_hash(key)
+        with self._locked():
+            for offset, slot_hash, _, _ in self._probe(key_hash):
+                if slot_hash == key_hash:
+                    _ENTRY.pack_into(self._map, offset, 0, 0.0, 0.0, 0)
+
+    def clear(self):
+        with self._locked():
+            self._map[_HEADER.size:] = bytes(len(self._map) - _HEADER.size)
+            self._row = None
+
+    def stats(self):
+        """This process's counters plus every worker's row and the table fill."""
+        with self._locked():
+            workers = []
+            for row in range(_WORKER_ROWS):
+                values = _WORKER.unpack_from(self._map, _HEADER.size + row * _WORKER.size)
+                if values[0]:
+                    workers.append(dict(zip(('pid',) + STAT_FIELDS, values)))
+            used = sum(
+                1 for index in range(self.slots)
+                if _ENTRY.unpack_from(self._map, self._slot_offset(index))[0]
+            )
+        lookups = self._local['hits'] + self._local['misses']
+        return {
+            'name': self.name,
+            'pid': os.getpid(),
+            'budget_bytes': self.budget_bytes,
+            'slots': self.slots,
+            'slot_size': self.slot_size,
+            'entries': used,
+            'local': dict(self._local, hit_ratio=round(self._local['hits'] / lookups, 4) if lookups else None),
+            'workers': workers,
+        }
+
+
+class _FileLock:
+    def __init__(self, fd, thread_lock):
+        self.fd = fd
+        self.thread_lock = thread_lock
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.thread_lock.release()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -0,0 +1,217 @@
+"""Startup phases, readiness and the import-time report.
+
+Warm-up runs before a process serves its first request:
+
+- indexes: the entity matcher, herb index and symptom ranker, plus
+  chat_engine (the KB preamble and the chat logger), which would otherwise
+  be imported by the first chat request
+- templates: every Jinja template compiled into the environment's cache
+- steps registered with on_worker: server.py maps its shared-memory
+  stores ("state") and starts the profiling plan watcher ("profiler")
+- upstream: one pooled keep-alive connection to the LLM API
+
+Under gunicorn (preload_app) indexes and templates are built in the master
+before it forks, so workers share them copy-on-write and a respawned worker
+starts warm. The per-process steps and the upstream connection run in each
+worker after the fork. /ready reports 503 until the process has finished
+warming up.
+
+Usage:
+    python startup.py                      # import-time breakdown of server.py
+    python startup.py -o data/import_times.json --budget-ms 500
+"""
+
+import argparse
+import gc
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from logger import get_logger
+
+logger = get_logger("startup")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORT_REPORT_PATH = os.path.join(BASE_DIR, 'data', 'import_times.json')
+
+_phases = []
+_worker_steps = []
+_ready = threading.Event()
+_warming = threading.Lock()
+_warm_thread = None
+
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)\s*$')
+
+
+def record(name, seconds, error=None):
+    _phases.append({'phase': name, 'ms': round(seconds * 1000, 1), 'pid': os.getpid(),
+                    **({'error': error} if error else {})})
+
+
+def phase(name, func, *args):
+    """Run one warm-up step, timing it; a failure is logged and recorded, not raised."""
+    started = time.perf_counter()
+    try:
+        func(*args)
+        record(name, time.perf_counter() - started)
+    except Exception as e:
+        record(name, time.perf_counter() - started, f"{type(e).__name__}: {e}")
+        logger.warning(f"Warm-up phase {name} failed: {e}")
+
+
+def build_indexes():
+    from entity_matcher import get_matcher
+    from herb_index import get_index
+    from symptom_ranker import get_ranker
+    import chat_engine  # builds KB_PREAMBLE and sets up the chat logger
+
+    get_matcher()
+    get_index()
+    get_ranker()
+
+
+def compile_templates(app):
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+def warm_upstream():
+    import chat_engine
+    chat_engine.warm_upstream()
+
+
+def on_worker(name, func):
+    """Register a per-process warm-up step; warm_worker runs the steps in order, before upstream."""
+    _worker_steps.append((name, func))
+
+
+def warm_shared(app, freeze=False):
+    """Indexes and templates; with freeze, also move them out of the collector's view before forking.
+
+    gc.freeze() keeps the collector from touching (and so copying) the
+    pages workers share copy-on-write.
+    """
+    phase('indexes', build_indexes)
+    phase('templates', compile_templates, app)
+    if freeze:
+        gc.collect()
+        gc.freeze()
+
+
+def warm_worker():
+    """Per-process warm-up (connections cannot be shared across a fork); marks the process ready."""
+    for name, func in _worker_steps:
+        phase(name, func)
+    phase('upstream', warm_upstream)
+    _ready.set()
+    logger.info(f"Worker {os.getpid()} ready: " + ', '.join(f"{p['phase']} {p['ms']}ms" for p in _phases))
+
+
+def warm_up(app):
+    """Everything, in this process: for the development server and servers that run no hooks."""
+    with _warming:
+        if not _ready.is_set():
+            warm_shared(app)
+            warm_worker()
+
+
+def ensure_warm(app):
+    """Start warm_up in the background unless it has run or is running; returns whether the process is ready."""
+    global _warm_thread
+    if _ready.is_set():
+        return True
+    with _warming:
+        if _warm_thread is None or not _warm_thread.is_alive():
+            _warm_thread = threading.Thread(target=warm_up, args=(app,), name='warm-up', daemon=True)
+            _warm_thread.start()
+    return False
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def status():
+    return {'ready': _ready.is_set(), 'pid': os.getpid(), 'phases': list(_phases)}
+
+
+def parse_importtime(text):
+    """`python -X importtime` output -> [(depth, module, self_us, cumulative_us)] in output order."""
+    rows = []
+    for line in text.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            rows.append((len(match.group(3)) // 2, match.group(4), int(match.group(1)), int(match.group(2))))
+    return rows
+
+
+def run_importtime(module='server'):
+    """`python -X importtime` output of a fresh interpreter importing module."""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BASE_DIR, capture_output=True, text=True, timeout=120
+    )
+    if completed.returncode:
+        raise RuntimeError(f"import {module} failed: {completed.stderr.strip().splitlines()[-1:]}")
+    return completed.stderr
+
+
+def build_import_report(text, module='server', limit=15):
+    """Report from importtime output: total, direct imports and slowest modules, in ms."""
+    rows = parse_importtime(text)
+    root = next(row for row in reversed(rows) if row[1] == module)
+    # A module's imports are printed before it, one level deeper.
+    direct = [row for row in rows[:rows.index(root)] if row[0] == root[0] + 1]
+    ms = lambda us: round(us / 1000, 1)
+    return {
+        'module': module,
+        'python': sys.version.split()[0],
+        'measured_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'total_ms': ms(root[3]),
+        'self_ms': ms(root[2]),
+        'imports': [{'module': name, 'cumulative_ms': ms(cumulative)}
+                    for _, name, _, cumulative in sorted(direct, key=lambda r: -r[3])[:limit]],
+        'slowest_modules': [{'module': name, 'self_ms': ms(own)}
+                            for _, name, own, _ in sorted(rows, key=lambda r: -r[2])[:limit]],
+    }
+
+
+def import_report(module='server', limit=15):
+    """Measure a fresh interpreter importing module."""
+    return build_import_report(run_importtime(module), module, limit)
+
+
+def read_import_report(path=IMPORT_REPORT_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time breakdown of the server")
+    parser.add_argument('--module', default='server')
+    parser.add_argument('-o', '--output', help="also write the report as JSON (the admin API serves data/import_times.json)")
+    parser.add_argument('--budget-ms', type=float, help="exit with status 1 if the import takes longer")
+    args = parser.parse_args()
+
+    report = import_report(args.module)
+    print(f"import {report['module']}: {report['total_ms']}ms ({report['self_ms']}ms in the module itself)")
+    for item in report['imports']:
+        print(f"  {item['cumulative_ms']:8.1f}ms  {item['module']}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.budget_ms is not None and report['total_ms'] > args.budget_ms:
+        print(f"Over budget: {report['total_ms']}ms > {args.budget_ms}ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
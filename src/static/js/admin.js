@@ -0,0 +1,314 @@
+function switchTab(tabName) {
+    document.querySelectorAll('.tab').forEach(t => t.classList.remove('active'));
+    document.querySelectorAll('.tab-content').forEach(c => c.classList.remove('active'));
+    document.querySelector(`.tab[data-tab="${tabName}"]`).classList.add('active');
+    document.getElementById(`${tabName}-content`).classList.add('active');
+    if (tabName !== 'logs') stopLogFeed();
+    if (tabName === 'logs') loadLogs();
+    else if (tabName === 'conversations') loadConversations();
+    else if (tabName === 'feedback') loadFeedback();
+    else if (tabName === 'metrics') loadMetrics();
+}
+
+document.querySelectorAll('.tab').forEach(tab => {
+    tab.addEventListener('click', () => switchTab(tab.dataset.tab));
+});
+
+function showError(container, message) {
+    const el = document.getElementById(container);
+    el.textContent = message;
+    el.style.display = 'block';
+}
+
+function hideError(container) {
+    document.getElementById(container).style.display = 'none';
+}
+
+// Live log feed: an SSE stream that resumes from the last record it saw.
+// If the server refuses the stream (it caps them per worker), poll the feed instead.
+const LOG_ROWS = 1000;
+let logSource = null;
+let logPollTimer = null;
+let logCursor = null;
+
+function logLevelParam() {
+    const level = document.getElementById('logs-level').value;
+    return level ? '&level=' + encodeURIComponent(level) : '';
+}
+
+function stopLogFeed() {
+    if (logSource) {
+        logSource.close();
+        logSource = null;
+    }
+    clearTimeout(logPollTimer);
+    logPollTimer = null;
+}
+
+function showLogsTable() {
+    document.getElementById('logs-loading').style.display = 'none';
+    document.getElementById('logs-table').style.display = 'table';
+}
+
+function appendLogs(logs) {
+    const body = document.getElementById('logs-body');
+    logs.forEach(log => {
+        const row = document.createElement('tr');
+        const levelClass = `level-${log.level?.toLowerCase() || 'info'}`;
+        row.innerHTML = `
+            <td class="timestamp">${log.timestamp || ''}</td>
+            <td><span class="log-level ${levelClass}">${log.level || ''}</span></td>
+            <td>${log.location || ''}</td>
+            <td>${log.function || ''}</td>
+            <td class="message">${log.message || log.raw || ''}</td>
+            <td><button class="expand-btn" onclick="toggleExpand(this)">Expand</button></td>
+        `;
+        body.appendChild(row);
+    });
+    while (body.rows.length > LOG_ROWS) body.deleteRow(0);
+    document.getElementById('logs-count').textContent = `${body.rows.length} entries`;
+}
+
+function loadLogs() {
+    stopLogFeed();
+    document.getElementById('logs-body').innerHTML = '';
+    document.getElementById('logs-loading').style.display = 'block';
+    document.getElementById('logs-table').style.display = 'none';
+    hideError('logs-error');
+    logCursor = null;
+
+    logSource = new EventSource('/admin/api/logs/stream?tail=200' + logLevelParam());
+    logSource.onopen = showLogsTable;
+    logSource.onmessage = event => {
+        logCursor = event.lastEventId;
+        appendLogs([JSON.parse(event.data)]);
+    };
+    logSource.onerror = () => {
+        if (logSource.readyState === EventSource.CLOSED) {
+            logSource = null;
+            pollLogs();
+        }
+    };
+}
+
+function pollLogs() {
+    const cursor = logCursor ? '&cursor=' + encodeURIComponent(logCursor) : '';
+    fetch('/admin/api/logs/feed?tail=200' + cursor + logLevelParam())
+        .then(res => {
+            if (!res.ok) throw new Error(`HTTP ${res.status}`);
+            return res.json();
+        })
+        .then(data => {
+            showLogsTable();
+            logCursor = data.cursor;
+            appendLogs(data.logs);
+            logPollTimer = setTimeout(pollLogs, 2000);
+        })
+        .catch(err => {
+            document.getElementById('logs-loading').style.display = 'none';
+            showError('logs-error', 'Failed to load logs: ' + err.message);
+        });
+}
+
+function loadConversations() {
+    const loading = document.getElementById('conversations-loading');
+    const table = document.getElementById('conversations-table');
+    const body = document.getElementById('conversations-body');
+    loading.style.display = 'block';
+    table.style.display = 'none';
+    hideError('conversations-error');
+
+    fetch('/admin/api/conversations')
+        .then(res => res.json())
+        .then(data => {
+            loading.style.display = 'none';
+            body.innerHTML = '';
+            data.conversations.forEach(conv => {
+                const row = document.createElement('tr');
+                row.innerHTML = `
+                    <td>${conv.session_id || ''}</td>
+                    <td>${conv.user_email || ''}</td>
+                    <td class="timestamp">${conv.timestamp || ''}</td>
+                    <td>${conv.message_count || 0}</td>
+                    <td><button class="btn" onclick="viewConversation('${conv.session_id}')">View</button></td>
+                `;
+                body.appendChild(row);
+            });
+            table.style.display = 'table';
+            document.getElementById('conversations-count').textContent = `${data.conversations.length} conversations`;
+        })
+        .catch(err => {
+            loading.style.display = 'none';
+            showError('conversations-error', 'Failed to load conversations: ' + err.message);
+        });
+}
+
+function searchConversations() {
+    const query = document.getElementById('conversations-query').value.trim();
+    if (!query) {
+        loadConversations();
+        return;
+    }
+    const loading = document.getElementById('conversations-loading');
+    const table = document.getElementById('conversations-table');
+    const body = document.getElementById('conversations-body');
+    loading.style.display = 'block';
+    table.style.display = 'none';
+    hideError('conversations-error');
+
+    fetch('/admin/api/search?per_page=100&q=' + encodeURIComponent(query))
+        .then(res => res.json().then(data => {
+            if (!res.ok) throw new Error(data.error || res.statusText);
+            return data;
+        }))
+        .then(data => {
+            loading.style.display = 'none';
+            body.innerHTML = '';
+            data.results.forEach(conv => {
+                const row = document.createElement('tr');
+                row.innerHTML = `
+                    <td>${conv.session_id || ''}</td>
+                    <td>${conv.user_email || ''}</td>
+                    <td class="timestamp">${conv.timestamp || ''}</td>
+                    <td>${conv.matching_messages} of ${conv.message_count || 0}</td>
+                    <td><button class="btn" onclick="viewConversation('${conv.session_id}')">View</button></td>
+                `;
+                row.title = conv.snippets.map(s => `[${s.role}] ${s.text}`).join('\n');
+                body.appendChild(row);
+            });
+            table.style.display = 'table';
+            document.getElementById('conversations-count').textContent =
+                `${data.total} matching conversations (${data.took_ms} ms)`;
+        })
+        .catch(err => {
+            loading.style.display = 'none';
+            showError('conversations-error', 'Search failed: ' + err.message);
+        });
+}
+
+function loadFeedback() {
+    const loading = document.getElementById('feedback-loading');
+    const table = document.getElementById('feedback-table');
+    const body = document.getElementById('feedback-body');
+    loading.style.display = 'block';
+    table.style.display = 'none';
+    hideError('feedback-error');
+
+    fetch('/admin/api/feedback')
+        .then(res => res.json())
+        .then(data => {
+            loading.style.display = 'none';
+            body.innerHTML = '';
+            data.feedbacks.forEach(fb => {
+                const row = document.createElement('tr');
+                row.innerHTML = `
+                    <td class="timestamp">${fb.timestamp || ''}</td>
+                    <td>${fb.user_email || ''}</td>
+                    <td>${fb.message_id || ''}</td>
+                    <td>${fb.rating || ''}</td>
+                    <td>${fb.feedback || ''}</td>
+                `;
+                body.appendChild(row);
+            });
+            table.style.display = 'table';
+            document.getElementById('feedback-count').textContent = `${data.feedbacks.length} feedback entries`;
+        })
+        .catch(err => {
+            loading.style.display = 'none';
+            showError('feedback-error', 'Failed to load feedback: ' + err.message);
+        });
+}
+
+function loadMetrics() {
+    const loading = document.getElementById('metrics-loading');
+    const table = document.getElementById('metrics-table');
+    const body = document.getElementById('metrics-body');
+    loading.style.display = 'block';
+    table.style.display = 'none';
+    hideError('metrics-error');
+
+    fetch('/admin/api/metrics')
+        .then(res => res.json())
+        .then(data => {
+            loading.style.display = 'none';
+            body.innerHTML = '';
+            const addRows = (values, type) => {
+                Object.entries(values || {}).forEach(([name, value]) => {
+                    const row = document.createElement('tr');
+                    row.innerHTML = `
+                        <td>${name}</td>
+                        <td>${type}</td>
+                        <td>${typeof value === 'object' ? JSON.stringify(value) : value}</td>
+                    `;
+                    body.appendChild(row);
+                });
+            };
+            addRows(data.metrics.counters, 'counter');
+            addRows(data.metrics.gauges, 'gauge');
+            addRows(data.breakers, 'breaker');
+            addRows({admission: data.admission}, 'admission');
+            table.style.display = 'table';
+            document.getElementById('metrics-uptime').textContent = `Uptime: ${data.metrics.uptime_seconds}s`;
+        })
+        .catch(err => {
+            loading.style.display = 'none';
+            showError('metrics-error', 'Failed to load metrics: ' + err.message);
+        });
+}
+
+function toggleExpand(button) {
+    const messageCell = button.closest('tr').querySelector('.message');
+    messageCell.classList.toggle('expanded');
+    button.textContent = messageCell.classList.contains('expanded') ? 'Collapse' : 'Expand';
+}
+
+function openConversationModal() {
+    document.getElementById('conversation-modal').style.display = 'flex';
+}
+function closeConversationModal() {
+    document.getElementById('conversation-modal').style.display = 'none';
+}
+function viewConversation(sessionId) {
+    fetch('/admin/api/conversation/' + encodeURIComponent(sessionId))
+        .then(res => res.json())
+        .then(data => {
+            if (data.error) {
+                alert('Error: ' + data.error);
+                return;
+            }
+            // Populate meta
+            document.getElementById('conversation-meta').innerHTML = `
+                <p><strong>Session ID:</strong> ${data.session_id || ''}</p>
+                <p><strong>User Email:</strong> ${data.user_email || ''}</p>
+                <p><strong>Timestamp:</strong> ${data.timestamp || ''}</p>
+                <p><strong>Message Count:</strong> ${data.messages ? data.messages.length : 0}</p>
+            `;
+            // Populate messages
+            const messagesContainer = document.getElementById('conversation-messages');
+            messagesContainer.innerHTML = '';
+            if (data.messages && data.messages.length) {
+                data.messages.forEach((msg, idx) => {
+                    const div = document.createElement('div');
+                    div.style.padding = '15px';
+                    div.style.marginBottom = '10px';
+                    div.style.background = msg.role === 'user' ? '#f0f7ff' : '#f9f9f9';
+                    div.style.borderLeft = '4px solid ' + (msg.role === 'user' ? '#0a6398' : '#666');
+                    div.innerHTML = `
+                        <strong>${msg.role}</strong> (${msg.timestamp || ''})<br>
+                        ${msg.content || ''}
+                        ${msg.sources ? '<br><small>Sources: ' + JSON.stringify(msg.sources) + '</small>' : ''}
+                    `;
+                    messagesContainer.appendChild(div);
+                });
+            } else {
+                messagesContainer.innerHTML = '<p>No messages</p>';
+            }
+            openConversationModal();
+        })
+        .catch(err => {
+            alert('Failed to load conversation: ' + err.message);
+        });
+}
+
+// Load logs on page load
+window.onload = loadLogs;
@@ -0,0 +1,171 @@
+const messagesEl = document.getElementById('messages');
+const messageInput = document.getElementById('messageInput');
+const sendBtn = document.getElementById('sendBtn');
+let currentMessageId = null;
+
+document.getElementById('userEmail').textContent = document.body.dataset.user;
+
+messageInput.addEventListener('keydown', (e) => {
+    if (e.key === 'Enter' && !e.shiftKey) {
+        e.preventDefault();
+        sendMessage();
+    }
+});
+
+async function sendMessage() {
+    const message = messageInput.value.trim();
+    if (!message) return;
+
+    addMessage(message, 'user');
+    messageInput.value = '';
+
+    const typingEl = addTypingIndicator();
+
+    try {
+        const response = await fetch('/api/chat', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({message})
+        });
+
+        const data = await response.json();
+        typingEl.remove();
+
+        if (data.answer) {
+            currentMessageId = data.message_id;
+            const msgEl = addMessage(data.answer, 'bot');
+            addFeedbackButtons(data.message_id);
+        } else if (data.error) {
+            addMessage(data.error, 'bot');
+        }
+        if (data.sources && data.sources.length > 0) {
+            addSources(data.sources);
+        }
+    } catch (err) {
+        typingEl.remove();
+        addMessage('An error occurred. Please try again.', 'bot');
+    }
+}
+
+function addMessage(content, sender) {
+    const div = document.createElement('div');
+    div.className = `message ${sender}`;
+    const contentHtml = sender === 'user' ? escapeHtml(content) : renderMarkdown(content);
+    div.innerHTML = `
+        <div class="message-avatar">${sender === 'user' ? 'U' : 'AI'}</div>
+        <div class="message-content">${contentHtml}</div>
+    `;
+    messagesEl.appendChild(div);
+    messagesEl.scrollTop = messagesEl.scrollHeight;
+    return div;
+}
+
+function addSources(sources) {
+    const div = document.createElement('div');
+    div.className = 'message sources';
+    div.innerHTML = `
+        <div class="message-avatar">📖</div>
+        <div class="message-content">
+            <div class="sources-label">Sources</div>
+            ${sources.map(s => `<div class="source-item">${escapeHtml(s)}</div>`).join('')}
+        </div>
+    `;
+    messagesEl.appendChild(div);
+    messagesEl.scrollTop = messagesEl.scrollHeight;
+}
+
+function addFeedbackButtons(messageId) {
+    const container = document.createElement('div');
+    container.className = 'feedback-container';
+    container.innerHTML = `
+        <button class="feedback-btn" onclick="showFeedbackPopup('${messageId}', 'up')" title="Helpful">👍</button>
+        <button class="feedback-btn" onclick="showFeedbackPopup('${messageId}', 'down')" title="Not helpful">👎</button>
+    `;
+    messagesEl.appendChild(container);
+    messagesEl.scrollTop = messagesEl.scrollHeight;
+}
+
+function showFeedbackPopup(messageId, rating) {
+    const overlay = document.createElement('div');
+    overlay.className = 'overlay';
+    overlay.id = 'overlay';
+
+    const popup = document.createElement('div');
+    popup.className = 'feedback-popup';
+    popup.innerHTML = `
+        <h3>${rating === 'up' ? 'Great! Any additional feedback?' : 'Sorry to hear that. Tell us more:'}</h3>
+        <textarea id="feedbackText" placeholder="Optional: Share your feedback here..."></textarea>
+        <div class="feedback-popup-buttons">
+            <button class="feedback-skip" onclick="closeFeedback()">Skip</button>
+            <button class="feedback-submit" onclick="submitFeedback('${messageId}', '${rating}')">Submit</button>
+        </div>
+    `;
+
+    document.body.appendChild(overlay);
+    document.body.appendChild(popup);
+}
+
+function closeFeedback() {
+    document.getElementById('overlay')?.remove();
+    document.querySelector('.feedback-popup')?.remove();
+}
+
+async function submitFeedback(messageId, rating) {
+    const feedbackText = document.getElementById('feedbackText')?.value || '';
+
+    try {
+        await fetch('/api/feedback', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                message_id: messageId,
+                rating: rating,
+                feedback: feedbackText
+            })
+        });
+    } catch (err) {
+        console.error('Failed to submit feedback:', err);
+    }
+
+    closeFeedback();
+}
+
+function addTypingIndicator() {
+    const div = document.createElement('div');
+    div.className = 'message bot';
+    div.innerHTML = `
+        <div class="message-avatar">AI</div>
+        <div class="message-content">
+            <div class="typing">
+                <span></span><span></span><span></span>
+            </div>
+        </div>
+    `;
+    messagesEl.appendChild(div);
+    messagesEl.scrollTop = messagesEl.scrollHeight;
+    return div;
+}
+
+function renderMarkdown(text) {
+    let html = escapeHtml(text);
+    html = html.replace(/^## (.+)$/gm, '<h2>$1</h2>');
+    html = html.replace(/^### (.+)$/gm, '<h3>$1</h3>');
+    html = html.replace(/\*\*(.+?)\*\*/g, '<strong>$1</strong>');
+    html = html.replace(/\*(.+?)\*/g, '<em>$1</em>');
+    html = html.replace(/^- (.+)$/gm, '<li>$1</li>');
+    html = html.replace(/(<li>.*<\/li>)/s, '<ul>$1</ul>');
+    html = html.replace(/\n\n/g, '</p><p>');
+    html = html.replace(/\n/g, '<br>');
+    return '<p>' + html + '</p>';
+}
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+async function logout() {
+    await fetch('/api/logout', {method: 'POST'});
+    window.location.href = '/';
+}
@@ -0,0 +1,156 @@
+"""Rank formulas and channel patterns against a list of presenting signs."""
+
+import re
+
+import numpy as np
+
+from knowledge_base import FORMULAS, PATTERN_INFO
+
+STOPWORDS = {'to', 'of', 'and', 'the', 'a', 'with', 'in', 'pattern', 'patterns', 'stage'}
+NEGATIONS = ('no ', 'not ', 'without ', 'absence of ', 'lack of ', '无', '不')
+
+# Common Chinese phrasings of the signs used in the knowledge base.
+SYMPTOM_SYNONYMS = {
+    '发热': 'fever',
+    '恶寒': 'aversion to cold',
+    '恶风': 'aversion to wind',
+    '汗出': 'sweating',
+    '有汗': 'sweating',
+    '无汗': 'no sweating',
+    '脉浮': 'floating pulse',
+    '脉浮紧': 'floating tight pulse',
+    '脉浮缓': 'floating slow pulse',
+    '头痛': 'headache',
+    '身痛': 'body aches',
+    '喘': 'wheezing',
+    '咳嗽': 'cough',
+    '口苦': 'bitter taste',
+    '胸胁苦满': 'chest fullness',
+    '往来寒热': 'alternating fever and chills',
+    '大渴': 'severe thirst',
+    '口渴': 'thirst',
+    '便秘': 'constipation',
+    '腹满': 'abdominal fullness',
+    '下利': 'diarrhea',
+    '呕吐': 'vomiting',
+    '手足厥冷': 'cold limbs',
+    '脉微细': 'weak pulse',
+    '但欲寐': 'sleepiness',
+}
+
+_SPLIT = re.compile(r'[,;，；、\n]+|\s+with\s+|\s+and\s+(?!chills)')
+_TOKEN = re.compile(r'[a-z]+')
+
+
+def _tokens(phrase):
+    return [t for t in _TOKEN.findall(phrase.lower()) if t not in STOPWORDS]
+
+
+def parse_signs(text):
+    """Split free text into (sign phrase, polarity) pairs; polarity -1 for negated signs."""
+    if isinstance(text, (list, tuple)):
+        text = ', '.join(text)
+    signs = []
+    for raw in _SPLIT.split(text.strip()):
+        phrase = SYMPTOM_SYNONYMS.get(raw.strip(), raw.strip().lower())
+        polarity = 1
+        for prefix in NEGATIONS:
+            if phrase.startswith(prefix):
+                phrase = phrase[len(prefix):].strip()
+                phrase = SYMPTOM_SYNONYMS.get(phrase, phrase)
+                polarity = -1
+                break
+        if _tokens(phrase):
+            signs.append((phrase, polarity))
+    return signs
+
+
+class SymptomRanker:
+    """Sign vocabulary plus one +1/-1 weight vector per formula and pattern.
+
+    A query is encoded over the same vocabulary; sign phrases match
+    exactly (weight 1) or when one phrase's words contain the other's
+    (weight 0.5, e.g. "fever" and "high fever"). Scores for every formula
+    and pattern come from one matrix-vector product, normalized by the
+    number of signs each item has, so negated signs that contradict an
+    item ("sweating" against "no sweating") pull its score down.
+    """
+
+    def __init__(self, formulas=FORMULAS, patterns=PATTERN_INFO):
+        item_signs = []
+        self.items = []
+        for key, formula in formulas.items():
+            self.items.append(('formula', key))
+            item_signs.append(parse_signs(formula['indications']))
+        for key, pattern in patterns.items():
+            self.items.append(('pattern', key))
+            item_signs.append(parse_signs(pattern['characteristics']))
+
+        self.vocabulary = sorted({phrase for signs in item_signs for phrase, _ in signs})
+        sign_index = {phrase: i for i, phrase in enumerate(self.vocabulary)}
+        tokens = sorted({t for phrase in self.vocabulary for t in _tokens(phrase)})
+        self.token_index = {t: i for i, t in enumerate(tokens)}
+
+        # signs x tokens, used to match query phrases against the vocabulary
+        self.sign_tokens = np.zeros((len(self.vocabulary), len(tokens)), dtype=bool)
+        for phrase, i in sign_index.items():
+            for t in _tokens(phrase):
+                self.sign_tokens[i, self.token_index[t]] = True
+
+        # items x signs, +1 present / -1 explicitly absent
+        self.matrix = np.zeros((len(self.items), len(self.vocabulary)), dtype=np.float32)
+        for row, signs in enumerate(item_signs):
+            for phrase, polarity in signs:
+                self.matrix[row, sign_index[phrase]] = polarity
+        self.norms = np.sqrt(np.maximum(1.0, np.abs(self.matrix).sum(axis=1)))
+        self.is_formula = np.array([kind == 'formula' for kind, _ in self.items])
+
+    def encode(self, text):
+        """Return (query vector, matched sign phrases) for free-text signs."""
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        matched = []
+        for phrase, polarity in parse_signs(text):
+            query_tokens = np.zeros(len(self.token_index), dtype=bool)
+            known = [self.token_index[t] for t in _tokens(phrase) if t in self.token_index]
+            if not known:
+                continue
+            query_tokens[known] = True
+            unknown = len(_tokens(phrase)) > len(known)
+            sign_in_query = ~(self.sign_tokens & ~query_tokens).any(axis=1)
+            query_in_sign = self.sign_tokens[:, query_tokens].all(axis=1) & ~unknown
+            weights = np.where(sign_in_query & query_in_sign, 1.0,
+                               np.where(sign_in_query | query_in_sign, 0.5, 0.0))
+            if weights.any():
+                matched.append(('no ' if polarity < 0 else '') + phrase)
+                vector += polarity * weights.astype(np.float32)
+        return vector, matched
+
+    def rank(self, text, top_k=3):
+        """Return {'formulas': [...], 'patterns': [...], 'matched': [...]} best first."""
+        vector, matched = self.encode(text)
+        scores = (self.matrix @ vector) / self.norms
+        result = {'formulas': [], 'patterns': [], 'matched': matched}
+        if not matched:
+            return result
+        for kind, mask in (('formulas', self.is_formula), ('patterns', ~self.is_formula)):
+            rows = np.flatnonzero(mask & (scores > 0))
+            for row in rows[np.argsort(-scores[rows], kind='stable')][:top_k]:
+                signs = [self.vocabulary[i] if self.matrix[row, i] > 0 else f"no {self.vocabulary[i]}"
+                         for i in np.flatnonzero(self.matrix[row] * vector > 0)]
+                result[kind].append({
+                    'key': self.items[row][1],
+                    'score': round(float(scores[row]), 3),
+                    'matched_signs': signs,
+                })
+        return result
+
+
+_ranker = None
+
+
+def get_ranker():
+    """Return the shared ranker, building it on first use."""
+    global _ranker
+    if _ranker is None:
+        _ranker = SymptomRanker()
+    return _ranker
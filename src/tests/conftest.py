@@ -1,15 +1,35 @@
-"""Pytest configuration for Playwright tests."""
+"""Pytest configuration: shared unit test fixtures and the Playwright server."""
 
 import pytest
 import os
 import subprocess
 import sys
 import time
+import tempfile
 import requests
 
 PORT = 8765
 BASE_URL = f"http://localhost:{PORT}"
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+
+def server_state_env(state_dir):
+    """Environment that keeps every file a spawned server writes under state_dir."""
+    return {
+        'DATA_DIR': state_dir,
+        'CONVERSATIONS_DIR': os.path.join(state_dir, 'conversations'),
+        'FEEDBACK_DIR': os.path.join(state_dir, 'feedback'),
+        'SUMMARIES_DIR': os.path.join(state_dir, 'summaries'),
+        'ROUTING_DIR': os.path.join(state_dir, 'routing'),
+        'ARCHIVE_DIR': os.path.join(state_dir, 'archive'),
+        'SEARCH_INDEX_PATH': os.path.join(state_dir, 'search_index.sqlite3'),
+        'PROFILE_DIR': os.path.join(state_dir, 'profiles'),
+        'BATCH_DIR': os.path.join(state_dir, 'batches'),
+        'FEEDBACK_ROLLUP_PATH': os.path.join(state_dir, 'feedback_rollup.json'),
+        'RATE_LIMIT_STORE': os.path.join(state_dir, 'ratelimit.bin'),
+        'ANSWER_CACHE_PATH': os.path.join(state_dir, 'answer_cache.bin'),
+    }
 
 
 def pytest_configure(config):
@@ -17,12 +37,47 @@ def pytest_configure(config):
     config.addinivalue_line("markers", "asyncio: mark test as async")
 
 
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """A clock the test moves by setting .now."""
+    return FakeClock()
+
+
+@pytest.fixture
+def mock_upstream():
+    """A local MockUpstream with no latency."""
+    from mock_upstream import MockUpstream
+    upstream = MockUpstream({'seed': 1, 'latency': {'distribution': 'fixed', 'seconds': 0.0},
+                             'completion_tokens': 20}).start()
+    yield upstream
+    upstream.stop()
+
+
+@pytest.fixture
+def mock_client(mock_upstream):
+    """A DeepSeekClient pointed at mock_upstream."""
+    from chat_engine import DeepSeekClient
+    client = DeepSeekClient(api_key='mock-key')
+    client.base_url = mock_upstream.url
+    client.timeout = 2
+    return client
+
+
 @pytest.fixture(scope="session")
 def playwright_server():
     """Start the Flask server for the session."""
     env = os.environ.copy()
     env['PORT'] = str(PORT)
     env['FLASK_DEBUG'] = 'false'
+    env.update(server_state_env(tempfile.mkdtemp()))
     
     server_process = subprocess.Popen(
         [sys.executable, 'server.py'],
@@ -5,18 +5,23 @@ import subprocess
 import sys
 import os
 import time
+import tempfile
 import requests
 import json
 
 PORT = 8765
 BASE_URL = f"http://localhost:{PORT}"
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_DIR = tempfile.mkdtemp()
+
+from conftest import server_state_env
 
 def start_server():
     """Start the Flask server."""
     env = os.environ.copy()
     env['PORT'] = str(PORT)
     env['FLASK_DEBUG'] = 'false'
+    env.update(server_state_env(STATE_DIR))
     
     server_process = subprocess.Popen(
         [sys.executable, 'server.py'],
@@ -152,15 +157,15 @@ def test_feedback():
     data = response.json()
     assert data['success'] is True
     
-    feedback_dir = os.path.join(BASE_DIR, 'data', 'feedback')
+    feedback_dir = os.path.join(STATE_DIR, 'feedback')
     feedback_files = [f for f in os.listdir(feedback_dir) if f.startswith('feedback_')]
     assert len(feedback_files) > 0
     print("✓ Feedback submission works")
 
 def test_data_directories():
     """Test data directories exist."""
-    feedback_dir = os.path.join(BASE_DIR, 'data', 'feedback')
-    conv_dir = os.path.join(BASE_DIR, 'data', 'conversations')
+    feedback_dir = os.path.join(STATE_DIR, 'feedback')
+    conv_dir = os.path.join(STATE_DIR, 'conversations')
     assert os.path.exists(feedback_dir)
     assert os.path.exists(conv_dir)
     print("✓ Data directories exist")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Unit tests for the admission controller."""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from admission import AdmissionController, AdmissionRejected
+
+
+class TestAdmissionControl:
+    """Test AIMD admission control and fair queuing."""
+
+    def test_limit_adapts_aimd(self):
+        """Fast completions grow the limit; congestion halves it."""
+        controller = AdmissionController(initial_limit=4, max_limit=8, target_latency=5.0)
+        for _ in range(20):
+            controller.acquire('a')
+            controller.release(0.5)
+        assert controller.limit > 4
+        grown = controller.limit
+        controller.acquire('a')
+        controller.release(0.5, congested=True)
+        assert controller.limit == grown // 2
+
+    def test_one_decrease_per_congestion_epoch(self):
+        """A burst of throttled calls from the same window halves the limit once."""
+        controller = AdmissionController(initial_limit=8, max_limit=8, target_latency=5.0)
+        epochs = [controller.acquire('a') for _ in range(8)]
+        for epoch in epochs:
+            controller.release(0.5, congested=True, epoch=epoch)
+        assert controller.limit == 4
+
+        # A call admitted after the decrease reports fresh congestion.
+        epoch = controller.acquire('a')
+        controller.release(0.5, congested=True, epoch=epoch)
+        assert controller.limit == 2
+
+    def test_waiters_are_served_round_robin(self):
+        """A heavy user's backlog does not delay another user's request."""
+        controller = AdmissionController(initial_limit=1, max_limit=1, queue_deadline=5.0,
+                                         max_queued_per_user=5)
+        controller.acquire('warmup')
+        controller.release(0.01)
+        controller.acquire('holder')
+        order = []
+
+        def wait_for(user):
+            controller.acquire(user)
+            order.append(user)
+
+        threads = []
+        for user in ['heavy', 'heavy', 'heavy', 'light']:
+            thread = threading.Thread(target=wait_for, args=(user,))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.02)
+
+        for _ in range(4):
+            controller.release(0.1)
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join(timeout=2)
+        assert order[:2] == ['heavy', 'light']
+
+    def test_sheds_when_wait_exceeds_deadline(self):
+        """Requests are rejected immediately when they could not be served in time."""
+        controller = AdmissionController(initial_limit=1, max_limit=1, queue_deadline=1.0)
+        controller.acquire('a')
+        controller.release(5.0)  # observed service time far above the deadline
+        controller.acquire('a')
+        with pytest.raises(AdmissionRejected) as exc:
+            controller.acquire('b')
+        assert exc.value.retry_after >= 1
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Unit tests for the archive."""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import export
+import archive
+
+
+class TestArchive:
+    """Test monthly archiving of conversations and logs."""
+
+    NOW = time.mktime((2026, 3, 15, 12, 0, 0, 0, 0, -1))
+
+    def conversation(self, directory, sid, day, user='x@tcm.org'):
+        path = directory / f"conversation_{sid}_{day}.json"
+        path.write_text(json.dumps({
+            'session_id': sid, 'user_email': user, 'timestamp': f"{day}T10:00:00",
+            'messages': [{'role': 'user', 'content': f"question {sid}", 'timestamp': f"{day}T10:00:00"}]
+        }))
+        stamp = time.mktime(time.strptime(day, '%Y-%m-%d'))
+        os.utime(path, (stamp, stamp))
+
+    def test_conversations_move_to_indexed_month_archives(self, tmp_path):
+        import gzip
+        hot, logs, store = tmp_path / 'conversations', tmp_path / 'logs', tmp_path / 'archive'
+        hot.mkdir()
+        logs.mkdir()
+        self.conversation(hot, 'a1', '2026-01-05')
+        self.conversation(hot, 'b2', '2026-01-20', user='y@tcm.org')
+        self.conversation(hot, 'c3', '2026-02-02')
+        self.conversation(hot, 'd4', '2026-03-10')  # current month stays hot
+
+        result = archive.run_once(str(hot), str(logs), str(store), retention={}, now=self.NOW)
+        assert result['conversations'] == 3
+        assert sorted(os.listdir(hot)) == ['conversation_d4_2026-03-10.json']
+
+        reader = archive.ArchiveReader(str(store / 'conversations'))
+        assert reader.months() == ['2026-01', '2026-02']
+        rows = sorted((month, entry['session_id'], entry['message_count']) for month, _, entry in reader.entries())
+        assert rows == [('2026-01', 'a1', 1), ('2026-01', 'b2', 1), ('2026-02', 'c3', 1)]
+        found = json.loads(reader.find(lambda entry: entry['session_id'] == 'b2'))
+        assert found['user_email'] == 'y@tcm.org'
+        # The data file is a plain gzip stream of JSON lines.
+        lines = gzip.decompress((store / 'conversations' / '2026-01.gz').read_bytes()).splitlines()
+        assert [json.loads(line)['session_id'] for line in lines] == ['a1', 'b2']
+
+        # A late file for an archived month is appended; exports read archives too.
+        self.conversation(hot, 'e5', '2026-01-31')
+        archive.run_once(str(hot), str(logs), str(store), retention={}, now=self.NOW)
+        flt = export.ExportFilter(since=export.parse_date('2026-01-01'), until=export.parse_date('2026-01-31'))
+        data = b''.join(export.export('conversations', flt=flt, conversations_dir=str(hot),
+                                      feedback_dir=str(tmp_path), archive_dir=str(store)))
+        assert [json.loads(line)['session_id'] for line in data.splitlines()] == ['a1', 'b2', 'e5']
+
+    def test_logs_and_retention(self, tmp_path):
+        logs, store = tmp_path / 'logs', tmp_path / 'archive'
+        logs.mkdir()
+        for name, stamp in (('app_20251101.log', '2025-11-30'), ('app_20260101.log.1', '2026-01-10'),
+                            ('app_20260101.log', '2026-01-31'), ('app_20260301.log', '2026-03-15')):
+            (logs / name).write_text(f"2026-01-01 00:00:00 | INFO     | a.py:1 | f | {name}\n")
+            seconds = time.mktime(time.strptime(stamp, '%Y-%m-%d'))
+            os.utime(logs / name, (seconds, seconds))
+
+        archive.run_once(str(tmp_path / 'none'), str(logs), str(store), retention={}, now=self.NOW)
+        assert os.listdir(logs) == ['app_20260301.log']
+        reader = archive.ArchiveReader(str(store / 'logs'))
+        assert reader.months() == ['2025-11', '2026-01']
+        assert sorted(entry['file'] for _, _, entry in reader.entries(['2026-01'])) == [
+            'app_20260101.log', 'app_20260101.log.1']
+
+        removed = archive.apply_retention(str(store), self.NOW, {'logs': 3})
+        assert removed == ['logs/2025-11']
+        assert reader.months() == ['2026-01']
+        assert archive.months_before('2026-02', 3) == '2025-11'
+
+    def test_archive_dir_from_env(self, tmp_path):
+        """ARCHIVE_DIR is read once by archive.py and shared by its importers."""
+        code = "import archive, export, conversation_search; " \
+               "print({archive.ARCHIVE_DIR, export.ARCHIVE_DIR, conversation_search.ARCHIVE_DIR})"
+        env = dict(os.environ, ARCHIVE_DIR=str(tmp_path))
+        completed = subprocess.run([sys.executable, '-c', code], cwd=str(BASE_DIR), env=env,
+                                   capture_output=True, text=True, timeout=60)
+        assert completed.stdout.splitlines()[-1] == str({str(tmp_path)})
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Unit tests for the static asset pipeline."""
+
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import assets
+
+
+class TestAssets:
+    """Test static asset minification and the fingerprinted build."""
+
+    def test_minify_js_keeps_strings_templates_and_regexes(self):
+        source = (
+            "// header comment\n"
+            "function f(a) {\n"
+            "    /* block */\n"
+            "    const s = '// not a comment';\n"
+            "    const t = `<div>  ${a ? `<b>${a}</b>` : ''}  // kept</div>`;\n"
+            "\n"
+            "    return s.replace(/\\/\\*(.*)\\*\\//g, '$1') + t;\n"
+            "}\n"
+        )
+        out = assets.minify_js(source)
+        assert 'header comment' not in out and 'block' not in out
+        assert "'// not a comment'" in out
+        assert "`<div>  ${a ? `<b>${a}</b>` : ''}  // kept</div>`" in out
+        assert "/\\/\\*(.*)\\*\\//g" in out
+        assert '\n\n' not in out and '    ' not in out.replace('<div>  ', '')
+
+    def test_minify_css(self):
+        out = assets.minify_css("/* c */\n.a :hover {\n  color: red;\n  content: 'x  ;  y';\n}\n")
+        assert out == ".a :hover{color:red;content:'x  ;  y'}\n"
+
+    def test_build_writes_manifest_and_gzip(self, tmp_path):
+        import gzip
+        (tmp_path / 'css').mkdir()
+        (tmp_path / 'css' / 'page.css').write_text("body {\n  margin: 0;\n}\n")
+        dist = tmp_path / 'dist'
+        manifest = assets.build(str(tmp_path), str(dist))
+        built = manifest['css/page.css']
+        assert built.startswith('dist/css/page.') and built.endswith('.css')
+        data = (tmp_path / built).read_bytes()
+        assert data == b"body{margin:0}\n"
+        assert gzip.decompress((tmp_path / f"{built}.gz").read_bytes()) == data
+
+        resolver = assets.AssetManifest(str(dist / 'manifest.json'))
+        assert resolver.resolve('css/page.css') == built
+        assert resolver.resolve('css/other.css') == 'css/other.css'
+        assert assets.AssetManifest(str(tmp_path / 'missing.json')).resolve('css/page.css') == 'css/page.css'
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Unit tests for the batch runner."""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from batch_runner import BatchRunner, Checkpoint, RetryLater, load_checkpoint, parse_questions
+
+
+class TestBatchRunner:
+    """Test the concurrent batch runner."""
+
+    def test_parse_questions(self):
+        assert parse_questions("What is Ma Huang?\n\nWhat is Gui Zhi?\n") == [
+            ('q0001', 'What is Ma Huang?'), ('q0002', 'What is Gui Zhi?')]
+        assert parse_questions('{"id": "a", "question": "x"}\n{"id": "b", "question": "y"}') == [
+            ('a', 'x'), ('b', 'y')]
+        with pytest.raises(ValueError):
+            parse_questions('[{"id": "a", "question": "x"}, {"id": "a", "question": "y"}]')
+
+    def test_bounded_concurrency_and_retry(self, tmp_path):
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0, 'throttled': False}
+
+        def answer(question):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            try:
+                time.sleep(0.01)
+                if question == 'busy' and not state['throttled']:
+                    state['throttled'] = True
+                    raise RetryLater('busy', retry_after=0.05)
+                return f"answer to {question}", [], 'llm'
+            finally:
+                with lock:
+                    state['active'] -= 1
+
+        path = str(tmp_path / 'batch.ndjson')
+        questions = [(f"q{i}", f"question {i}") for i in range(10)] + [('b', 'busy')]
+        runner = BatchRunner(answer, concurrency=3, checkpoint=Checkpoint(path))
+        records = list(runner.run(questions))
+        assert len(records) == 11
+        assert state['peak'] <= 3
+        assert next(r for r in records if r['id'] == 'b')['attempts'] == 2
+        assert len(load_checkpoint(path)) == 11
+
+    def test_checkpoint_failure_is_reported_not_hung(self, tmp_path):
+        """A checkpoint write error becomes an error record instead of stalling run()."""
+        class FullDisk(Checkpoint):
+            def append(self, record):
+                raise OSError(28, 'No space left on device')
+
+        runner = BatchRunner(lambda q: (f"answer to {q}", [], 'llm'), concurrency=2,
+                             checkpoint=FullDisk(str(tmp_path / 'batch.ndjson')))
+        records = []
+        consumer = threading.Thread(target=lambda: records.extend(runner.run([('q1', 'a'), ('q2', 'b')])),
+                                    daemon=True)
+        consumer.start()
+        consumer.join(timeout=5)
+        assert not consumer.is_alive()
+        assert sorted(r['id'] for r in records) == ['q1', 'q2']
+        assert all('No space left' in r['error'] for r in records)
+
+    def test_resume_skips_completed(self, tmp_path):
+        path = str(tmp_path / 'batch.ndjson')
+        Checkpoint(path).append({'type': 'result', 'id': 'q1', 'answer': 'done'})
+        Checkpoint(path).append({'type': 'result', 'id': 'q2', 'error': 'failed'})
+        calls = []
+        runner = BatchRunner(lambda q: (calls.append(q), [], 'llm'), checkpoint=Checkpoint(path))
+        records = list(runner.run([('q1', 'one'), ('q2', 'two')], load_checkpoint(path)))
+        assert calls == ['two'] and [r['id'] for r in records] == ['q2']
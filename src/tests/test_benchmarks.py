@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""Unit tests for the benchmarks."""
+
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import benchmarks
+
+
+class TestBenchmarks:
+    """Test benchmark timing and regression checks."""
+
+    def test_measure(self):
+        result = benchmarks.measure(lambda: sum(range(100)), repeat=3, min_time=0.01)
+        assert result['loops'] >= 1
+        assert 0 < result['best_s'] <= result['median_s']
+
+    def test_check_uses_per_benchmark_thresholds(self):
+        baseline = {
+            'results': {'build_context': {'best_s': 1.0}, 'admin_logs[small]': {'best_s': 1.0}},
+            'thresholds': {'admin_logs[small]': 3.0},
+        }
+        results = {
+            'build_context': {'best_s': 1.6},
+            'admin_logs[small]': {'best_s': 2.5},
+            'new_bench': {'best_s': 9.0},
+        }
+        assert benchmarks.check(results, baseline) == [('build_context', 1.6, 1.5)]
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Unit tests for cassette record and replay."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from chat_engine import KB_PREAMBLE
+from mock_upstream import Scenario
+from cassette import Cassette, CassetteMiss, request_key
+
+
+class TestCassette:
+    """Test recording and replaying upstream completions."""
+
+    def test_record_then_replay(self, mock_client, mock_upstream, tmp_path):
+        path = str(tmp_path / 'cassette.jsonl.gz')
+        client = mock_client
+        client.cassette = Cassette(path, mode='record')
+        messages = [{'role': 'user', 'content': 'What is Gui Zhi Tang?'}]
+        recorded = client.chat(messages, system_prompt=KB_PREAMBLE)
+        usage = client.last_usage
+
+        mock_upstream.scenario = Scenario({'errors': {'503': 1.0}})
+        delays = []
+        client.cassette = Cassette(path, mode='replay', latency_scale=0.5, sleep=delays.append)
+        spaced = [{'role': 'user', 'content': 'What is  Gui Zhi Tang? '}]
+        assert client.chat(spaced, system_prompt=KB_PREAMBLE) == recorded
+        assert client.last_usage == usage
+        assert len(delays) == 1 and delays[0] >= 0
+        assert mock_upstream.stats['requests'] == 1
+
+        with pytest.raises(CassetteMiss):
+            client.chat([{'role': 'user', 'content': 'Unrecorded question'}])
+
+    def test_repeated_requests_cycle_in_order(self, tmp_path):
+        path = str(tmp_path / 'cassette.jsonl')
+        payload = {'model': 'deepseek-chat', 'messages': [{'role': 'user', 'content': 'hi'}]}
+        recorder = Cassette(path, mode='record')
+        recorder.record(payload, 'first', {}, 0.1)
+        recorder.record(payload, 'second', {}, 0.1)
+        replay = Cassette(path, mode='replay', latency_scale=0)
+        assert [replay.replay(payload)[0] for _ in range(3)] == ['first', 'second', 'first']
+        assert request_key(payload) != request_key(dict(payload, temperature=0.2))
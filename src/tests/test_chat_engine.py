@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Unit tests for conversation summaries and prompt assembly (no app server, no live upstream)."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import conversation_summary
+import metrics
+from conversation_summary import SummaryStore, fold_messages
+from chat_engine import ChatEngine, KB_PREAMBLE, record_usage
+from knowledge_base import SYSTEM_PROMPT, KB_VERSION
+
+
+class RecordingClient:
+    """Stand-in for DeepSeekClient that records what would be sent."""
+
+    def __init__(self, answer="**Gui Zhi Tang** harmonizes ying and wei."):
+        self.answer = answer
+        self.calls = []
+
+    def chat(self, messages, system_prompt=None):
+        self.calls.append((messages, system_prompt))
+        return self.answer
+
+
+def make_engine():
+    engine = ChatEngine("test-key")
+    engine.client = RecordingClient()
+    return engine
+
+
+def make_turns(count):
+    messages = []
+    for i in range(count):
+        messages.append({'role': 'user', 'content': f"Question {i} about Ma Huang Tang?"})
+        messages.append({'role': 'assistant', 'content': f"**Ma Huang Tang** answer {i}. More detail follows."})
+    return messages
+
+
+class TestConversationSummary:
+    """Test rolling conversation summaries."""
+
+    def test_fold_messages_one_line_per_turn(self):
+        """Each question/answer pair folds into a single tagged line."""
+        summary = fold_messages('', make_turns(2))
+        lines = summary.split('\n')
+        assert len(lines) == 2
+        assert lines[0].startswith('- Q: Question 0')
+        assert 'A: Ma Huang Tang answer 0.' in lines[0]
+        assert '[Ma Huang Tang]' in lines[0]
+
+    def test_fold_messages_is_bounded(self):
+        """The summary never grows past MAX_SUMMARY_CHARS."""
+        summary = ''
+        for _ in range(50):
+            summary = fold_messages(summary, make_turns(5))
+        assert len(summary) <= conversation_summary.MAX_SUMMARY_CHARS
+
+    def test_store_keeps_recent_messages_unfolded(self, tmp_path):
+        """Updating folds older turns and leaves KEEP_RECENT messages verbatim."""
+        store = SummaryStore(str(tmp_path))
+        messages = make_turns(10)
+        store.update('abc', messages)
+
+        summary, tail = store.prompt_inputs('abc', messages)
+        assert summary
+        assert len(tail) == conversation_summary.KEEP_RECENT
+        assert tail == messages[-conversation_summary.KEEP_RECENT:]
+
+        reloaded = SummaryStore(str(tmp_path))
+        assert reloaded.get('abc')['summary'] == summary
+
+    def test_short_sessions_are_not_folded(self, tmp_path):
+        """Sessions below the fold threshold are sent as plain history."""
+        store = SummaryStore(str(tmp_path))
+        messages = make_turns(2)
+        store.update('short', messages)
+        assert store.prompt_inputs('short', messages) == ('', messages)
+
+    def test_lagging_fold_runs_before_the_prompt(self, tmp_path):
+        """A tail longer than HISTORY_WINDOW is folded inline instead of being cut by the prompt."""
+        store = SummaryStore(str(tmp_path))
+        messages = make_turns(10)
+        store.update('lag', messages[:8])  # the background fold has only seen 4 turns
+
+        summary, tail = store.prompt_inputs('lag', messages)
+        assert len(tail) == conversation_summary.KEEP_RECENT
+        assert 'Question 7' in summary
+        assert store.get('lag')['folded'] == len(messages) - conversation_summary.KEEP_RECENT
+
+        engine = make_engine()
+        engine.process_query("And now?", tail, summary)
+        sent = [m['content'] for m in engine.client.calls[0][0] if m['role'] != 'system']
+        assert sent[:-1] == [m['content'] for m in tail]
+
+    def test_store_sees_other_writers_and_discard_removes_file(self, tmp_path):
+        """A summary saved by another worker replaces the cached one; discard deletes the file."""
+        store, other = SummaryStore(str(tmp_path)), SummaryStore(str(tmp_path))
+        assert store.get('abc')['summary'] == ''
+        other.save('abc', {'summary': 'from another worker', 'folded': 4})
+        assert store.get('abc')['summary'] == 'from another worker'
+
+        store.discard('abc')
+        assert not (tmp_path / 'summary_abc.json').exists()
+        assert other.get('abc') == {'summary': '', 'folded': 0}
+
+
+class TestPromptLayout:
+    """Test the cache-friendly prompt layout."""
+
+    def test_prefix_is_identical_across_queries(self):
+        """System prompt and KB preamble lead every request unchanged."""
+        engine = make_engine()
+        engine.process_query("What is Gui Zhi Tang?")
+        engine.process_query("Compare Ma Huang Tang", [
+            {'role': 'user', 'content': 'What is Gui Zhi Tang?'},
+            {'role': 'assistant', 'content': 'It releases the exterior.'},
+        ])
+        (first, system_1), (second, system_2) = engine.client.calls
+        assert system_1 == system_2 == SYSTEM_PROMPT
+        assert first[0] == second[0] == {'role': 'system', 'content': KB_PREAMBLE}
+        assert KB_VERSION in KB_PREAMBLE
+
+    def test_question_comes_last(self):
+        """History and summary precede the new question and its context."""
+        engine = make_engine()
+        history = [
+            {'role': 'user', 'content': 'What is Gui Zhi Tang?'},
+            {'role': 'assistant', 'content': 'It releases the exterior.'},
+        ]
+        engine.process_query("And Ma Huang Tang?", history, summary="- Q: earlier")
+        messages, _ = engine.client.calls[0]
+        assert [m['role'] for m in messages] == ['system', 'system', 'user', 'assistant', 'user']
+        assert 'earlier' in messages[1]['content']
+        assert 'Question: And Ma Huang Tang?' in messages[-1]['content']
+
+    def test_record_usage_tracks_cache_hits(self):
+        """Provider cache hit/miss token counts accumulate in metrics."""
+        metrics.reset()
+        record_usage({'prompt_tokens': 1000, 'prompt_cache_hit_tokens': 768, 'prompt_cache_miss_tokens': 232})
+        snap = metrics.snapshot()
+        assert snap['counters']['upstream.prompt_cache_hit_tokens'] == 768
+        assert snap['counters']['upstream.prompt_cache_miss_tokens'] == 232
+        assert snap['gauges']['upstream.prompt_cache_hit_ratio'] == 0.768
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Unit tests for the conversation search."""
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import archive
+
+
+class TestConversationSearch:
+    """Test the conversation full-text index."""
+
+    def conversation(self, sid, day, *contents, user='x@tcm.org'):
+        return {'session_id': sid, 'user_email': user, 'timestamp': f"{day}T10:00:00",
+                'messages': [{'role': 'user' if i % 2 == 0 else 'assistant', 'content': c}
+                             for i, c in enumerate(contents)]}
+
+    def test_tokenize_and_parse_query(self):
+        from conversation_search import parse_query, tokenize
+        assert tokenize("小柴胡汤 Gui-Zhi 汤") == [('小柴', 0), ('柴胡', 1), ('胡汤', 2), ('gui', 5), ('zhi', 9), ('汤', 13)]
+        assert parse_query('柴胡 "gui zhi tang"') == [['柴胡'], ['gui', 'zhi', 'tang']]
+        with pytest.raises(ValueError):
+            parse_query('  "" ')
+
+    def test_phrases_filters_and_pages(self, tmp_path):
+        from conversation_search import SearchIndex
+        index = SearchIndex(str(tmp_path / 'index.sqlite3'))
+        index.add('conversation_a_2026-09-01.json', self.conversation(
+            'a', '2026-09-01', '小柴胡汤怎么用?', 'Xiao Chai Hu Tang harmonizes shaoyang.'))
+        index.add('conversation_b_2026-09-20.json', self.conversation(
+            'b', '2026-09-20', '柴胡 and 小 汤', user='y@tcm.org'))
+        index.add('conversation_c_2026-10-02.json', self.conversation('c', '2026-10-02', '大柴胡汤'))
+
+        ids = lambda result: [r['session_id'] for r in result['results']]
+        assert ids(index.search('小柴胡汤')) == ['a']
+        assert ids(index.search('柴胡')) == ['c', 'b', 'a']
+        assert ids(index.search('"chai hu tang"')) == ['a']
+        assert ids(index.search('"tang chai"')) == []
+        assert ids(index.search('小')) == ['b', 'a']
+        assert ids(index.search('柴胡', user='y@tcm.org')) == ['b']
+        assert ids(index.search('柴胡', since='2026-09-01', until='2026-09-30')) == ['b', 'a']
+        page = index.search('柴胡', page=2, per_page=2)
+        assert page['total'] == 3 and ids(page) == ['a']
+        assert index.search('shaoyang 小柴胡')['results'][0]['matching_messages'] == 2
+
+        index.add('conversation_a_2026-09-01.json', self.conversation('a', '2026-09-01', 'rewritten'))
+        assert ids(index.search('小柴胡汤')) == []
+
+    def test_single_character_matches_end_of_run(self, tmp_path):
+        """A one-character query finds the character as the last one of a CJK run."""
+        from conversation_search import SearchIndex
+        index = SearchIndex(str(tmp_path / 'index.sqlite3'))
+        index.add('conversation_a_2026-09-01.json', self.conversation('a', '2026-09-01', '怎么用桂枝汤?'))
+        index.add('conversation_b_2026-09-02.json', self.conversation('b', '2026-09-02', '麻黄'))
+
+        result = index.search('汤')
+        assert [r['session_id'] for r in result['results']] == ['a']
+        assert '桂枝汤' in result['results'][0]['snippets'][0]['text']
+        assert [r['session_id'] for r in index.search('黄')['results']] == ['b']
+
+    def test_sync_follows_files_and_archive(self, tmp_path):
+        import archive
+        from conversation_search import SearchIndex
+        hot, store = tmp_path / 'conversations', tmp_path / 'archive'
+        hot.mkdir()
+        for sid, day in (('a', '2026-01-05'), ('b', '2026-02-01')):
+            path = hot / f"conversation_{sid}_{day}.json"
+            path.write_text(json.dumps(self.conversation(sid, day, f"麻黄汤 {sid}")))
+            stamp = time.mktime(time.strptime(day, '%Y-%m-%d'))
+            os.utime(path, (stamp, stamp))
+        reader = archive.ArchiveReader(str(store / 'conversations'))
+        index = SearchIndex(str(tmp_path / 'index.sqlite3'))
+        assert index.sync(str(hot), reader) == (2, 0)
+        assert index.sync(str(hot), reader) == (0, 0)
+
+        archive.archive_conversations(str(hot), str(store), time.mktime((2026, 2, 15, 12, 0, 0, 0, 0, -1)))
+        index.sync(str(hot), reader)
+        assert [r['archived'] for r in index.search('麻黄汤')['results']] == [None, '2026-01']
+        (hot / 'conversation_b_2026-02-01.json').unlink()
+        assert index.sync(str(hot), reader) == (0, 1)
+
+        fresh = SearchIndex(str(tmp_path / 'fresh.sqlite3'))
+        assert fresh.sync(str(hot), reader) == (1, 0)  # rebuilt from the archive
+        assert fresh.search('"麻黄汤 a"')['results'][0]['archived'] == '2026-01'
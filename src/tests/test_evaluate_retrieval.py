@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Unit tests for the retrieval evaluation."""
+
+import json
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import evaluate_retrieval
+
+
+class TestRetrievalEvaluation:
+    """Test the offline retrieval evaluation."""
+
+    def test_score(self):
+        item = {'id': 'x', 'formulas': ['gui_zhi_tang'], 'patterns': ['tai_yang'], 'lines': [12]}
+        result = {'retrieved': ['formula:ma_huang_tang', 'formula:gui_zhi_tang', 'pattern:tai_yang'], 'lines': [12]}
+        scores = evaluate_retrieval.score(item, result)
+        assert scores['recall@1'] == 0.0
+        assert scores['recall@3'] == 1.0
+        assert scores['rr'] == 0.5
+        assert scores['line_recall'] == 1.0
+
+    def test_evaluate_and_compare(self):
+        labeled = [
+            {'id': 'gzt', 'question': 'What is Gui Zhi Tang used for?', 'formulas': ['gui_zhi_tang']},
+            {'id': 'sym', 'question': 'sweating, aversion to wind, floating slow pulse', 'formulas': ['gui_zhi_tang']},
+        ]
+        report = evaluate_retrieval.evaluate(labeled, workers=1)
+        assert report['questions_evaluated'] == 2
+        assert report['summary']['recall@5'] == 1.0
+        assert set(report['latency']) >= {'build_context', 'classify'}
+
+        baseline = json.loads(json.dumps(report))
+        baseline['summary']['mrr'] = 1.5
+        baseline['questions'][0]['rr'] = 2.0
+        diff = evaluate_retrieval.compare(baseline, report)
+        mrr = next(row for row in diff['metrics'] if row['metric'] == 'mrr')
+        assert mrr['delta'] < 0
+        assert [row['id'] for row in diff['worse_questions']] == ['gzt']
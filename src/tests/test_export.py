@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Unit tests for the conversation export."""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import export
+
+
+class TestExport:
+    """Test the streaming conversation and feedback export."""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        conversations, feedback = tmp_path / 'conversations', tmp_path / 'feedback'
+        conversations.mkdir()
+        feedback.mkdir()
+        for sid, user, day in (('a1', 'x@tcm.org', '2026-01-05'), ('b2', 'y@tcm.org', '2026-02-10')):
+            (conversations / f"conversation_{sid}_{day}.json").write_text(json.dumps({
+                'session_id': sid, 'user_email': user, 'timestamp': f"{day}T10:00:00",
+                'messages': [
+                    {'role': 'user', 'content': 'What is "Gui Zhi Tang"?\nTwo lines', 'timestamp': f"{day}T09:59:00"},
+                    {'role': 'assistant', 'content': '桂枝汤', 'sources': ['Shang Han Lun - Gui Zhi Tang'],
+                     'served_by': 'llm', 'timestamp': f"{day}T10:00:00"},
+                ]
+            }))
+        (feedback / 'feedback_20260105_100000_abcd1234.json').write_text(json.dumps({
+            'message_id': 'msg_2', 'rating': 'up', 'feedback': 'ok', 'timestamp': '2026-01-05T10:00:00',
+            'user_email': 'x@tcm.org'
+        }))
+        return {'conversations_dir': str(conversations), 'feedback_dir': str(feedback)}
+
+    def test_ndjson_filters(self, store):
+        def rows(kind, **filters):
+            data = b''.join(export.export(kind, flt=export.ExportFilter(**filters), **store))
+            return [json.loads(line) for line in data.decode('utf-8').splitlines()]
+
+        assert [r['session_id'] for r in rows('conversations')] == ['a1', 'b2']
+        assert rows('conversations', since=export.parse_date('2026-02-01'))[0]['first_question'].startswith('What')
+        assert len(rows('conversations', until=export.parse_date('2026-01-31'))) == 1
+        messages = rows('messages', user='y@tcm.org')
+        assert [(m['index'], m['role']) for m in messages] == [(0, 'user'), (1, 'assistant')]
+        assert messages[1]['sources'] == ['Shang Han Lun - Gui Zhi Tang']
+        assert rows('feedback', user='y@tcm.org') == []
+
+    def test_csv_and_gzip(self, store):
+        import csv
+        import gzip
+        import io
+        data = gzip.decompress(b''.join(export.export('messages', 'csv', compress=True, **store)))
+        table = list(csv.reader(io.StringIO(data.decode('utf-8'))))
+        assert table[0] == list(export.FIELDS['messages'])
+        assert len(table) == 5
+        assert table[1][-1] == 'What is "Gui Zhi Tang"?\nTwo lines'
+        assert table[2][6] == '["Shang Han Lun - Gui Zhi Tang"]'
+        with pytest.raises(ValueError):
+            export.export('everything')
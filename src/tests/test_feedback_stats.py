@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Unit tests for the feedback analytics."""
+
+import json
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+class TestFeedbackStats:
+    """Test incremental feedback rollups."""
+
+    def record(self, rating, day, user='x@tcm.org', message='msg_2', entities=()):
+        return {'message_id': message, 'rating': rating, 'timestamp': f"{day}T10:00:00", 'user_email': user,
+                'session_id': 's1', 'question': 'q', 'entities': list(entities)}
+
+    def test_summary_counts_window_and_poor_answers(self):
+        from datetime import date
+        import feedback_stats
+        rollup = feedback_stats.empty_rollup()
+        feedback_stats.apply(rollup, self.record('up', '2026-03-01', entities=['formula:gui_zhi_tang']))
+        feedback_stats.apply(rollup, self.record('down', '2026-03-10', user='y@tcm.org',
+                                                 entities=['formula:gui_zhi_tang']))
+        feedback_stats.apply(rollup, self.record('down', '2026-03-10', message='msg_4'))
+
+        summary = feedback_stats.summarize(rollup, days=7, today=date(2026, 3, 10))
+        assert summary['total']['counts'] == {'up': 1, 'down': 2}
+        assert summary['window']['counts'] == {'down': 2}
+        assert summary['window']['down_rate'] == 1.0
+        assert len(summary['daily']) == 7 and summary['daily'][-1]['day'] == '2026-03-10'
+        assert summary['entities'][0] == {'key': 'formula:gui_zhi_tang', 'counts': {'up': 1, 'down': 1},
+                                          'down_rate': 0.5}
+        assert [a['answer'] for a in summary['poor_answers']] == ['s1:msg_2', 's1:msg_4']
+
+    def test_rollup_is_capped(self, monkeypatch):
+        import feedback_stats
+        monkeypatch.setattr(feedback_stats, 'MAX_DAYS', 3)
+        monkeypatch.setattr(feedback_stats, 'MAX_ANSWERS', 2)
+        rollup = feedback_stats.empty_rollup()
+        for day in range(1, 6):
+            feedback_stats.apply(rollup, self.record('up', f"2026-03-0{day}", message=f"msg_{day}"))
+        assert sorted(rollup['days']) == ['2026-03-03', '2026-03-04', '2026-03-05']
+        assert sorted(rollup['answers']) == ['s1:msg_4', 's1:msg_5']
+        assert rollup['total'] == {'up': 5}
+
+    def test_record_matches_rebuild(self, tmp_path):
+        import feedback_stats
+        feedback_dir = tmp_path / 'feedback'
+        feedback_dir.mkdir()
+        store = feedback_stats.FeedbackRollup(str(tmp_path / 'rollup.json'), str(feedback_dir))
+        assert store.read() == feedback_stats.empty_rollup()
+        for index, rating in enumerate(['up', 'down', 'down']):
+            record = self.record(rating, f"2026-03-0{index + 1}", message=f"msg_{index}")
+            (feedback_dir / f"feedback_{index}.json").write_text(json.dumps(record))
+            store.record(record)  # the first call builds the file from disk, then each call adds one
+        assert store.read()['total'] == {'up': 1, 'down': 2}
+        assert store.rebuild() == store.read()
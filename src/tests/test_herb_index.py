@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Unit tests for the herb index."""
+
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from herb_index import HerbIndex, parse_dosage
+from chat_engine import build_context
+
+
+class TestHerbIndex:
+    """Test the herb inverted index."""
+
+    def test_parse_dosage(self):
+        assert parse_dosage("9g") == ((9.0, 9.0), None)
+        assert parse_dosage("12-24g") == ((12.0, 24.0), None)
+        assert parse_dosage("4 pieces") == (None, 4)
+
+    def test_set_queries(self):
+        """Bitset intersections answer include/exclude/any queries."""
+        index = HerbIndex()
+        assert index.query(include=['麻黄', '桂枝']) == ['ma_huang_tang', 'xiao_qing_long_tang']
+        assert index.query(include=['Ma Huang'], exclude=['Ban Xia']) == ['ma_huang_tang']
+        assert index.query(any_of=['石膏', '大黄']) == ['bai_hu_tang', 'cheng_shi_tang']
+
+    def test_context_lists_formulas_containing_herb(self):
+        """build_context names the formulas a mentioned herb appears in."""
+        context, sources = build_context("How is 石膏 used?")
+        assert "Herb: 石膏 (Shi Gao, Gypsum) appears in: Bai Hu Tang 白虎汤 30g" in context
+        assert "Shang Han Lun - Bai Hu Tang" in sources
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Unit tests for the load test report."""
+
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import loadtest
+
+
+class TestLoadTestReport:
+    """Test load test report aggregation."""
+
+    def samples(self, latency):
+        return [
+            loadtest.Sample(t, '/api/chat', 200 if t < 9 else 503, latency, 600 + 100 * t, 'llm', None)
+            for t in range(10)
+        ] + [loadtest.Sample(5.0, '/api/login', 0, 0.01, 0, None, 'ConnectionError')]
+
+    def test_report_and_timeline(self):
+        report = loadtest.build_report(self.samples(0.5), duration=10.0, interval=5.0)
+        chat = report['endpoints']['/api/chat']
+        assert chat['requests'] == 10
+        assert chat['throughput_rps'] == 1.0
+        assert chat['p50_ms'] == 500.0
+        assert chat['error_rate'] == 0.1
+        assert report['endpoints']['/api/login']['statuses'] == {'ConnectionError': 1}
+        assert [entry['t'] for entry in report['timeline']] == [0.0, 5.0]
+        assert report['timeline'][1]['cookie_bytes_max'] == 1500
+        assert report['served_by'] == {'llm': 10}
+
+    def test_compare(self):
+        baseline = loadtest.build_report(self.samples(0.5), duration=10.0)
+        current = loadtest.build_report(self.samples(1.0), duration=10.0)
+        rows = {(r['endpoint'], r['metric']): r for r in loadtest.compare_reports(baseline, current)}
+        assert rows[('/api/chat', 'p99_ms')]['change_pct'] == 100.0
+        assert rows[('overall', 'throughput_rps')]['change_pct'] == 0.0
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Unit tests for the live log feed."""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from log_feed import LogTailer, parse_levels
+
+
+class TestLogTailer:
+    """Test the shared log tailer behind the live admin log feed."""
+
+    LINE = "2026-01-01 00:00:0{n} | {level:<8} | server.py:1 | f | message {n} | with a bar\n"
+
+    def write(self, path, *items):
+        with open(path, 'a', encoding='utf-8') as f:
+            for n, level in items:
+                f.write(self.LINE.format(n=n, level=level) if level else f"  traceback line {n}\n")
+
+    def test_cursor_levels_and_rotation(self, tmp_path):
+        log = tmp_path / 'app.log'
+        self.write(log, (1, 'INFO'), (2, 'ERROR'), (3, None))
+        tailer = LogTailer(str(tmp_path))
+        assert tailer.poll() == 3
+        records, cursor = tailer.tail(10)
+        assert records[0]['message'] == 'message 1 | with a bar'
+        assert records[2] == {'raw': 'traceback line 3', 'level': 'ERROR', 'cursor': records[2]['cursor']}
+        errors = tailer.tail(10, parse_levels('error'))[0]
+        assert [r.get('message', r.get('raw')) for r in errors] == ['message 2 | with a bar', 'traceback line 3']
+
+        assert tailer.wait(cursor, timeout=0) == ([], cursor)
+        self.write(log, (4, 'DEBUG'), (5, 'WARNING'))
+        tailer.poll()
+        records, after = tailer.wait(cursor, parse_levels('warning,error'))
+        assert [r['message'] for r in records] == ['message 5 | with a bar']
+        assert tailer.wait(after, timeout=0)[0] == []
+
+        # Rotation: the rest of the old file, then the new one from the start.
+        self.write(log, (6, 'INFO'))
+        log.rename(tmp_path / 'app.log.1')
+        self.write(log, (7, 'INFO'))
+        tailer.poll()
+        assert [r['message'][:9] for r in tailer.wait(after)[0]] == ['message 6', 'message 7']
+
+        with pytest.raises(ValueError):
+            parse_levels('loud')
+
+    def test_wait_wakes_on_new_records(self, tmp_path):
+        log = tmp_path / 'app.log'
+        self.write(log, (1, 'INFO'))
+        tailer = LogTailer(str(tmp_path), poll_seconds=0.01)
+        tailer.poll()
+        cursor = tailer.tail(1)[1]
+        tailer.ensure_started()
+        threading.Timer(0.05, self.write, (log, (2, 'INFO'))).start()
+        started = time.time()
+        records, _ = tailer.wait(cursor, timeout=5)
+        assert [r['message'][:9] for r in records] == ['message 2']
+        assert time.time() - started < 2
+
+    def test_unknown_cursor_does_not_replay_older_files(self, tmp_path):
+        log = tmp_path / 'app.log'
+        self.write(log, (1, 'INFO'), (2, 'INFO'))
+        tailer = LogTailer(str(tmp_path))
+        tailer.poll()
+        log.rename(tmp_path / 'app.log.1')
+        self.write(log, (3, 'INFO'))
+        tailer.poll()
+        for cursor in ('999999:0', 'garbage'):
+            assert [r['message'][:9] for r in tailer.wait(cursor)[0]] == ['message 3']
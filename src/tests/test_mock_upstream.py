@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Unit tests for the mock upstream."""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from chat_engine import KB_PREAMBLE
+from mock_upstream import Scenario
+from resilience import UpstreamThrottled, UpstreamUnavailable
+
+
+class TestMockUpstream:
+    """Test the local stand-in upstream."""
+
+    def test_completion_and_cache_usage(self, mock_client, mock_upstream):
+        client = mock_client
+        messages = [{'role': 'user', 'content': 'What is Gui Zhi Tang?'}]
+        answer = client.chat(messages, system_prompt=KB_PREAMBLE)
+        assert "Gui Zhi Tang" in answer
+        assert client.last_usage['completion_tokens'] == 20
+        assert client.last_usage['prompt_cache_hit_tokens'] == 0
+        client.chat(messages, system_prompt=KB_PREAMBLE)
+        assert client.last_usage['prompt_cache_hit_tokens'] > 0
+
+    def test_injected_errors(self, mock_client, mock_upstream):
+        client = mock_client
+        messages = [{'role': 'user', 'content': 'hi'}]
+        for status, error in ((429, UpstreamThrottled), (503, UpstreamUnavailable)):
+            mock_upstream.scenario = Scenario({'errors': {str(status): 1.0}, 'latency': {'seconds': 0}})
+            with pytest.raises(error):
+                client.chat(messages)
+        assert mock_upstream.stats['errors'] == {'429': 1, '503': 1}
+
+    def test_streaming(self, mock_upstream):
+        import requests
+        response = requests.post(
+            f"{mock_upstream.url}/v1/chat/completions",
+            headers={'Authorization': 'Bearer mock-key'},
+            json={'messages': [{'role': 'user', 'content': 'hi'}], 'stream': True},
+            stream=True, timeout=5
+        )
+        events = [line[6:] for line in response.iter_lines(decode_unicode=True) if line.startswith('data: ')]
+        assert events[-1] == '[DONE]'
+        chunks = [json.loads(e) for e in events[:-1]]
+        assert len(chunks) == 21
+        assert chunks[-1]['usage']['completion_tokens'] == 20
+
+    def test_scenario_phases(self, clock):
+        scenario = Scenario({'errors': {}, 'phases': [
+            {'duration': 10}, {'duration': 5, 'errors': {'503': 1.0}}
+        ]}, clock=clock)
+        assert scenario.draw()[1] == 'ok'
+        clock.now += 12
+        assert scenario.draw()[1] == '503'
+        clock.now += 100
+        assert scenario.current()['errors'] == {'503': 1.0}
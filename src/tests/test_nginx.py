@@ -91,6 +91,14 @@ class TestNginxConfiguration:
         assert alias_match is not None or root_match is not None, \
             "No static file directory configured"
     
+    def test_static_dist_keeps_security_headers(self):
+        """add_header in a location drops the http-level headers, so the build output repeats them."""
+        content = NGINX_CONF_PATH.read_text()
+        block = re.search(r'location /static/dist/ \{(.*?)\n        \}', content, re.S).group(1)
+        for header in ('X-Content-Type-Options nosniff', 'X-Frame-Options DENY', 'X-XSS-Protection "1; mode=block"'):
+            assert f'add_header {header} always;' in content.split('server {')[0]
+            assert f'add_header {header} always;' in block
+    
     def test_nginx_health_endpoint(self):
         """Verify nginx configuration includes health check endpoint."""
         content = NGINX_CONF_PATH.read_text()
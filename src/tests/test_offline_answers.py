@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Unit tests for the offline answers."""
+
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from entity_matcher import get_matcher, Entity, FORMULA, HERB, TERM
+from offline_answers import answer_offline
+
+
+class TestOfflineAnswers:
+    """Test the entity matcher and knowledge-base answers."""
+
+    def test_matcher_prefers_longest_match(self):
+        """'Gui Zhi Tang' is the formula, not the herb Gui Zhi."""
+        entities = get_matcher().entities("Tell me about gui zhi tang")
+        assert entities == [Entity(FORMULA, 'gui_zhi_tang')]
+
+    def test_matcher_finds_herbs_and_aliases(self):
+        """Chinese aliases and herb names resolve to KB entries."""
+        matcher = get_matcher()
+        assert Entity(FORMULA, 'da_xiao_chi_hu_tang') in matcher.entities("小柴胡汤的组成")
+        assert Entity(HERB, '麻黄') in matcher.entities("What is Ma Huang?")
+        assert Entity(TERM, '表证') in matcher.entities("what does 表证 mean")
+
+    def test_formula_answer_is_structured_and_cited(self):
+        """Formula answers carry composition, dosages and the formula source."""
+        answer, sources = answer_offline("composition of 麻黄汤")
+        assert "**Ma Huang**" in answer and "9g" in answer
+        assert "Indications 主治" in answer
+        assert sources == ["Shang Han Lun - Ma Huang Tang"]
+
+    def test_herb_answer_lists_formulas(self):
+        """Herb answers list every formula containing the herb."""
+        answer, sources = answer_offline("What is Ma Huang?")
+        assert "Xiao Qing Long Tang" in answer
+        assert "Chapter" not in answer
+        assert "Shang Han Lun - Ma Huang Tang" in sources
+
+    def test_unknown_question_gets_overview(self):
+        """Questions without KB entities get the general overview."""
+        answer, sources = answer_offline("hello there")
+        assert "Zhang Zhongjing" in answer
+        assert sources == ["Shang Han Lun - General Reference"]
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Unit tests for request profiling."""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+class TestProfiling:
+    """Test the request profiler."""
+
+    def work(self):
+        data = [str(i) * 10 for i in range(20000)]
+        time.sleep(0.03)
+        return data
+
+    def test_plan_validation(self):
+        import profiling
+        assert profiling.new_plan(route='/api/chat', requests=5)['remaining'] == 5
+        for bad in ({'requests': 0}, {'sample': 0}, {'minutes': 500}, {'modes': ['perf']}):
+            with pytest.raises(ValueError):
+                profiling.new_plan(**bad)
+
+    def test_profiles_only_matching_requests_up_to_budget(self, tmp_path):
+        import profiling
+        profiler = profiling.Profiler(str(tmp_path))
+        assert profiler.run(self.work, (), {}, 'GET', '/x', 'a') and profiler.captures() == []
+
+        profiler.arm(profiling.new_plan(route='/x', user='a', requests=2))
+        profiler.run(self.work, (), {}, 'GET', '/y', 'a')
+        profiler.run(self.work, (), {}, 'GET', '/x', 'b')
+        for _ in range(3):
+            assert len(profiler.run(self.work, (), {}, 'GET', '/x', 'a')) == 20000
+        captures = profiler.captures()
+        assert len(captures) == 2 and {c['path'] for c in captures} == {'/x'}
+        profiler.refresh()
+        assert profiler.plan is None
+
+        files = captures[0]['files']
+        stacks = (tmp_path / next(f for f in files if f.endswith('.folded') and not f.endswith('.alloc.folded'))
+                  ).read_text().splitlines()
+        assert any('work (test_profiling.py' in line for line in stacks)
+        allocations = (tmp_path / next(f for f in files if f.endswith('.alloc.folded'))).read_text()
+        assert 'test_profiling.py' in allocations
+        assert profiler.capture_path(files[0]) and profiler.capture_path('plan.json') is None
+        assert profiler.capture_path('../secret.json') is None
+
+    def test_failed_request_is_still_saved(self, tmp_path):
+        import profiling
+        profiler = profiling.Profiler(str(tmp_path))
+        profiler.arm(profiling.new_plan(requests=1, modes=['cprofile']))
+
+        def fail():
+            raise RuntimeError("boom")
+        with pytest.raises(RuntimeError):
+            profiler.run(fail, (), {}, 'POST', '/api/chat', 'a')
+        assert profiler.captures()[0]['status'] == 500
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Unit tests for the query router."""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import query_router
+
+
+class TestQueryRouter:
+    """Test the deterministic fast path for lookup questions."""
+
+    @pytest.fixture(autouse=True)
+    def routing_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(query_router, 'ROUTING_DIR', str(tmp_path))
+        return tmp_path
+
+    def test_composition_lookup_is_answered(self):
+        """'composition of 麻黄汤' is served from FORMULAS."""
+        route = query_router.route("composition of 麻黄汤")
+        assert route.intent == 'composition'
+        assert route.confidence >= query_router.CONFIDENCE_THRESHOLD
+        assert "Xing Ren" in route.answer
+        assert route.sources == ["Shang Han Lun - Ma Huang Tang"]
+
+    def test_dosage_in_formula(self):
+        """A herb dosage is narrowed to the named formula."""
+        route = query_router.route("dosage of Gui Zhi in Gui Zhi Tang")
+        assert route.intent == 'dosage'
+        assert "**Gui Zhi** 桂枝 in **Gui Zhi Tang**" in route.answer
+        assert "Ma Huang Tang" not in route.answer
+
+    def test_term_definition(self):
+        """'what does 表证 mean' is answered from TERMINOLOGY."""
+        route = query_router.route("what does 表证 mean")
+        assert route.intent == 'definition'
+        assert "Exterior Pattern" in route.answer
+
+    def test_reasoning_questions_go_to_llm(self):
+        """Comparisons and open questions fall below the threshold."""
+        assert query_router.route("Why is the dosage of Ma Huang higher than Gui Zhi?").answer is None
+        assert query_router.route("Tell me about Gui Zhi Tang").answer is None
+
+    def test_decisions_are_logged(self, routing_dir):
+        """Every routing decision lands in the routing log."""
+        query_router.route("composition of 麻黄汤")
+        query_router.route("Tell me about Gui Zhi Tang")
+        lines = next(routing_dir.glob("routing_*.jsonl")).read_text(encoding='utf-8').splitlines()
+        assert [json.loads(line)['served_by'] for line in lines] == ['fast_path', 'llm']
+
+    @pytest.mark.parametrize('query', ["What is the dosage of Ma Huang Tang?", "麻黄汤的剂量", "Gui Zhi Tang dose"])
+    def test_formula_dosage_lists_its_herbs(self, query):
+        """A dosage question naming only a formula is answered with its herbs' doses."""
+        route = query_router.route(query)
+        assert route.intent == 'dosage'
+        assert "Dosage 剂量" in route.answer and "**Gui Zhi** 桂枝" in route.answer
+
+    def test_failing_answerer_falls_back_to_llm(self, monkeypatch):
+        """An answerer that raises sends the question to the LLM instead of failing the request."""
+        def broken(entities):
+            raise KeyError('x')
+        monkeypatch.setitem(query_router.ANSWERERS, 'composition', broken)
+        route = query_router.route("composition of 麻黄汤")
+        assert route.intent == 'composition' and route.answer is None
+
+    def test_pattern_term_is_answered_as_pattern(self):
+        """'Tai Yang disease' gets the pattern, not the bare translation."""
+        route = query_router.route("What is Tai Yang disease?")
+        assert route.entities == [query_router.Entity(query_router.PATTERN, 'tai_yang')]
+        assert route.sources[0] == query_router.source_for_pattern('tai_yang')
+
+    @pytest.mark.parametrize('query', [
+        "What is the formula for fever and chills?",
+        "What is the maximum safe dose of Ma Huang for a child?",
+        "Is Ma Huang safe during pregnancy? What is the dose?",
+        "孕妇可以用麻黄吗？用量多少？",
+    ])
+    def test_generic_and_safety_questions_go_to_llm(self, query):
+        """Generic terms are not routed on, and safety questions need the LLM."""
+        assert query_router.route(query).answer is None
+
+    @pytest.mark.parametrize('query', [
+        "Is 麻黄汤 contraindicated in hypertension?",
+        "麻黄汤 side effects",
+        "what is the dose of ma huang tang for a 5 year old",
+    ])
+    def test_safety_cues_are_not_substring_matches(self, query):
+        """'contraindicated' is not an indications cue, and safety and age questions go to the LLM."""
+        route = query_router.route(query)
+        assert route.answer is None
+        assert route.confidence < query_router.CONFIDENCE_THRESHOLD
+
+    def test_cues_match_whole_words(self):
+        """Cues match on word boundaries, plurals included."""
+        assert not query_router.INTENT_PATTERNS['indications'].search("is it contraindicated")
+        assert query_router.INTENT_PATTERNS['indications'].search("what are the indications")
+        assert query_router.COMPLEX_PATTERN.search("a 5-year-old")
+
+    @pytest.mark.parametrize('query', ["What is 黄芩汤?", "Huang Qin Tang composition"])
+    def test_unknown_formula_is_not_answered_as_its_herb(self, query):
+        """A herb name followed by 汤/Tang names a formula outside the KB."""
+        route = query_router.route(query)
+        assert route.answer is None and route.confidence == 0.0
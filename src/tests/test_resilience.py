@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Unit tests for the circuit breaker and hedged calls."""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, hedged_call
+
+
+class TestCircuitBreaker:
+    """Test the upstream circuit breaker and hedging."""
+
+    def make_breaker(self, clock):
+        return CircuitBreaker('test', window=10, min_calls=4, failure_rate=0.5,
+                              slow_call_seconds=5.0, slow_call_rate=0.75,
+                              open_seconds=30.0, clock=clock)
+
+    def test_opens_on_failure_rate_and_fails_fast(self, clock):
+        """Enough failures in the window open the circuit."""
+        breaker = self.make_breaker(clock)
+        for _ in range(2):
+            breaker.record_success(0.1)
+        for _ in range(2):
+            breaker.record_failure(0.1)
+        assert breaker.state == resilience.OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_opens_on_slow_calls(self, clock):
+        """Successful but slow calls also open the circuit."""
+        breaker = self.make_breaker(clock)
+        for _ in range(4):
+            breaker.record_success(6.0)
+        assert breaker.state == resilience.OPEN
+
+    def test_half_open_probe_closes_or_reopens(self, clock):
+        """After the open period one probe decides the next state."""
+        breaker = self.make_breaker(clock)
+        for _ in range(4):
+            breaker.record_failure(0.1)
+        clock.now = 31.0
+        assert breaker.state == resilience.HALF_OPEN
+
+        breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()  # only one probe at a time
+        breaker.record_failure(0.1)
+        assert breaker.state == resilience.OPEN
+
+        clock.now = 62.0
+        breaker.before_call()
+        breaker.record_success(0.1)
+        assert breaker.state == resilience.CLOSED
+        transitions = [(t['from'], t['to']) for t in breaker.snapshot()['transitions']]
+        assert transitions[-1] == (resilience.HALF_OPEN, resilience.CLOSED)
+
+    def test_unexpected_error_releases_half_open_probe(self, clock, monkeypatch):
+        """A probe that dies with an unexpected error re-opens the circuit instead of sticking."""
+        import requests
+        import chat_engine
+        breaker = self.make_breaker(clock)
+        monkeypatch.setattr(chat_engine, 'UPSTREAM_BREAKER', breaker)
+        for _ in range(4):
+            breaker.record_failure(0.1)
+        clock.now = 31.0
+        assert breaker.state == resilience.HALF_OPEN
+
+        client = chat_engine.DeepSeekClient(api_key='sk-test-key')
+        client.cassette = None
+
+        def broken_post(headers, payload):
+            raise requests.exceptions.ChunkedEncodingError("connection broken mid-body")
+
+        monkeypatch.setattr(client, '_post', broken_post)
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            client.chat([{"role": "user", "content": "桂枝汤"}])
+        assert breaker.state == resilience.OPEN
+
+        clock.now = 62.0
+        breaker.before_call()  # the probe slot is free again
+        breaker.record_success(0.1)
+        assert breaker.state == resilience.CLOSED
+
+    def test_hedged_call_returns_first_answer(self):
+        """A stalled primary is overtaken by the hedged duplicate."""
+        calls = []
+
+        def call():
+            calls.append(1)
+            if len(calls) == 1:
+                time.sleep(0.5)
+                return 'slow'
+            return 'fast'
+
+        started = time.monotonic()
+        assert hedged_call(call, 0.05) == 'fast'
+        assert time.monotonic() - started < 0.4
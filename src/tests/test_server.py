@@ -7,13 +7,19 @@ import os
 import sys
 import time
 import threading
+import tempfile
 import requests
 from pathlib import Path
 
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
 SERVER_PATH = BASE_DIR / "server.py"
 PORT = 8765
 BASE_URL = f"http://localhost:{PORT}"
+STATE_DIR = tempfile.mkdtemp(prefix='state')
+ARCHIVE_DIR = os.path.join(STATE_DIR, 'archive')
+
+from conftest import server_state_env
 
 @pytest.fixture(scope="module")
 def server():
@@ -23,6 +29,7 @@ def server():
     env = os.environ.copy()
     env['PORT'] = str(PORT)
     env['FLASK_DEBUG'] = 'false'
+    env.update(server_state_env(STATE_DIR))
     
     server_process = subprocess.Popen(
         [sys.executable, str(SERVER_PATH)],
@@ -70,6 +77,18 @@ class TestHomePage:
         response = requests.get(f"{server}/login")
         assert response.status_code == 200
         assert "Sign In" in response.text
+
+    def test_page_assets_are_linked_and_served(self, server):
+        """Test that pages link their CSS/JS through the asset manifest."""
+        import re
+        response = requests.get(f"{server}/login")
+        links = re.findall(r'(?:href|src)="(/static/[^"]+\.(?:css|js))"', response.text)
+        assert len(links) == 2
+        for link in links:
+            asset = requests.get(f"{server}{link}")
+            assert asset.status_code == 200
+            if '/static/dist/' in link:
+                assert 'immutable' in asset.headers['Cache-Control']
     
     def test_chat_page_redirects_when_not_logged_in(self, server):
         """Test that chat page redirects to login when not authenticated."""
@@ -200,6 +219,340 @@ class TestChatAPI:
         assert 'Zhang Zhongjing' in data['answer'] or 'classical' in data['answer'].lower()
 
 
+class TestHerbAPI:
+    """Test the herb-to-formula query API."""
+    
+    def test_herb_query_requires_authentication(self, server):
+        """Test that the herb query endpoint requires authentication."""
+        response = requests.get(f"{server}/api/herbs/formulas", params={"include": "麻黄"})
+        assert response.status_code == 401
+    
+    def test_include_and_exclude(self, server):
+        """Test set queries mixing Chinese, pinyin and English names."""
+        session = requests.Session()
+        session.post(
+            f"{server}/api/login",
+            json={"email": "regular@tcm.org", "password": "userpass123"}
+        )
+        
+        response = session.get(
+            f"{server}/api/herbs/formulas",
+            params={"include": "麻黄,Gui Zhi", "exclude": "white peony"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert [f['key'] for f in data['formulas']] == ['ma_huang_tang']
+        assert data['exclude'] == ['白芍']
+        herbs = {h['herb']: h for h in data['formulas'][0]['herbs']}
+        assert herbs['麻黄']['grams'] == [9.0, 9.0]
+    
+    def test_unknown_herb(self, server):
+        """Test that unknown herbs are rejected."""
+        session = requests.Session()
+        session.post(
+            f"{server}/api/login",
+            json={"email": "regular@tcm.org", "password": "userpass123"}
+        )
+        response = session.get(f"{server}/api/herbs/formulas", params={"include": "unobtainium"})
+        assert response.status_code == 400
+    
+    def test_rank_symptoms(self, server):
+        """Test ranking formulas and patterns from a symptom list."""
+        session = requests.Session()
+        session.post(
+            f"{server}/api/login",
+            json={"email": "regular@tcm.org", "password": "userpass123"}
+        )
+        response = session.post(
+            f"{server}/api/rank",
+            json={"symptoms": ["high fever", "severe thirst", "profuse sweating"], "top_k": 2}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data['formulas'][0]['key'] == 'bai_hu_tang'
+        assert data['formulas'][0]['names']['pinyin'] == 'Bai Hu Tang'
+        assert len(data['formulas']) <= 2
+        
+        response = session.post(f"{server}/api/rank", json={})
+        assert response.status_code == 400
+
+
+class TestBatchAPI:
+    """Test the admin batch question endpoint."""
+    
+    def test_batch_requires_admin(self, server):
+        """Test that regular users cannot run batches."""
+        session = requests.Session()
+        session.post(
+            f"{server}/api/login",
+            json={"email": "regular@tcm.org", "password": "userpass123"}
+        )
+        response = session.post(f"{server}/admin/api/batch", json={"questions": ["What is Ma Huang?"]})
+        assert response.status_code == 403
+    
+    def test_batch_streams_and_resumes(self, server):
+        """Test NDJSON streaming and resuming a batch by id."""
+        session = requests.Session()
+        session.post(
+            f"{server}/api/login",
+            json={"email": "prof@tcm.org", "password": "password123"}
+        )
+        batch_id = f"test_{int(time.time() * 1000)}"
+        questions = ["What is Ma Huang?", "What is Gui Zhi Tang?", {"id": "sl", "question": "What is the Shang Han Lun?"}]
+        
+        response = session.post(
+            f"{server}/admin/api/batch",
+            json={"questions": questions, "batch_id": batch_id, "concurrency": 2},
+            stream=True
+        )
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+        assert lines[0]['type'] == 'batch' and lines[0]['total'] == 3
+        results = {r['id']: r for r in lines if r['type'] == 'result'}
+        assert set(results) == {'q0001', 'q0002', 'sl'}
+        assert all(r['answer'] and r['served_by'] for r in results.values())
+        assert lines[-1] == {'type': 'summary', 'batch_id': batch_id, 'answered': 3, 'failed': 0, 'skipped': 0}
+        
+        response = session.post(
+            f"{server}/admin/api/batch",
+            json={"questions": questions, "batch_id": batch_id}
+        )
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[0]['completed'] == 3
+        assert [line['type'] for line in lines] == ['batch', 'summary']
+
+
+@pytest.fixture(scope="module")
+def admin(server):
+    """One logged-in admin session, so tests stay under the login rate limit."""
+    session = requests.Session()
+    session.post(
+        f"{server}/api/login",
+        json={"email": "prof@tcm.org", "password": "password123"}
+    )
+    return session
+
+
+class TestConditionalGet:
+    """Test ETag revalidation of the admin and knowledge base APIs."""
+    
+    def test_feedback_not_modified_until_new_feedback(self, server, admin):
+        """Test 304 for an unchanged store and a new ETag after a write."""
+        response = admin.get(f"{server}/admin/api/feedback")
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert b'": ' not in response.content  # compact separators
+        
+        response = admin.get(f"{server}/admin/api/feedback", headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.content == b''
+        assert response.headers['ETag'] == etag
+        
+        admin.post(f"{server}/api/feedback", json={"message_id": "etag-test", "rating": 5})
+        response = admin.get(f"{server}/admin/api/feedback", headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert any(f['message_id'] == 'etag-test' for f in response.json()['feedbacks'])
+    
+    def test_log_polls_settle_to_not_modified(self, server, admin):
+        """Test that revalidating the log does not append to it."""
+        etag = admin.get(f"{server}/admin/api/logs").headers['ETag']
+        # The first poll sees the lines logged for the request above.
+        etag = admin.get(f"{server}/admin/api/logs", headers={'If-None-Match': etag}).headers['ETag']
+        response = admin.get(f"{server}/admin/api/logs", headers={'If-None-Match': etag})
+        assert response.status_code == 304
+    
+    def test_herb_query_etag(self, server, admin):
+        """Test that knowledge base queries revalidate and errors carry no ETag."""
+        url = f"{server}/api/herbs/formulas?include=gui zhi"
+        etag = admin.get(url).headers['ETag']
+        assert admin.get(url, headers={'If-None-Match': etag}).status_code == 304
+        response = admin.get(f"{server}/api/herbs/formulas?include=not-a-herb")
+        assert response.status_code == 400
+        assert 'ETag' not in response.headers
+
+
+class TestVersionCounter:
+    """Test the .version counter behind the store ETags."""
+    
+    def test_bump_version_is_fixed_size(self, tmp_path):
+        """Every bump changes the store version without growing the file."""
+        from http_cache import bump_version, read_version, store_version, VERSION_FILE
+        assert read_version(str(tmp_path)) == 0
+        versions = set()
+        for _ in range(100):
+            bump_version(str(tmp_path))
+            versions.add(store_version(str(tmp_path)))
+        assert len(versions) == 100 and read_version(str(tmp_path)) == 100
+        assert (tmp_path / VERSION_FILE).stat().st_size == 8
+
+
+class TestLogFeed:
+    """Test the cursor-based live log feed."""
+    
+    def test_feed_returns_records_after_cursor(self, server, admin):
+        """Test that polling with a cursor only returns newer records."""
+        data = admin.get(f"{server}/admin/api/logs/feed?tail=5").json()
+        assert len(data['logs']) <= 5 and data['cursor']
+        
+        requests.get(f"{server}/")
+        messages = []
+        for _ in range(10):  # wait returns as soon as anything (e.g. the feed's own request) is logged
+            data = admin.get(f"{server}/admin/api/logs/feed?cursor={data['cursor']}&wait=2").json()
+            messages += [log.get('message', '') for log in data['logs']]
+            if any('Home page accessed' in m for m in messages):
+                break
+        assert any('Home page accessed' in m for m in messages)
+        
+        data = admin.get(f"{server}/admin/api/logs/feed?cursor={data['cursor']}&level=error").json()
+        assert all(log['level'] == 'ERROR' for log in data['logs'])
+        assert admin.get(f"{server}/admin/api/logs/feed?level=loud").status_code == 400
+    
+    def test_stream_sends_events_and_caps_streams(self, server, admin):
+        """Test the SSE stream and the per-worker stream limit."""
+        streams = []
+        try:
+            response = admin.get(f"{server}/admin/api/logs/stream?tail=3", stream=True, timeout=10)
+            streams.append(response)
+            assert response.headers['Content-Type'].startswith('text/event-stream')
+            lines = response.iter_lines(decode_unicode=True)
+            event_id = next(line for line in lines if line.startswith('id: '))
+            data = json.loads(next(lines)[len('data: '):])
+            assert data['cursor'] == event_id[len('id: '):]
+            
+            statuses = []
+            for _ in range(3):
+                response = admin.get(f"{server}/admin/api/logs/stream", stream=True, timeout=10)
+                streams.append(response)
+                statuses.append(response.status_code)
+            assert 503 in statuses
+        finally:
+            for response in streams:
+                response.close()
+
+
+class TestExportAPI:
+    """Test the admin export endpoints."""
+    
+    def test_export_feedback_csv_gzip(self, server, admin):
+        """Test a gzipped CSV download with a date filter."""
+        import gzip
+        admin.post(f"{server}/api/feedback", json={"message_id": "export-test", "rating": 4})
+        today = time.strftime('%Y-%m-%d')
+        response = admin.get(f"{server}/admin/api/export/feedback?format=csv&gzip=1&since={today}")
+        assert response.status_code == 200
+        assert response.headers['Content-Type'] == 'application/gzip'
+        assert f'feedback_{today}.csv.gz' in response.headers['Content-Disposition']
+        lines = gzip.decompress(response.content).decode('utf-8').splitlines()
+        assert lines[0] == 'timestamp,user_email,message_id,rating,feedback'
+        assert any(',export-test,' in line for line in lines[1:])
+        assert all(line.startswith(today) for line in lines[1:])
+    
+    def test_export_validation_and_access(self, server, admin):
+        """Test bad parameters and non-admin access."""
+        assert admin.get(f"{server}/admin/api/export/everything").status_code == 400
+        assert admin.get(f"{server}/admin/api/export/feedback?since=yesterday").status_code == 400
+        assert requests.get(f"{server}/admin/api/export/feedback").status_code == 401
+
+
+class TestArchiveAPI:
+    """Test that archived conversations and logs stay readable through the admin APIs."""
+    
+    def test_archived_records_are_served(self, server, admin):
+        """Test listing, fetching and exporting archived data."""
+        import archive
+        conversation = {
+            'session_id': 'archived0001', 'user_email': 'regular@tcm.org', 'timestamp': '2025-01-05T10:00:00',
+            'messages': [{'role': 'user', 'content': 'What is Ma Huang Tang?', 'timestamp': '2025-01-05T10:00:00'}]
+        }
+        meta = {key: conversation[key] for key in ('session_id', 'user_email', 'timestamp')}
+        archive.MonthArchive(os.path.join(ARCHIVE_DIR, 'conversations'), '2025-01').append([
+            ('conversation_archived0001_2025-01-05.json', dict(meta, message_count=1),
+             json.dumps(conversation).encode('utf-8') + b'\n')
+        ])
+        archive.MonthArchive(os.path.join(ARCHIVE_DIR, 'logs'), '2025-01').append([
+            ('app.log@1', {'file': 'app.log', 'bytes': 0, 'mtime': 1},
+             b'2025-01-05 10:00:00 | INFO     | server.py:1 | f | archived line\n')
+        ])
+        
+        listing = admin.get(f"{server}/admin/api/conversations").json()['conversations']
+        assert {'session_id': 'archived0001', 'user_email': 'regular@tcm.org', 'timestamp': '2025-01-05T10:00:00',
+                'message_count': 1, 'archived': '2025-01'} in listing
+        assert admin.get(f"{server}/admin/api/conversation/archived0001").json()['messages'][0]['content'] == \
+            'What is Ma Huang Tang?'
+        logs = admin.get(f"{server}/admin/api/logs?month=2025-01").json()['logs']
+        assert logs[-1]['message'] == 'archived line'
+        assert admin.get(f"{server}/admin/api/logs?month=1999-01").status_code == 404
+        
+        exported = admin.get(f"{server}/admin/api/export/messages?since=2025-01-01&until=2025-01-31").text
+        assert json.loads(exported.splitlines()[0])['session_id'] == 'archived0001'
+        summary = admin.get(f"{server}/admin/api/archives").json()
+        assert summary['conversations'][0]['month'] == '2025-01'
+
+
+class TestSearchAPI:
+    """Test full-text search over saved and archived conversations."""
+    
+    def test_search_finds_saved_and_archived_conversations(self, server, admin):
+        """Test that a conversation is searchable once saved, and archived ones too."""
+        token = f"searchtoken{time.time_ns()}"
+        session = requests.Session()
+        session.post(f"{server}/api/login", json={"email": "regular@tcm.org", "password": "userpass123"})
+        session.post(f"{server}/api/chat", json={"message": f"{token} 症状: 小柴胡汤 dosage?"})
+        session.post(f"{server}/api/logout")
+        
+        found = admin.get(f"{server}/admin/api/search", params={'q': f'柴胡汤 {token}'}).json()
+        assert found['total'] == 1
+        assert found['results'][0]['user_email'] == 'regular@tcm.org'
+        assert found['results'][0]['snippets'][0]['role'] == 'user'
+        assert 'took_ms' in found
+        
+        archived = admin.get(f"{server}/admin/api/search", params={
+            'q': '"ma huang tang"', 'user': 'regular@tcm.org', 'until': '2025-01-31'
+        }).json()
+        assert [r['session_id'] for r in archived['results']] == ['archived0001']
+        assert archived['results'][0]['archived'] == '2025-01'
+        assert admin.get(f"{server}/admin/api/search?q=").status_code == 400
+        assert admin.get(f"{server}/admin/api/search?q=x&since=june").status_code == 400
+
+
+class TestProfilingAPI:
+    """Test admin-armed request profiling."""
+    
+    def test_armed_plan_profiles_matching_requests(self, server, admin):
+        """Test arming a plan for one route, capturing it and downloading the results."""
+        assert admin.post(f"{server}/admin/api/profiling", json={'requests': 0}).status_code == 400
+        armed = admin.post(f"{server}/admin/api/profiling", json={
+            'route': '/api/herbs/formulas', 'requests': 1
+        }).json()['plan']
+        assert armed['remaining'] == 1
+        
+        admin.get(f"{server}/api/herbs/formulas")
+        admin.get(f"{server}/api/herbs/formulas")
+        state = admin.get(f"{server}/admin/api/profiling").json()
+        assert state['plan'] is None
+        captures = [c for c in state['captures'] if c['plan'] == armed['id']]
+        assert len(captures) == 1 and captures[0]['path'] == '/api/herbs/formulas'
+        assert sorted(f.split('.', 1)[1] for f in captures[0]['files']) == ['alloc.folded', 'folded', 'prof']
+        
+        folded = admin.get(f"{server}/admin/api/profiling/{captures[0]['name']}.alloc.folded")
+        assert folded.status_code == 200
+        assert folded.text.splitlines()[0].rsplit(' ', 1)[1].isdigit()
+        assert admin.get(f"{server}/admin/api/profiling/plan.json").status_code == 404
+        assert admin.delete(f"{server}/admin/api/profiling").json()['plan'] is None
+
+
+class TestStartup:
+    """Test readiness and the startup report."""
+    
+    def test_ready_after_warm_up(self, server, admin):
+        """Test that the server warmed up before serving and reports its phases."""
+        response = requests.get(f"{server}/ready")
+        assert response.status_code == 200
+        assert [p['phase'] for p in response.json()['phases']] == ['indexes', 'templates', 'state', 'profiler', 'upstream']
+        assert admin.get(f"{server}/admin/api/startup").json()['startup']['ready'] is True
+
+
 class TestFeedbackAPI:
     """Test feedback API endpoints."""
     
@@ -240,26 +593,182 @@ class TestFeedbackAPI:
             json={"message_id": "msg_2", "rating": "down", "feedback": "Needs improvement"}
         )
         
-        feedback_dir = BASE_DIR / "data" / "feedback"
+        feedback_dir = Path(STATE_DIR) / "feedback"
         feedback_files = list(feedback_dir.glob("feedback_*.json"))
         assert len(feedback_files) > 0
 
+    def test_feedback_stats(self, server, admin):
+        """Ratings show up in the stats rollup with the rated answer's question."""
+        before = admin.get(f"{server}/admin/api/feedback/stats?days=1").json()
+        chat = admin.post(f"{server}/api/chat", json={"message": "What is 桂枝汤 used for?"}).json()
+        admin.post(f"{server}/api/feedback", json={"message_id": chat['message_id'], "rating": "down"})
+
+        stats = admin.get(f"{server}/admin/api/feedback/stats?days=1").json()
+        assert stats['total']['counts'].get('down', 0) == before['total']['counts'].get('down', 0) + 1
+        assert stats['window']['counts'].get('down', 0) == before['window']['counts'].get('down', 0) + 1
+        assert any(a['question'] == "What is 桂枝汤 used for?" for a in stats['poor_answers'])
+        assert admin.get(f"{server}/admin/api/feedback/stats?days=x").status_code == 400
+
 
 class TestDataStorage:
     """Test data storage functionality."""
     
-    def test_feedback_directory_exists(self):
+    def test_feedback_directory_exists(self, server):
         """Test that feedback directory exists."""
-        feedback_dir = BASE_DIR / "data" / "feedback"
+        feedback_dir = Path(STATE_DIR) / "feedback"
         assert feedback_dir.exists()
         assert feedback_dir.is_dir()
     
-    def test_conversations_directory_exists(self):
+    def test_conversations_directory_exists(self, server):
         """Test that conversations directory exists."""
-        conv_dir = BASE_DIR / "data" / "conversations"
+        conv_dir = Path(STATE_DIR) / "conversations"
         assert conv_dir.exists()
         assert conv_dir.is_dir()
 
 
+
+class TestRateLimiter:
+    """Test the shared token-bucket rate limiter."""
+    
+    def test_bucket_rejects_then_refills(self, tmp_path):
+        """A drained bucket rejects with a retry hint and refills over time."""
+        from ratelimit import SharedBucketStore
+        store = SharedBucketStore(str(tmp_path / "rl.bin"), slots=64)
+        for _ in range(3):
+            allowed, _, _ = store.take("chat:user:a", 3, 1.0, now=100.0)
+            assert allowed
+        allowed, retry_after, _ = store.take("chat:user:a", 3, 1.0, now=100.0)
+        assert not allowed
+        assert retry_after == pytest.approx(1.0)
+        allowed, _, _ = store.take("chat:user:a", 3, 1.0, now=101.0)
+        assert allowed
+    
+    def test_state_is_shared_between_store_instances(self, tmp_path):
+        """Two handles on the same file (as in two workers) share buckets."""
+        from ratelimit import SharedBucketStore
+        path = str(tmp_path / "rl.bin")
+        first = SharedBucketStore(path, slots=64)
+        second = SharedBucketStore(path, slots=64)
+        first.take("login:ip:1.2.3.4", 1, 0.01, now=50.0)
+        allowed, _, _ = second.take("login:ip:1.2.3.4", 1, 0.01, now=50.0)
+        assert not allowed
+    
+    def test_limiter_checks_user_and_ip_buckets(self, tmp_path):
+        """Each scope has its own bucket; exceeding one raises RateLimited."""
+        from ratelimit import SharedBucketStore, RateLimiter, RateLimited
+        limiter = RateLimiter(
+            SharedBucketStore(str(tmp_path / "rl.bin"), slots=64),
+            {'chat': [('user', 2, 60), ('ip', 3, 60)]}
+        )
+        limiter.check('chat', user='a', ip='10.0.0.1')
+        limiter.check('chat', user='a', ip='10.0.0.1')
+        with pytest.raises(RateLimited) as exc:
+            limiter.check('chat', user='a', ip='10.0.0.1')
+        assert exc.value.bucket == 'chat:user'
+        limiter.check('chat', user='b', ip='10.0.0.1')
+        with pytest.raises(RateLimited) as exc:
+            limiter.check('chat', user='c', ip='10.0.0.1')
+        assert exc.value.bucket == 'chat:ip'
+
+
+class TestSharedCache:
+    """Test the memory-mapped cache shared by worker processes."""
+    
+    def test_get_set_ttl_and_oversize(self, tmp_path):
+        """Values round-trip, expire after their TTL, and oversize values are skipped."""
+        from shared_cache import SharedCache
+        cache = SharedCache(str(tmp_path / "cache.bin"), budget_bytes=64 * 1024, slot_size=1024)
+        assert cache.set("q", {"answer": "桂枝汤", "sources": ["a"]})
+        assert cache.get("q") == {"answer": "桂枝汤", "sources": ["a"]}
+        assert cache.set("short", 1, ttl=0.01)
+        time.sleep(0.02)
+        assert cache.get("short") is None
+        assert not cache.set("big", "x" * 2000)
+        local = cache.stats()['local']
+        assert (local['hits'], local['misses'], local['oversize']) == (1, 1, 1)
+    
+    def test_budget_bounds_entries_and_evicts(self, tmp_path):
+        """A full table evicts instead of growing past its budget."""
+        from shared_cache import SharedCache
+        cache = SharedCache(str(tmp_path / "cache.bin"), budget_bytes=16 * 1024, slot_size=256)
+        for i in range(200):
+            cache.set(f"key{i}", i)
+        stats = cache.stats()
+        assert stats['entries'] <= stats['slots']
+        assert stats['budget_bytes'] <= 16 * 1024
+        assert stats['local']['evictions'] > 0
+        assert cache.get("key199") == 199
+    
+    def test_set_replaces_the_key_past_a_freed_slot(self, tmp_path):
+        """Re-setting a key updates its slot even when an earlier slot in its window has been freed."""
+        from shared_cache import SharedCache, _key_hash
+        cache = SharedCache(str(tmp_path / "cache.bin"), budget_bytes=64 * 1024, slot_size=512)
+        home = _key_hash("q") % cache.slots
+        other = next(f"k{i}" for i in range(100000) if _key_hash(f"k{i}") % cache.slots == home)
+        cache.set(other, "occupies the home slot")
+        cache.set("q", "old answer")
+        cache.delete(other)
+        
+        cache.set("q", "new answer", ttl=0.01)
+        assert cache.stats()['entries'] == 1
+        time.sleep(0.02)
+        assert cache.get("q") is None
+        assert cache.get("q") is None  # no stale copy further along the window
+    
+    def test_workers_share_entries_and_report_stats(self, tmp_path):
+        """A forked worker sees the parent's entries and gets its own stats row."""
+        import multiprocessing
+        from shared_cache import SharedCache
+        cache = SharedCache(str(tmp_path / "cache.bin"), budget_bytes=64 * 1024, slot_size=512)
+        cache.set("shared", "from parent")
+        
+        def worker(queue):
+            queue.put(cache.get("shared"))
+            cache.set("child", "from child")
+        
+        context = multiprocessing.get_context("fork")
+        queue = context.Queue()
+        process = context.Process(target=worker, args=(queue,))
+        process.start()
+        assert queue.get(timeout=10) == "from parent"
+        process.join(timeout=10)
+        assert cache.get("child") == "from child"
+        workers = {row['pid']: row for row in cache.stats()['workers']}
+        assert workers[process.pid]['hits'] == 1
+        assert workers[os.getpid()]['hits'] == 1
+
+
+class TestClientIP:
+    """Test which address the per-IP rate limits use."""
+    
+    def test_x_real_ip_only_from_trusted_proxies(self):
+        """X-Real-IP is honoured from the proxy and ignored from anyone else."""
+        import server
+        headers = {'X-Real-IP': '203.0.113.7'}
+        with server.app.test_request_context('/', headers=headers, environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+            assert server.client_ip() == '203.0.113.7'
+        with server.app.test_request_context('/', headers=headers, environ_base={'REMOTE_ADDR': '198.51.100.2'}):
+            assert server.client_ip() == '198.51.100.2'
+
+
+class TestAnswerCache:
+    """Test which LLM answers process_query caches."""
+    
+    def test_error_answers_are_not_cached(self, tmp_path, monkeypatch):
+        """ChatEngine's apology (sources ["Error"]) is returned but not cached; real answers are."""
+        import server
+        import chat_engine
+        from shared_cache import SharedCache
+        monkeypatch.setenv('DEEPSEEK_API_KEY', 'test-key')
+        monkeypatch.setattr(server, '_answer_cache', SharedCache(str(tmp_path / "cache.bin"), budget_bytes=64 * 1024))
+        monkeypatch.setattr(server.query_router, 'route', lambda query: server.query_router.Route(None, 0.0, [], None, []))
+        results = [("I apologize, but I encountered an error", ["Error"]), ("Gui Zhi Tang ...", ["Shang Han Lun"])]
+        monkeypatch.setattr(chat_engine.ChatEngine, 'process_query', lambda self, *args: results.pop(0))
+        
+        assert server.process_query("Tell me about Gui Zhi Tang")[1:] == (["Error"], 'llm')
+        assert server.process_query("Tell me about Gui Zhi Tang")[1:] == (["Shang Han Lun"], 'llm')
+        assert server.process_query("Tell me about Gui Zhi Tang")[1:] == (["Shang Han Lun"], 'cache')
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
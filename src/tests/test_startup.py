@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Unit tests for the startup phases."""
+
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+class TestStartup:
+    """Test warm-up phases and the import-time report."""
+
+    IMPORTTIME = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     posix
+import time:       300 |        420 |   os
+import time:        50 |         50 |   knowledge_base
+import time:      1000 |       1470 | server
+"""
+
+    def test_parse_importtime(self):
+        from startup import parse_importtime
+        rows = parse_importtime(self.IMPORTTIME)
+        assert rows[0] == (2, 'posix', 120, 120)
+        assert rows[-1] == (0, 'server', 1000, 1470)
+
+    def test_build_import_report(self):
+        from startup import build_import_report
+        report = build_import_report(self.IMPORTTIME, 'server')
+        assert (report['total_ms'], report['self_ms']) == (1.5, 1.0)
+        assert report['imports'] == [{'module': 'os', 'cumulative_ms': 0.4},
+                                     {'module': 'knowledge_base', 'cumulative_ms': 0.1}]
+        assert report['slowest_modules'][0] == {'module': 'server', 'self_ms': 1.0}
+
+    def test_failed_phase_is_recorded_not_raised(self):
+        import startup
+
+        def broken():
+            raise OSError("no route to host")
+        startup.phase('upstream-test', broken)
+        assert startup.status()['phases'][-1]['error'] == "OSError: no route to host"
+
+    def test_compile_templates(self):
+        from flask import Flask
+        import startup
+        app = Flask('warm', template_folder=str(Path(__file__).parent.parent / 'templates'))
+        startup.compile_templates(app)
+        assert len(app.jinja_env.cache) == len(app.jinja_env.list_templates()) > 0
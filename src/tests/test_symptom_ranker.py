@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Unit tests for the symptom ranker."""
+
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from symptom_ranker import SymptomRanker, parse_signs
+from chat_engine import build_context
+
+
+class TestSymptomRanker:
+    """Test vectorized symptom ranking."""
+
+    def test_parse_signs_handles_negation(self):
+        assert parse_signs("fever, no sweating, 无汗") == [('fever', 1), ('sweating', -1), ('sweating', -1)]
+
+    def test_ranks_classic_presentations(self):
+        ranker = SymptomRanker()
+        cold = ranker.rank("fever, aversion to cold, no sweating, floating tight pulse")
+        assert cold['formulas'][0]['key'] == 'ma_huang_tang'
+        assert cold['patterns'][0]['key'] == 'tai_yang'
+        wind = ranker.rank("sweating, aversion to wind, floating slow pulse")
+        assert wind['formulas'][0]['key'] == 'gui_zhi_tang'
+
+    def test_negation_conflict_lowers_score(self):
+        """Sweating counts against Ma Huang Tang, whose indications say no sweating."""
+        ranker = SymptomRanker()
+        without = {r['key']: r['score'] for r in ranker.rank("aversion to cold, floating tight pulse")['formulas']}
+        with_sweat = {r['key']: r['score'] for r in ranker.rank("aversion to cold, floating tight pulse, sweating")['formulas']}
+        assert with_sweat.get('ma_huang_tang', 0) < without['ma_huang_tang']
+
+    def test_symptom_context(self):
+        context, sources = build_context("恶寒, 无汗, 脉浮紧")
+        assert "Best-matching formulas: Ma Huang Tang" in context
+        assert "Shang Han Lun - Tai Yang (Greater Yang) Pattern" in sources
+        assert "Presenting signs" not in build_context("What is Ma Huang?")[0]